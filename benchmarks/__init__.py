@@ -0,0 +1 @@
+# Performance benchmarks for the TMF Marketplace API (run as `python -m benchmarks.<name>`)
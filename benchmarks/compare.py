@@ -0,0 +1,37 @@
+"""
+Compare two benchmark result files (from --output) case by case, e.g. before and after a change:
+
+    python -m benchmarks.compare main.json branch.json
+"""
+import argparse
+import json
+
+METRIC = 'median_ms'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--metric', default=METRIC, help='Summary field to compare (median_ms, p95_ms, ...)')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"{'case':<32} {baseline['environment'].get('commit') or 'baseline':>12} "
+          f"{candidate['environment'].get('commit') or 'candidate':>12} {'change':>8}")
+    for case in sorted(set(baseline['cases']) | set(candidate['cases'])):
+        before = baseline['cases'].get(case, {}).get(args.metric)
+        after = candidate['cases'].get(case, {}).get(args.metric)
+        if before is None or after is None:
+            print(f"{case:<32} {before if before is not None else '-':>12} {after if after is not None else '-':>12}")
+            continue
+        change = f'{(after - before) / before * 100:+.1f}%' if before else ''
+        print(f"{case:<32} {before:>12} {after:>12} {change:>8}")
+
+
+if __name__ == '__main__':
+    main()
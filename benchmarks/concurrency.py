@@ -0,0 +1,148 @@
+"""
+Sync (WSGI, gunicorn threads) vs async (ASGI, uvicorn workers) read endpoints at high concurrency.
+
+Start the same code both ways, with the same number of worker processes, then point this at both.
+Each of --concurrency open connections loops for --duration seconds over: the anonymous gallery
+(served from the page cache), an authenticated gallery page (always queries the database) and
+the download links of a photo from that page. Reports latency percentiles, errors and requests/s
+per server and concurrency level.
+
+    gunicorn config.wsgi:application -b 127.0.0.1:8001 -w 2 -k gthread --threads 16
+    PHOTO_ASYNC_VIEWS=True DB_CONN_MAX_AGE=0 gunicorn config.asgi:application -b 127.0.0.1:8002 -w 2 \\
+        -k uvicorn_worker.UvicornWorker
+    python -m benchmarks.concurrency --target sync=http://127.0.0.1:8001 --target async=http://127.0.0.1:8002 \\
+        --concurrency 50,200,500 --output concurrency.json
+
+Each target is logged into once, as --username (a user seeded by benchmarks.datagen).
+Only needs the standard library: connections are asyncio streams with HTTP/1.1 keep-alive.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+from .load import PASSWORD, Recorder
+from .report import write_results
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection; reconnects after errors or `Connection: close`."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, path, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        lines = [f'GET {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Accept: application/json']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+        await self.writer.drain()
+        return await asyncio.wait_for(self.read_response(), self.timeout)
+
+    async def read_response(self):
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.lower()] = value.strip()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int(await self.reader.readline(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def login(base_url, username):
+    body = json.dumps({'username': username, 'password': PASSWORD}).encode()
+    request = Request(f'{base_url}/api/auth/login/', data=body, headers={'Content-Type': 'application/json'})
+    with urlopen(request, timeout=30) as response:
+        return json.loads(response.read())['access']
+
+
+async def virtual_user(connection, recorder, token, deadline):
+    auth = {'Authorization': f'Bearer {token}'}
+
+    async def get(step, path, headers):
+        started = time.perf_counter()
+        try:
+            status, body = await connection.request(path, headers)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            connection.close()
+            status, body = None, b''
+        recorder.add(step, (time.perf_counter() - started) * 1000, status == 200)
+        return json.loads(body) if status == 200 else {}
+
+    while time.monotonic() < deadline:
+        await get('gallery', '/api/photos/gallery/', {})
+        page = await get('gallery_auth', '/api/photos/gallery/?page_size=24', auth)
+        results = page.get('results') or []
+        if results:
+            await get('download', f"/api/photos/download/{results[len(results) // 2]['id']}/", auth)
+    connection.close()
+
+
+async def run_level(base_url, token, concurrency, duration, timeout):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        virtual_user(Connection(base_url, timeout), recorder, token, deadline) for _ in range(concurrency)
+    ])
+    return recorder.cases(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                        help='Server to measure; repeat for each (e.g. sync=http://127.0.0.1:8001)')
+    parser.add_argument('--concurrency', default='50,200,500', help='Comma-separated open connections per run')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per target and concurrency level')
+    parser.add_argument('--username', default='bench_user_1')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    targets = dict(target.split('=', 1) for target in args.target)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    tokens = {name: login(base_url.rstrip('/'), args.username) for name, base_url in targets.items()}
+    cases = {}
+    for level in levels:
+        # Servers take turns at each level, so neither always runs on a warmer (or more loaded) database
+        for name, base_url in targets.items():
+            result = asyncio.run(run_level(base_url.rstrip('/'), tokens[name], level, args.duration, args.timeout))
+            for step, summary in result.items():
+                cases[f'{name}.c{level}.{step}'] = summary
+                print(f"{name}.c{level}.{step}: {summary}")
+
+    if args.output:
+        write_results(args.output, 'concurrency', cases, targets=targets, levels=levels, duration_s=args.duration)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Seed benchmark data: N users and M ready photos with real (synthetic) images and renditions.
+
+Only `--variants` images per size are generated, stored and rendered; photos cycle through them
+and share those files the way deduplicated uploads do (see photos/blobs.py). Rows are written with
+bulk_create, so a million photos takes minutes, not hours. Re-running tops up to the requested counts.
+
+    python -m benchmarks.datagen --users 100 --photos 100000 --sizes 1024x768,4000x3000
+"""
+import argparse
+import datetime
+import itertools
+import os
+import random
+import time
+from io import BytesIO
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+
+from photos.blobs import hash_file, store_blob
+from photos import stats as uploader_stats
+from photos.cache import bump_generation
+from photos.models import Photo, PhotoRendition, storage_executor, watermarked_file, write_rendition_files
+from photos.renditions import render_renditions
+
+from .images import make_image, parse_sizes
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench_user_'
+DEFAULT_PASSWORD = 'bench-password-123'
+
+
+def seed_users(count, password=DEFAULT_PASSWORD, batch_size=1000):
+    """
+    Create bench_user_<n> accounts up to `count`; even numbers are Uploaders, odd ones Buyers.
+    The password is hashed once and shared, so seeding doesn't spend minutes in the hasher.
+    """
+    existing = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+    if existing < count:
+        encoded = make_password(password)
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'{USERNAME_PREFIX}{n}',
+                    email=f'{USERNAME_PREFIX}{n}@example.com',
+                    password=encoded,
+                    role='Uploader' if n % 2 == 0 else 'Buyer',
+                )
+                for n in range(existing, count)
+            ],
+            batch_size=batch_size,
+        )
+        print(f"Created {count - existing} users")
+    return list(User.objects.filter(username__startswith=USERNAME_PREFIX, role='Uploader').order_by('pk'))
+
+
+def render_template(width, height, seed):
+    """Store one synthetic original and its renditions; returns what a Photo row needs to point at them."""
+    content = make_image(width, height, seed)
+    original = SimpleUploadedFile(f'bench_{width}x{height}_{seed}.jpg', content, content_type='image/jpeg')
+    content_hash = hash_file(original)
+    storage = Photo._meta.get_field('original_image').storage
+    original_name = store_blob(storage, original, content_hash)
+
+    rendered = render_renditions(BytesIO(content))
+    with storage_executor() as executor:
+        names = [future.result() for future in write_rendition_files(rendered, content_hash, executor)]
+    return {
+        'original_image': original_name,
+        'original_size_bytes': len(content),
+        'content_hash': content_hash,
+        'watermarked_image': watermarked_file(rendered, names),
+        'renditions': [
+            {
+                'name': item.name,
+                'format': item.format,
+                'image': name,
+                'width': item.width,
+                'height': item.height,
+                'size_bytes': len(item.content),
+            }
+            for item, name in zip(rendered, names)
+        ],
+    }
+
+
+def seed_photos(count, uploaders, sizes, variants=4, batch_size=2000, seed=42):
+    """Create ready, listable photos (with renditions) up to `count`, spread across `uploaders`."""
+    existing = Photo.objects.filter(uploader__username__startswith=USERNAME_PREFIX).count()
+    if existing >= count:
+        print(f"Using existing {existing} photos")
+        return
+    if not uploaders:
+        raise ValueError("No uploaders to own the photos; seed at least two users")
+
+    started = time.perf_counter()
+    templates = [
+        render_template(width, height, seed + index * variants + variant)
+        for index, (width, height) in enumerate(sizes)
+        for variant in range(variants)
+    ]
+    print(f"Rendered {len(templates)} template images in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(seed + existing)
+    today = datetime.date.today()
+    template_cycle = itertools.cycle(templates)
+    uploader_cycle = itertools.cycle(uploaders)
+    remaining = count - existing
+    started = time.perf_counter()
+    while remaining > 0:
+        batch_templates = [next(template_cycle) for _ in range(min(batch_size, remaining))]
+        photos = [
+            Photo(
+                uploader=next(uploader_cycle),
+                title=f'Benchmark photo {existing + n}',
+                description='Seeded by benchmarks.datagen',
+                capture_date=today - datetime.timedelta(days=rng.randrange(3650)),
+                original_image=template['original_image'],
+                original_size_bytes=template['original_size_bytes'],
+                watermarked_image=template['watermarked_image'],
+                content_hash=template['content_hash'],
+                status=Photo.STATUS_READY,
+                # bulk_create skips save(), so is_listable is set explicitly
+                is_listable=True,
+            )
+            for n, template in enumerate(batch_templates)
+        ]
+        with transaction.atomic():
+            Photo.objects.bulk_create(photos, batch_size=batch_size)
+            PhotoRendition.objects.bulk_create(
+                [
+                    PhotoRendition(photo=photo, **rendition)
+                    for photo, template in zip(photos, batch_templates)
+                    for rendition in template['renditions']
+                ],
+                batch_size=batch_size,
+            )
+        existing += len(photos)
+        remaining -= len(photos)
+        print(f"  {existing}/{count} photos")
+    print(f"Seeded photos in {time.perf_counter() - started:.1f}s")
+
+    # bulk_create sends no signals, so invalidate the gallery cache and recount the uploaders explicitly
+    bump_generation()
+    for uploader in uploaders:
+        uploader_stats.rebuild(uploader.pk)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE photos_photo')
+            cursor.execute('ANALYZE photos_photorendition')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--photos', type=int, default=1000)
+    parser.add_argument('--sizes', default='1024x768,4000x3000', help='Comma-separated WIDTHxHEIGHT of the synthetic originals')
+    parser.add_argument('--variants', type=int, default=4, help='Distinct images per size')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='Password of every seeded user')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    uploaders = seed_users(args.users, args.password, args.batch_size)
+    seed_photos(args.photos, uploaders, parse_sizes(args.sizes), args.variants, args.batch_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
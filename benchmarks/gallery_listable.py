@@ -0,0 +1,142 @@
+"""
+Gallery query benchmark: the old `.exclude()` chain vs the `is_listable` partial index.
+
+Seeds the database up to --rows photos (default 1,000,000) with bulk_create, then prints
+the query plan and timings for the first gallery page and a deep keyset page.
+
+    DATABASE_URL=postgres://... python -m benchmarks.gallery_listable --rows 1000000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+
+from photos.models import Photo
+
+User = get_user_model()
+
+PAGE_SIZE = 24
+
+
+def seed(rows, batch_size):
+    existing = Photo.objects.count()
+    if existing >= rows:
+        print(f"Using existing {existing} photos")
+        return
+
+    uploader, _ = User.objects.get_or_create(username='bench_uploader', defaults={'role': 'Uploader'})
+    today = datetime.date.today()
+    rng = random.Random(42)
+
+    print(f"Seeding {rows - existing} photos...")
+    started = time.perf_counter()
+    remaining = rows - existing
+    while remaining > 0:
+        batch = []
+        for _ in range(min(batch_size, remaining)):
+            # Roughly 10% of photos miss one of the fields the gallery requires
+            roll = rng.random()
+            title = '' if roll < 0.03 else 'Benchmark photo'
+            description = '' if 0.03 <= roll < 0.06 else 'Seeded for benchmarks'
+            capture_date = None if 0.06 <= roll < 0.10 else today
+            batch.append(Photo(
+                uploader=uploader,
+                title=title,
+                description=description,
+                capture_date=capture_date,
+                original_image='photos/originals/bench.jpg',
+                status=Photo.STATUS_READY,
+                is_listable=bool(title and description and capture_date),
+            ))
+        # bulk_create skips save(), so is_listable is set explicitly above
+        Photo.objects.bulk_create(batch, batch_size=batch_size)
+        remaining -= len(batch)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE photos_photo')
+
+
+def legacy_queryset():
+    return Photo.objects.exclude(title__exact='').exclude(description__exact='').exclude(capture_date__isnull=True)
+
+
+def listable_queryset():
+    return Photo.objects.filter(is_listable=True)
+
+
+def deep_cursor(queryset, depth):
+    """(created_at, id) of the row `depth` rows into the gallery, i.e. what a cursor would carry."""
+    return queryset.order_by('-created_at', '-id').values_list('created_at', 'id')[depth:depth + 1].first()
+
+
+def page(queryset, cursor=None):
+    if cursor is not None:
+        created_at, pk = cursor
+        queryset = queryset.filter(
+            Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        )
+    return queryset.order_by('-created_at', '-id')[:PAGE_SIZE]
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def timed(queryset, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())  # fresh clone, no result cache
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=500_000, help='Row offset of the deep page cursor')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    seed(args.rows, args.batch_size)
+    cursor = deep_cursor(listable_queryset(), min(args.depth, args.rows // 2))
+
+    results = {'vendor': connection.vendor, 'rows': Photo.objects.count(), 'cases': {}}
+    for name, queryset in (('legacy_exclude', legacy_queryset()), ('is_listable', listable_queryset())):
+        for label, query in (('first_page', page(queryset)), ('deep_page', page(queryset, cursor))):
+            key = f'{name}.{label}'
+            print(f"\n=== {key} ===")
+            print(explain(query))
+            results['cases'][key] = timed(query, args.repeat)
+            print(results['cases'][key])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Gallery search/filter benchmark: full-text search (GIN) and the capture date / uploader filters.
+
+Seeds up to --rows listable photos with titles and descriptions drawn from a small vocabulary
+(a few common words, a long tail of rare ones), then prints the query plan and timings of the
+first page, and a later page, for each case through the real GalleryView queryset and keyset paginator.
+`substring.*` cases time the icontains fallback on the same data for comparison.
+
+    DATABASE_URL=postgres://... python -m benchmarks.gallery_search --rows 1000000 --output search.json
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import override_settings
+
+from photos.models import Photo
+from photos.views import GalleryView
+
+from .micro import gallery_page, gallery_request, gallery_view
+from .report import measure, write_results
+
+User = get_user_model()
+
+UPLOADER_PREFIX = 'bench_search_'
+COMMON_WORDS = ['sunset', 'beach', 'city', 'portrait', 'forest', 'mountain', 'river', 'street']
+# Rare words appear in roughly 1 in len(RARE_WORDS) * 20 photos each
+RARE_WORDS = [f'{prefix}{suffix}' for prefix in ('aurora', 'glacier', 'lantern', 'meadow', 'harbor')
+              for suffix in ('', 'light', 'mist', 'stone', 'field', 'wind', 'song', 'fall')]
+
+
+def seed(rows, uploaders, batch_size):
+    existing = Photo.objects.filter(uploader__username__startswith=UPLOADER_PREFIX).count()
+    if existing >= rows:
+        print(f"Using existing {existing} photos")
+        return
+
+    User.objects.bulk_create(
+        [User(username=f'{UPLOADER_PREFIX}{n}', role='Uploader') for n in range(uploaders)],
+        ignore_conflicts=True,
+    )
+    owners = list(User.objects.filter(username__startswith=UPLOADER_PREFIX))
+    rng = random.Random(42 + existing)
+    start = datetime.date(2015, 1, 1)
+
+    print(f"Seeding {rows - existing} photos...")
+    started = time.perf_counter()
+    remaining = rows - existing
+    while remaining > 0:
+        batch = []
+        for _ in range(min(batch_size, remaining)):
+            title = ' '.join(rng.sample(COMMON_WORDS, 2))
+            description = ' '.join(rng.choices(COMMON_WORDS, k=4))
+            if rng.random() < 0.05:
+                description += ' ' + rng.choice(RARE_WORDS)
+            batch.append(Photo(
+                uploader=rng.choice(owners),
+                title=title.capitalize(),
+                description=f'A photo of {description}.',
+                capture_date=start + datetime.timedelta(days=rng.randrange(3650)),
+                original_image='photos/originals/bench.jpg',
+                status=Photo.STATUS_READY,
+                is_listable=True,  # bulk_create skips save()
+            ))
+        Photo.objects.bulk_create(batch, batch_size=batch_size)
+        remaining -= len(batch)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE photos_photo')
+
+
+def query_string(params):
+    return '&'.join(f'{key}={value}' for key, value in params.items())
+
+
+def cases(uploader_id):
+    return {
+        'search.common': {'q': 'sunset'},
+        'search.common_newest': {'q': 'sunset', 'sort': 'newest'},
+        'search.rare': {'q': 'glacierfield'},
+        'search.two_terms': {'q': 'mountain river'},
+        'filter.capture_range': {'captured_after': '2020-01-01', 'captured_before': '2020-01-31'},
+        'filter.uploader': {'uploader': uploader_id},
+        'combined': {'q': 'beach', 'uploader': uploader_id, 'captured_after': '2018-01-01'},
+    }
+
+
+def substring_queryset(term):
+    return Photo.objects.filter(is_listable=True).filter(
+        Q(title__icontains=term) | Q(description__icontains=term)
+    ).order_by(*GalleryView.keyset_ordering)[:24]
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--uploaders', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=5, help='Pages followed for the "later page" timings')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    seed(args.rows, args.uploaders, args.batch_size)
+    uploader_id = User.objects.filter(username=f'{UPLOADER_PREFIX}0').values_list('pk', flat=True).first()
+
+    results = {}
+    with override_settings(ALLOWED_HOSTS=['*']):
+        for name, params in cases(uploader_id).items():
+            request = gallery_request(f'/api/photos/gallery/?{query_string(params)}')
+            view = gallery_view(request)
+            print(f"\n=== {name} ({params}) ===")
+            print(explain(view.get_queryset()[:24]))
+            results[f'{name}.first_page'] = measure(lambda: gallery_page(request), args.repeat)
+
+            # Follow `next` to time a later page, the way a client scrolling the results would
+            paginator_request = request
+            for _ in range(args.pages):
+                view = gallery_view(paginator_request)
+                paginator = view.paginator
+                if not paginator.paginate_queryset(view.get_queryset(), paginator_request, view) or not paginator.has_next:
+                    break
+                paginator_request = gallery_request(paginator.get_next_link())
+            later_request = paginator_request
+            results[f'{name}.later_page'] = measure(lambda: gallery_page(later_request), args.repeat)
+            print(results[f'{name}.first_page'], results[f'{name}.later_page'])
+
+        for term in ('sunset', 'glacierfield'):
+            queryset = substring_queryset(term)
+            print(f"\n=== substring.{term} ===")
+            print(explain(queryset))
+            results[f'substring.{term}'] = measure(lambda: list(queryset.all()), args.repeat)
+            print(results[f'substring.{term}'])
+
+    if args.output:
+        write_results(args.output, 'gallery_search', results, vendor=connection.vendor, rows=Photo.objects.count())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""Synthetic test images (no Django needed, so the HTTP load scenario can use them too)."""
+import random
+from io import BytesIO
+
+from PIL import Image
+
+
+def parse_sizes(value):
+    """'1024x768,4000x3000' -> [(1024, 768), (4000, 3000)]"""
+    return [tuple(int(n) for n in size.lower().split('x')) for size in value.split(',') if size]
+
+
+def make_image(width, height, seed):
+    """
+    A JPEG with gradients, noise and a seed-specific colour block: compresses and decodes like a
+    photo rather than a flat fill, and every seed has a different content hash.
+    """
+    red = Image.linear_gradient('L').resize((width, height))
+    green = Image.radial_gradient('L').resize((width, height))
+    blue = Image.effect_noise((width, height), 48)
+    image = Image.merge('RGB', (red, green, blue))
+    rng = random.Random(seed)
+    block = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    image.paste(block, (0, 0, min(width, 64), min(height, 64)))
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
@@ -0,0 +1,190 @@
+"""
+HTTP load scenario against a running server (runserver, gunicorn, ...).
+
+Each of --clients concurrent virtual users registers an Uploader and a Buyer account, logs both in,
+then --iterations times: uploads a synthetic photo, pages through the anonymous gallery (--pages
+pages, following `next`) and, as the Buyer, fetches download links plus a preview file for photos
+it saw. Reports latency percentiles and error counts per step, and overall requests/s.
+
+Only needs the standard library and Pillow, so it can run from another machine. All virtual users
+share one IP, so start the server with the login/registration rate limits raised:
+
+    LOGIN_RATE_PER_IP=100000/min REGISTER_RATE_PER_IP=100000/min python manage.py runserver 8000
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --clients 8 --iterations 5 --output load.json
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from .images import make_image, parse_sizes
+from .report import summarize, write_results
+
+BROWSER_ACCEPT = 'image/avif,image/webp,image/apng,*/*;q=0.8'
+PASSWORD = 'bench-password-123'
+
+
+class Recorder:
+    """Latency samples and error counts per scenario step, shared by all client threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, step, elapsed_ms, ok):
+        with self.lock:
+            self.samples[step].append(elapsed_ms)
+            if not ok:
+                self.errors[step] += 1
+
+    def cases(self, duration):
+        cases = {}
+        for step in sorted(self.samples):
+            cases[step] = {**summarize(self.samples[step]), 'errors': self.errors[step]}
+        requests = sum(len(samples) for samples in self.samples.values())
+        cases['total'] = {
+            'requests': requests,
+            'errors': sum(self.errors.values()),
+            'duration_s': round(duration, 2),
+            'requests_per_s': round(requests / duration, 1) if duration else 0,
+        }
+        return cases
+
+
+class Client:
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+
+    def request(self, step, method, path, body=None, headers=None, token=None, expect=(200,)):
+        """Send one request and record it under `step`; returns (status, body bytes)."""
+        url = path if path.startswith('http') else self.base_url + path
+        headers = dict(headers or {})
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, data=body, headers=headers, method=method), timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except HTTPError as e:
+            status, content = e.code, e.read()
+        except URLError as e:
+            status, content = None, str(e.reason).encode()
+        self.recorder.add(step, (time.perf_counter() - started) * 1000, status in expect)
+        return status, content
+
+    def post_json(self, step, path, data, token=None, expect=(200, 201)):
+        body = json.dumps(data).encode()
+        status, content = self.request(
+            step, 'POST', path, body, {'Content-Type': 'application/json'}, token=token, expect=expect,
+        )
+        return status, parse_json(content)
+
+    def get_json(self, step, path, token=None):
+        status, content = self.request(step, 'GET', path, headers={'Accept': 'application/json'}, token=token)
+        return status, parse_json(content)
+
+
+def parse_json(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return {}
+
+
+def multipart(fields, files):
+    """Encode form fields and (name, filename, content_type, bytes) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in fields.items():
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content_type, content in files:
+        lines.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + content + b'\r\n'
+        )
+    lines.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+
+def account(client, run_id, index, role):
+    username = f'load_{run_id}_{index}_{role.lower()}'
+    client.post_json('register', '/api/auth/register/', {
+        'username': username, 'email': f'{username}@example.com', 'password': PASSWORD, 'role': role,
+    })
+    _, tokens = client.post_json('login', '/api/auth/login/', {'username': username, 'password': PASSWORD}, expect=(200,))
+    return tokens.get('access')
+
+
+def scenario(client, run_id, index, args, images):
+    uploader_token = account(client, run_id, index, 'Uploader')
+    buyer_token = account(client, run_id, index, 'Buyer')
+
+    for iteration in range(args.iterations):
+        content = images[(index * args.iterations + iteration) % len(images)]
+        body, content_type = multipart(
+            {'title': f'Load test {index}.{iteration}', 'description': 'benchmarks.load', 'capture_date': '2024-01-01'},
+            [('original_image', f'load_{index}_{iteration}.jpg', 'image/jpeg', content)],
+        )
+        client.request(
+            'upload', 'POST', '/api/photos/upload/', body, {'Content-Type': content_type},
+            token=uploader_token, expect=(202,),
+        )
+
+        seen = []
+        url = '/api/photos/gallery/'
+        for _ in range(args.pages):
+            _, page = client.get_json('gallery', url)
+            # Fresh uploads are listed before the worker has rendered them; only fetch processed ones
+            seen.extend(photo['id'] for photo in page.get('results', []) if photo.get('srcset'))
+            url = page.get('next')
+            if not url:
+                break
+
+        for pk in seen[:args.downloads]:
+            client.get_json('download', f'/api/photos/download/{pk}/', token=buyer_token)
+            client.request('file', 'GET', f'/api/photos/files/{pk}/preview/', headers={'Accept': BROWSER_ACCEPT})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=3, help='Upload/gallery/download rounds per user')
+    parser.add_argument('--pages', type=int, default=3, help='Gallery pages followed per round')
+    parser.add_argument('--downloads', type=int, default=3, help='Photos downloaded per round')
+    parser.add_argument('--size', default='2000x1500', help='Upload image size, WIDTHxHEIGHT')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    width, height = parse_sizes(args.size)[0]
+    run_id = uuid.uuid4().hex[:8]
+    # A distinct image per upload, so deduplication doesn't short-circuit processing
+    seed = int(run_id, 16)
+    images = [make_image(width, height, seed + n) for n in range(args.clients * args.iterations)]
+
+    recorder = Recorder()
+    client = Client(args.base_url, recorder, args.timeout)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        futures = [executor.submit(scenario, client, run_id, index, args, images) for index in range(args.clients)]
+        for future in futures:
+            future.result()
+    cases = recorder.cases(time.perf_counter() - started)
+
+    for step, summary in cases.items():
+        print(f"{step}: {summary}")
+    if args.output:
+        write_results(args.output, 'load', cases, base_url=args.base_url, clients=args.clients, size=args.size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Login cost per password hasher: encode/verify latency, CPU time per login and logins/s per core.
+
+Each hasher is run through the real token view (throttles disabled) with --threads concurrent
+clients. CPU time per login is process CPU over the run divided by logins, so
+`logins_per_core_s` is what one fully busy core sustains. Cost parameters come from the
+PASSWORD_* settings/env (e.g. PASSWORD_ARGON2_MEMORY_COST=65536 python -m benchmarks.login).
+
+    python -m benchmarks.login --logins 200 --threads 4 --output login.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+
+from users.views import CustomTokenObtainPairView
+
+from .report import measure, summarize, write_results
+
+User = get_user_model()
+
+HASHERS = {
+    'pbkdf2': 'users.hashers.BoundedPBKDF2PasswordHasher',
+    'argon2': 'users.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'users.hashers.TunedScryptPasswordHasher',
+}
+USERNAME = 'bench_login'
+PASSWORD = 'bench-password-123'
+
+
+def login_once(view, factory):
+    body = json.dumps({'username': USERNAME, 'password': PASSWORD})
+    started = time.perf_counter()
+    response = view(factory.post('/api/auth/login/', body, content_type='application/json'))
+    assert response.status_code == 200, response.data
+    return (time.perf_counter() - started) * 1000
+
+
+def run_hasher(name, logins, threads, repeat):
+    preferred = HASHERS[name]
+    hashers = [preferred] + [path for path in HASHERS.values() if path != preferred]
+    with override_settings(PASSWORD_HASHERS=hashers):
+        user, _ = User.objects.get_or_create(username=USERNAME, defaults={'role': 'Buyer'})
+        user.set_password(PASSWORD)
+        user.save()
+        encoded = make_password(PASSWORD)
+
+        result = {
+            'encode': measure(lambda: make_password(PASSWORD), repeat),
+            'verify': measure(lambda: check_password(PASSWORD, encoded), repeat),
+        }
+
+        view = CustomTokenObtainPairView.as_view(throttle_classes=())
+        factory = APIRequestFactory()
+        login_once(view, factory)  # warm-up
+
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            samples = list(executor.map(lambda _: login_once(view, factory), range(logins)))
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+    result['login'] = {
+        **summarize(samples),
+        'threads': threads,
+        'logins_per_s': round(logins / elapsed, 1),
+        'cpu_ms_per_login': round(cpu / logins * 1000, 2),
+        'logins_per_core_s': round(logins / cpu, 1) if cpu else None,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hashers', default='pbkdf2,argon2,scrypt', help='Comma-separated: ' + ', '.join(HASHERS))
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=10, help='Samples for the encode/verify cases')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    cases = {}
+    for name in args.hashers.split(','):
+        result = run_hasher(name.strip(), args.logins, args.threads, args.repeat)
+        for step, summary in result.items():
+            cases[f'{name}.{step}'] = summary
+            print(f"{name}.{step}: {summary}")
+
+    if args.output:
+        write_results(args.output, 'login', cases, vendor=connection.vendor, cpus=os.cpu_count())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Micro-benchmarks for the hot paths behind the photos API:
+
+-   render.<WxH>        decode + downscale + watermark + encode every rendition (renditions.render_renditions)
+-   gallery.first_page  the gallery queryset through GalleryCursorPagination, renditions prefetched
+-   gallery.deep_page   the same, --depth rows into the gallery (keyset cursor)
+-   serializer.gallery  PhotoGallerySerializer on one prefetched page (file URLs cached after warm-up)
+-   serializer.download PhotoDownloadSerializer on the same page
+-   dashboard.stats     the busiest uploader's totals from UploaderStats (what /api/photos/mine/stats/ reads)
+-   dashboard.aggregate the same totals computed from the photos and renditions tables
+
+Runs against whatever database/storage is configured; seed it first with `python -m benchmarks.datagen`.
+
+    python -m benchmarks.micro --repeat 20 --output micro.json
+"""
+import argparse
+import os
+from io import BytesIO
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.test.utils import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from photos import stats as uploader_stats
+from photos.models import Photo, PhotoRendition, UploaderStats
+from photos.pagination import GalleryCursorPagination
+from photos.renditions import negotiate_format, render_renditions
+from photos.serializers import PhotoDownloadSerializer, PhotoGallerySerializer
+from photos.views import GalleryView
+
+from .images import make_image, parse_sizes
+from .report import measure, write_results
+
+GALLERY_URL = '/api/photos/gallery/'
+BROWSER_ACCEPT = 'image/avif,image/webp,image/apng,*/*;q=0.8'
+
+
+def render_case(width, height):
+    content = make_image(width, height, seed=width * height)
+    return lambda: render_renditions(BytesIO(content))
+
+
+def gallery_request(url=GALLERY_URL):
+    return Request(APIRequestFactory().get(url, HTTP_ACCEPT=BROWSER_ACCEPT))
+
+
+def gallery_view(request):
+    view = GalleryView()
+    view.request = request
+    view.format_kwarg = None
+    return view
+
+
+def gallery_page(request):
+    view = gallery_view(request)
+    return GalleryCursorPagination().paginate_queryset(view.get_queryset(), request, view)
+
+
+def deep_page_url(depth):
+    """The gallery URL whose cursor starts `depth` rows in, as a client paging that far would send."""
+    request = gallery_request()
+    view = gallery_view(request)
+    boundary = view.get_queryset()[depth:depth + 1].first()
+    if boundary is None:
+        return None
+    paginator = GalleryCursorPagination()
+    paginator.base_url = request.build_absolute_uri()
+    paginator.ordering = paginator.get_ordering(view)
+    return paginator.encode_cursor(boundary, reverse=False)
+
+
+def serializer_case(serializer_class, request, page):
+    context = {'request': request, 'image_format': negotiate_format(BROWSER_ACCEPT)}
+    return lambda: serializer_class(page, many=True, context=context).data
+
+
+def dashboard_aggregate(uploader_id):
+    totals = Photo.objects.filter(uploader_id=uploader_id).aggregate(
+        photo_count=Count('id'), original_bytes=Sum('original_size_bytes'), last_upload_at=Max('created_at'),
+    )
+    totals['rendition_bytes'] = PhotoRendition.objects.filter(photo__uploader_id=uploader_id).aggregate(
+        total=Sum('size_bytes'),
+    )['total']
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--render-repeat', type=int, default=5, help='Repeats for the (slow) render cases')
+    parser.add_argument('--sizes', default='1024x768,4000x3000', help='Comma-separated WIDTHxHEIGHT for render cases')
+    parser.add_argument('--depth', type=int, default=10_000, help='Row offset of the deep gallery page')
+    parser.add_argument('--cases', default='', help='Comma-separated case prefixes to run (default: all)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    prefixes = tuple(prefix for prefix in args.cases.split(',') if prefix)
+    cases = {}
+
+    def run(name, func, repeat):
+        if prefixes and not name.startswith(prefixes):
+            return
+        cases[name] = measure(func, repeat)
+        print(f"{name}: {cases[name]}")
+
+    for width, height in parse_sizes(args.sizes):
+        run(f'render.{width}x{height}', render_case(width, height), args.render_repeat)
+
+    with override_settings(ALLOWED_HOSTS=['*']):
+        request = gallery_request()
+        page = gallery_page(request)
+        if not page:
+            print("The gallery is empty; seed it with `python -m benchmarks.datagen` for gallery/serializer cases")
+        else:
+            run('gallery.first_page', lambda: gallery_page(request), args.repeat)
+            deep_url = deep_page_url(args.depth)
+            if deep_url is not None:
+                deep_request = gallery_request(deep_url)
+                run('gallery.deep_page', lambda: gallery_page(deep_request), args.repeat)
+            else:
+                print(f"Fewer than {args.depth} gallery rows; skipping gallery.deep_page")
+
+            for name, serializer_class in (('gallery', PhotoGallerySerializer), ('download', PhotoDownloadSerializer)):
+                key = f'serializer.{name}'
+                run(key, serializer_case(serializer_class, request, page), args.repeat)
+                if key in cases:
+                    cases[key]['photos_per_s'] = round(len(page) / (cases[key]['median_ms'] / 1000), 1)
+
+        busiest = UploaderStats.objects.order_by('-photo_count').first()
+        if busiest is not None:
+            run('dashboard.stats', lambda: uploader_stats.get_stats(busiest.uploader_id), args.repeat)
+            run('dashboard.aggregate', lambda: dashboard_aggregate(busiest.uploader_id), args.repeat)
+            for key in ('dashboard.stats', 'dashboard.aggregate'):
+                if key in cases:
+                    cases[key]['photos'] = busiest.photo_count
+
+    if args.output:
+        write_results(args.output, 'micro', cases, vendor=connection.vendor)
+
+
+if __name__ == '__main__':
+    main()
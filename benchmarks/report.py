@@ -0,0 +1,68 @@
+"""
+Timing summaries and JSON result files shared by the benchmark scripts.
+
+Every result file carries the git commit and environment it was produced on, so two runs
+can be compared with `python -m benchmarks.compare before.json after.json`.
+"""
+import datetime
+import json
+import platform
+import subprocess
+import time
+
+
+def summarize(samples_ms):
+    """Latency summary (milliseconds) of a list of samples."""
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {'count': 0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'count': len(ordered),
+        'median_ms': round(percentile(50), 3),
+        'p95_ms': round(percentile(95), 3),
+        'p99_ms': round(percentile(99), 3),
+        'min_ms': round(ordered[0], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def measure(func, repeat, warmup=1):
+    """Call `func` warmup + repeat times and summarize the timed calls."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(**extra):
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        **extra,
+    }
+
+
+def write_results(path, benchmark, cases, **extra):
+    """Write {'benchmark', 'environment', 'cases'} to `path`; cases map a name to a summary dict."""
+    with open(path, 'w') as f:
+        json.dump({'benchmark': benchmark, 'environment': environment(**extra), 'cases': cases}, f, indent=2)
+    print(f"\nResults written to {path}")
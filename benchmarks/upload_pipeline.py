@@ -0,0 +1,169 @@
+"""
+Upload pipeline benchmark: queued processing (upload, then the worker re-reads the original)
+vs inline processing (PHOTO_PROCESS_INLINE: render from the uploaded file, parallel writes,
+one transaction).
+
+Reports request latency, time until the photo is ready, storage calls and SQL queries
+per upload. Uses whatever storage is configured, so with AWS_* set (or AWS_S3_ENDPOINT_URL
+pointing at a local S3) the storage calls are real S3 requests.
+
+    python -m benchmarks.upload_pipeline --uploads 20 --size 4000x3000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from io import BytesIO
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from photos.jobs import claim_job, run_job
+from photos.models import Photo, PhotoRendition
+
+User = get_user_model()
+
+STORAGE_METHODS = ('save', 'open', 'exists', 'delete', 'size', 'url')
+
+
+class StorageCallCounter:
+    """Counts calls to the public methods of the storages used by Photo and PhotoRendition."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.storages = {
+            id(storage): storage
+            for storage in (
+                default_storage,
+                Photo._meta.get_field('original_image').storage,
+                PhotoRendition._meta.get_field('image').storage,
+            )
+        }
+
+    def __enter__(self):
+        for storage in self.storages.values():
+            for name in STORAGE_METHODS:
+                setattr(storage, name, self.wrap(name, getattr(storage, name)))
+        return self
+
+    def __exit__(self, *exc):
+        for storage in self.storages.values():
+            for name in STORAGE_METHODS:
+                storage.__dict__.pop(name, None)
+
+    def wrap(self, name, method):
+        def counted(*args, **kwargs):
+            with self.lock:
+                self.calls[name] += 1
+            return method(*args, **kwargs)
+        return counted
+
+    def take(self):
+        with self.lock:
+            calls, self.calls = self.calls, Counter()
+        return calls
+
+
+def make_image(width, height, seed):
+    # Gradient plus a per-upload colour block so content hashes differ (no dedupe between uploads)
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    image.paste((seed % 256, seed // 256 % 256, seed // 65536 % 256), (0, 0, 64, 64))
+    output = BytesIO()
+    # Neighbouring colours can quantize to identical JPEGs; the comment keeps the bytes distinct
+    image.save(output, format='JPEG', quality=90, comment=f'seed {seed}'.encode())
+    return output.getvalue()
+
+
+def run_mode(client, mode, images):
+    inline = mode == 'inline'
+    counter = StorageCallCounter()
+    request_ms = []
+    ready_ms = []
+    request_calls = Counter()
+    worker_calls = Counter()
+    request_queries = 0
+    worker_queries = 0
+
+    with override_settings(PHOTO_PROCESS_INLINE=inline), counter:
+        for index, content in enumerate(images):
+            upload = SimpleUploadedFile(f'bench-{mode}-{index}.jpg', content, content_type='image/jpeg')
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.post('/api/photos/upload/', {'title': 'Bench', 'original_image': upload}, format='multipart')
+            request_ms.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 202, response.content
+            request_queries += len(queries)
+            request_calls += counter.take()
+
+            if not inline:
+                with CaptureQueriesContext(connection) as queries:
+                    job = claim_job('benchmark')
+                    run_job(job)
+                worker_queries += len(queries)
+                worker_calls += counter.take()
+            ready_ms.append((time.perf_counter() - started) * 1000)
+            assert Photo.objects.get(pk=response.data['id']).status == Photo.STATUS_READY
+
+    uploads = len(images)
+    return {
+        'mode': mode,
+        'uploads': uploads,
+        'request_ms_p50': round(statistics.median(request_ms), 1),
+        'request_ms_max': round(max(request_ms), 1),
+        'ready_ms_p50': round(statistics.median(ready_ms), 1),
+        'storage_calls_per_upload': {
+            'request': {name: count / uploads for name, count in sorted(request_calls.items())},
+            'worker': {name: count / uploads for name, count in sorted(worker_calls.items())},
+        },
+        'queries_per_upload': {'request': request_queries / uploads, 'worker': worker_queries / uploads},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=10)
+    parser.add_argument('--size', default='4000x3000', help='Synthetic image size, WIDTHxHEIGHT')
+    parser.add_argument('--modes', default='queue,inline', help='Comma-separated: queue, inline')
+    parser.add_argument('--media-root', default=None, help='Local media directory (default: a temporary one)')
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    width, height = (int(value) for value in args.size.lower().split('x'))
+    uploader, _ = User.objects.get_or_create(username='bench_uploader', defaults={'role': 'Uploader'})
+    client = APIClient()
+    client.force_authenticate(uploader)
+
+    media_root = args.media_root or tempfile.mkdtemp(prefix='upload-bench-')
+    # Fresh content on every run, so earlier runs' photos aren't reused as dedupe twins
+    base = random.randrange(1_000_000)
+    results = []
+    with override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']):
+        for offset, mode in enumerate(args.modes.split(',')):
+            images = [make_image(width, height, base + offset * args.uploads + index) for index in range(args.uploads)]
+            result = run_mode(client, mode.strip(), images)
+            results.append(result)
+            print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'size': args.size, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
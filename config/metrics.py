@@ -0,0 +1,195 @@
+"""
+Prometheus metrics: per-endpoint latency, SQL and storage cost, image processing time.
+
+Every gunicorn worker writes to PROMETHEUS_MULTIPROC_DIR (when set) and `/metrics`
+aggregates all of them; see gunicorn.conf.py for clean-up of dead workers.
+
+SQL is counted by a wrapper installed on every database connection, attributed through the
+`current_stats` context variable: under ASGI the async ORM runs queries in other threads, which
+inherit the context (sync_to_async copies it) but not the request thread's connections.
+"""
+import contextvars
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name', ['view', 'method', 'status'],
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries per request by URL name', ['view'], buckets=COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', 'Time spent in SQL per request by URL name', ['view'],
+)
+REQUEST_STORAGE_CALLS = Histogram(
+    'http_request_storage_calls', 'Storage backend calls per request by URL name', ['view'], buckets=COUNT_BUCKETS,
+)
+STORAGE_CALLS = Counter(
+    'storage_calls_total', 'Storage backend calls', ['backend', 'operation'],
+)
+STORAGE_TIME = Histogram(
+    'storage_call_duration_seconds', 'Storage backend call latency', ['backend', 'operation'],
+)
+IMAGE_PROCESSING_TIME = Histogram(
+    'image_processing_seconds', 'Decode/watermark/encode time per photo', ['stage'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+
+class RequestStats:
+    """What one request spent, collected while it runs (see current_stats)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.storage_calls = 0
+        self.storage_time = 0.0
+        self.image_time = 0.0
+        self.lock = threading.Lock()
+
+
+current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        with stats.lock:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - started
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    # Fires on every (re)connect of the same per-thread wrapper object; install once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_wrapper, dispatch_uid='metrics_install_query_wrapper')
+
+
+def bind_request_stats(stats):
+    """ThreadPoolExecutor initializer: attribute the pool's work to the request that created it."""
+    current_stats.set(stats)
+
+
+@contextmanager
+def track_storage(backend, operation):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STORAGE_CALLS.labels(backend, operation).inc()
+        STORAGE_TIME.labels(backend, operation).observe(elapsed)
+        stats = current_stats.get()
+        if stats is not None:
+            with stats.lock:
+                stats.storage_calls += 1
+                stats.storage_time += elapsed
+
+
+@contextmanager
+def track_image_processing(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        IMAGE_PROCESSING_TIME.labels(stage).observe(elapsed)
+        stats = current_stats.get()
+        if stats is not None:
+            with stats.lock:
+                stats.image_time += elapsed
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL queries/time and storage calls per resolved URL name.
+    With METRICS_SERVER_TIMING, the same numbers go out in a `Server-Timing` header.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    def record(self, request, response, stats, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(view).observe(stats.queries)
+        REQUEST_DB_TIME.labels(view).observe(stats.db_time)
+        REQUEST_STORAGE_CALLS.labels(view).observe(stats.storage_calls)
+
+        if getattr(settings, 'METRICS_SERVER_TIMING', False):
+            response['Server-Timing'] = ', '.join([
+                f'app;dur={elapsed * 1000:.1f}',
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'storage;dur={stats.storage_time * 1000:.1f};desc="{stats.storage_calls} calls"',
+                f'image;dur={stats.image_time * 1000:.1f}',
+            ])
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus text exposition; aggregated over all workers in multiprocess mode.
+    Requires METRICS_TOKEN; without one it is only served with DEBUG on (404 otherwise).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            raise Http404('Metrics are disabled: METRICS_TOKEN is not set')
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
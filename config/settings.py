@@ -55,8 +55,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.metrics.MetricsMiddleware',  # Outermost, so latency covers the whole stack
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware', # Add WhiteNoise
+    'config.middleware.AsyncWhiteNoiseMiddleware',  # WhiteNoise, usable without a thread hop under ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,6 +120,30 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (see users/hashers.py). The first hasher encodes new passwords; the others only verify
+# existing hashes, which are re-encoded with the first on the next successful login.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')  # 'argon2' or 'scrypt'
+_ARGON2_HASHER = 'users.hashers.TunedArgon2PasswordHasher'
+_SCRYPT_HASHER = 'users.hashers.TunedScryptPasswordHasher'
+PASSWORD_HASHERS = [
+    *((_SCRYPT_HASHER, _ARGON2_HASHER) if PASSWORD_HASHER == 'scrypt' else (_ARGON2_HASHER, _SCRYPT_HASHER)),
+    'users.hashers.BoundedPBKDF2PasswordHasher',
+]
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', '2'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', '19456'))  # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', '1'))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ.get('PASSWORD_SCRYPT_WORK_FACTOR', str(2**14)))
+# Concurrent hashes (across workers with REDIS_URL or CACHE_DIR, else per process), and how long an
+# API login waits for a slot before a 503
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get('PASSWORD_HASH_CONCURRENCY', '2'))
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', '5'))  # seconds
+
+# Login/registration rate limits (DRF throttles, counted in the default cache: set REDIS_URL to share
+# the counters between workers). Login is limited per client IP and per username.
+LOGIN_RATE_PER_IP = os.environ.get('LOGIN_RATE_PER_IP', '20/min')
+LOGIN_RATE_PER_USERNAME = os.environ.get('LOGIN_RATE_PER_USERNAME', '5/min')
+REGISTER_RATE_PER_IP = os.environ.get('REGISTER_RATE_PER_IP', '10/hour')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -151,11 +176,21 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token's claims (no User query per request); see users/authentication.py
+        'users.authentication.StatelessJWTAuthentication'
+        if os.environ.get('JWT_STATELESS_AUTH', 'True') == 'True'
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Proxies in front of the app (e.g. 1 on Render), so throttles use the client's IP from X-Forwarded-For
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': LOGIN_RATE_PER_IP,
+        'login_username': LOGIN_RATE_PER_USERNAME,
+        'register_ip': REGISTER_RATE_PER_IP,
+    },
 }
 
 # JWT Configuration
@@ -182,6 +217,133 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
+# Stateless JWT auth: whether to check that the account is still active (and read its current role)
+# from a status cache, kept per process for AUTH_USER_STATUS_TTL seconds (0: not at all) and in the
+# shared cache for AUTH_USER_STATUS_SHARED_TIMEOUT seconds. Saving or deleting a User invalidates it.
+# The shared layer needs REDIS_URL or CACHE_DIR; with the per-process default cache it is skipped, so
+# a change made through another process is seen within AUTH_USER_STATUS_TTL seconds.
+AUTH_USER_STATUS_CHECK = os.environ.get('AUTH_USER_STATUS_CHECK', 'True') == 'True'
+AUTH_USER_STATUS_TTL = int(os.environ.get('AUTH_USER_STATUS_TTL', '30'))  # seconds
+AUTH_USER_STATUS_SHARED_TIMEOUT = int(os.environ.get('AUTH_USER_STATUS_SHARED_TIMEOUT', '300'))  # seconds
+
+# Cache
+# Local memory by default (per process). Set REDIS_URL to share the cache between workers,
+# or CACHE_DIR for a file-based cache on a single host.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tmf-marketplace',
+        }
+    }
+
+# Anonymous gallery response cache (invalidated on Photo/PhotoRendition changes)
+PHOTO_GALLERY_CACHE_ALIAS = 'default'
+PHOTO_GALLERY_CACHE_TIMEOUT = int(os.environ.get('PHOTO_GALLERY_CACHE_TIMEOUT', '300'))  # seconds
+PHOTO_GALLERY_MAX_AGE = int(os.environ.get('PHOTO_GALLERY_MAX_AGE', '0'))  # Cache-Control max-age for clients
+
+# File URLs for photos (see photos/file_urls.py)
+# 'storage': URLs from the storage backend, presigned for PHOTO_URL_TTL seconds on S3 and cached
+#            until PHOTO_URL_CACHE_MARGIN seconds before they expire.
+# 'cdn':     watermarked files/renditions are served as PHOTO_CDN_BASE_URL + file name (no signing);
+#            originals still use presigned storage URLs.
+# Cached gallery pages embed these URLs, and a page may be cached just as a URL reaches the end of its time in
+# the URL cache, with PHOTO_URL_CACHE_MARGIN seconds left: the page timeout is capped at PHOTO_URL_CACHE_MARGIN.
+PHOTO_URL_MODE = os.environ.get('PHOTO_URL_MODE', 'storage')
+PHOTO_CDN_BASE_URL = os.environ.get('PHOTO_CDN_BASE_URL', '')
+PHOTO_URL_TTL = int(os.environ.get('PHOTO_URL_TTL', '3600'))  # seconds
+PHOTO_URL_CACHE_MARGIN = int(os.environ.get('PHOTO_URL_CACHE_MARGIN', '300'))  # seconds
+PHOTO_URL_CACHE_ALIAS = 'default'
+
+# Local-storage file delivery (/api/photos/files/<id>/<kind>/)
+# '' streams with FileResponse (sendfile via gunicorn); 'x-accel-redirect' (nginx) or 'x-sendfile'
+# (Apache/lighttpd) hand the transfer to the fronting proxy.
+PHOTO_FILE_OFFLOAD = os.environ.get('PHOTO_FILE_OFFLOAD', '')
+PHOTO_FILE_ACCEL_PREFIX = os.environ.get('PHOTO_FILE_ACCEL_PREFIX', '/protected-media/')
+PHOTO_FILE_MAX_AGE = int(os.environ.get('PHOTO_FILE_MAX_AGE', '3600'))  # Cache-Control for public files
+
+# Metrics (/metrics, Prometheus text format; see config/metrics.py)
+# With several gunicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty writable directory so
+# /metrics aggregates all of them. METRICS_TOKEN is required as `Authorization: Bearer <token>`; without
+# it /metrics is only served when DEBUG is on.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Adds a Server-Timing header (app, db, storage, image durations) to every response
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', 'False') == 'True'
+
+# Serve the gallery and download links with the async views (photos/async_views.py) instead of the
+# DRF ones. Meant for ASGI workers: `gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker`.
+PHOTO_ASYNC_VIEWS = os.environ.get('PHOTO_ASYNC_VIEWS', 'False') == 'True'
+# Async requests per worker process running at once (each holds a database connection while it runs)
+PHOTO_ASYNC_DB_CONCURRENCY = int(os.environ.get('PHOTO_ASYNC_DB_CONCURRENCY', '20'))
+
+# Upload limits
+PHOTO_MAX_UPLOAD_BYTES = int(os.environ.get('PHOTO_MAX_UPLOAD_BYTES', str(100 * 1024 * 1024)))
+# Width x height; also applied to Pillow's decompression-bomb check (Image.MAX_IMAGE_PIXELS)
+PHOTO_MAX_IMAGE_PIXELS = int(os.environ.get('PHOTO_MAX_IMAGE_PIXELS', str(120_000_000)))
+# Pillow formats accepted for originals, identified from the file header as it is received
+PHOTO_UPLOAD_FORMATS = os.environ.get('PHOTO_UPLOAD_FORMATS', 'JPEG,PNG,WEBP,AVIF,TIFF,GIF,BMP').split(',')
+# Files per batch upload (/api/photos/upload/batch/); Django rejects requests with more files than this
+PHOTO_BATCH_MAX_FILES = int(os.environ.get('PHOTO_BATCH_MAX_FILES', '100'))
+DATA_UPLOAD_MAX_NUMBER_FILES = PHOTO_BATCH_MAX_FILES
+
+# Direct-to-S3 multipart uploads (/api/photos/uploads/initiate|complete|abort/)
+PHOTO_DIRECT_UPLOAD_PART_SIZE = int(os.environ.get('PHOTO_DIRECT_UPLOAD_PART_SIZE', str(8 * 1024 * 1024)))
+PHOTO_DIRECT_UPLOAD_TTL = int(os.environ.get('PHOTO_DIRECT_UPLOAD_TTL', '3600'))  # seconds
+
+# Image processing queue (see `python manage.py process_image_jobs`)
+# PHOTO_PROCESS_INLINE renders renditions inside the upload request from the uploaded file instead of
+# queueing a job (no re-download of the original); suited to small images or low upload volume.
+PHOTO_PROCESS_INLINE = os.environ.get('PHOTO_PROCESS_INLINE', 'False') == 'True'
+# Concurrent storage writes when saving an original and its renditions
+PHOTO_STORAGE_WORKERS = int(os.environ.get('PHOTO_STORAGE_WORKERS', '8'))
+PHOTO_JOB_MAX_ATTEMPTS = int(os.environ.get('PHOTO_JOB_MAX_ATTEMPTS', '5'))
+PHOTO_JOB_RETRY_BASE_DELAY = int(os.environ.get('PHOTO_JOB_RETRY_BASE_DELAY', '10'))  # seconds
+PHOTO_JOB_RETRY_MAX_DELAY = int(os.environ.get('PHOTO_JOB_RETRY_MAX_DELAY', '600'))  # seconds
+
+# Renditions generated for every photo, keyed by name; max_size is the longest edge in pixels.
+# All renditions are watermarked. `watermarked_image` points at PHOTO_WATERMARKED_RENDITION.
+PHOTO_RENDITIONS = {
+    'thumb': {'max_size': 320, 'quality': 70},
+    'preview': {'max_size': 1280, 'quality': 70},
+    'full': {'max_size': 2560, 'quality': 70},
+}
+PHOTO_WATERMARKED_RENDITION = 'full'
+
+# Encodings written for every rendition, with Pillow save options. JPEG is always written (its quality
+# defaults to the rendition's) and served to clients whose Accept header doesn't list image/webp or image/avif.
+PHOTO_RENDITION_FORMATS = {
+    'jpeg': {'progressive': True, 'optimize': True},
+    'webp': {'quality': int(os.environ.get('PHOTO_WEBP_QUALITY', '65')), 'method': 4},
+    'avif': {'quality': int(os.environ.get('PHOTO_AVIF_QUALITY', '50')), 'speed': 6},
+}
+
+# Watermark: a logo PNG if PHOTO_WATERMARK_LOGO is set, otherwise the text in PHOTO_WATERMARK_FONT
+# (a .ttf path; Pillow's bundled font if empty). Scale is the mark's width relative to the image width.
+PHOTO_WATERMARK_TEXT = os.environ.get('PHOTO_WATERMARK_TEXT', 'TMF-Marketplace')
+PHOTO_WATERMARK_FONT = os.environ.get('PHOTO_WATERMARK_FONT', '')
+PHOTO_WATERMARK_LOGO = os.environ.get('PHOTO_WATERMARK_LOGO', '')
+PHOTO_WATERMARK_OPACITY = int(os.environ.get('PHOTO_WATERMARK_OPACITY', '128'))  # 0-255
+PHOTO_WATERMARK_SCALE = float(os.environ.get('PHOTO_WATERMARK_SCALE', '0.25'))
+PHOTO_WATERMARK_MARGIN = float(os.environ.get('PHOTO_WATERMARK_MARGIN', '0.02'))
+
+# Gallery keyset pagination (?page_size= is capped at the maximum)
+PHOTO_GALLERY_PAGE_SIZE = int(os.environ.get('PHOTO_GALLERY_PAGE_SIZE', '24'))
+PHOTO_GALLERY_MAX_PAGE_SIZE = int(os.environ.get('PHOTO_GALLERY_MAX_PAGE_SIZE', '100'))
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True # For development
 if not DEBUG:
@@ -197,12 +359,16 @@ AWS_S3_SIGNATURE_VERSION = 's3v4'
 AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = None
 AWS_S3_VERIFY = True
+# Point boto3 at an S3-compatible endpoint (MinIO, `moto_server`) instead of AWS
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL')
 
 # Database Configuration (Render compatible)
+# Under ASGI (uvicorn workers) set DB_CONN_MAX_AGE=0: each request's queries run in a fresh thread,
+# so persistent per-thread connections would pile up instead of being reused.
 import dj_database_url
 DATABASES['default'].update(dj_database_url.config(
     default=os.environ.get('DATABASE_URL'),
-    conn_max_age=600,
+    conn_max_age=int(os.environ.get('DB_CONN_MAX_AGE', '600')),
     conn_health_checks=True,
 ))
 
@@ -211,7 +377,7 @@ if AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
     # Production: S3 for Media, WhiteNoise for Static
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+            "BACKEND": "config.storage.InstrumentedS3Storage",
         },
         "staticfiles": {
             "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -221,7 +387,7 @@ else:
     # Local
     STORAGES = {
         "default": {
-            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "BACKEND": "config.storage.InstrumentedFileSystemStorage",
         },
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
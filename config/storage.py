@@ -0,0 +1,59 @@
+"""Storage backends that report every backend call to config.metrics."""
+import hashlib
+
+from django.core.files.storage import FileSystemStorage
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .metrics import track_storage
+
+
+def s3_etag(path, size, config):
+    """
+    The ETag S3 will report for `path` when uploaded with `config` (a boto3 TransferConfig):
+    plain MD5 for single-part uploads, MD5-of-part-MD5s + '-N' for multipart ones.
+    Used by migrate_to_s3 and upload_all_to_s3.py to skip files already in the bucket.
+    """
+    chunk_size = config.multipart_chunksize
+    with open(path, 'rb') as f:
+        if size < config.multipart_threshold:
+            return hashlib.md5(f.read()).hexdigest()
+        digests = []
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digests.append(hashlib.md5(chunk).digest())
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+class InstrumentedStorageMixin:
+    metrics_backend = 'storage'
+
+    def _save(self, name, content):
+        with track_storage(self.metrics_backend, 'save'):
+            return super()._save(name, content)
+
+    def _open(self, name, mode='rb'):
+        with track_storage(self.metrics_backend, 'open'):
+            return super()._open(name, mode)
+
+    def exists(self, name):
+        with track_storage(self.metrics_backend, 'exists'):
+            return super().exists(name)
+
+    def delete(self, name):
+        with track_storage(self.metrics_backend, 'delete'):
+            return super().delete(name)
+
+    def size(self, name):
+        with track_storage(self.metrics_backend, 'size'):
+            return super().size(name)
+
+    def url(self, name, *args, **kwargs):
+        with track_storage(self.metrics_backend, 'url'):
+            return super().url(name, *args, **kwargs)
+
+
+class InstrumentedS3Storage(InstrumentedStorageMixin, S3Boto3Storage):
+    metrics_backend = 's3'
+
+
+class InstrumentedFileSystemStorage(InstrumentedStorageMixin, FileSystemStorage):
+    metrics_backend = 'filesystem'
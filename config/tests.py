@@ -0,0 +1,236 @@
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+import upload_all_to_s3
+from photos.models import Photo
+from users.models import User
+from . import metrics
+from .storage import s3_etag
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from moto import mock_aws
+except ImportError:  # Only needed for the S3 sync tests
+    mock_aws = None
+
+MB = 1024 * 1024
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(PHOTO_URL_MODE='storage', METRICS_SERVER_TIMING=True)
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Photo.objects.create(
+            uploader=User.objects.create(username='uploader', role='Uploader'),
+            title='Sunset', description='Over the bay', capture_date=date(2024, 5, 1),
+            original_image='photos/originals/sunset.jpg', watermarked_image='photos/watermarked/sunset.jpg',
+            status=Photo.STATUS_READY,
+        )
+
+    def test_queries_and_storage_calls_are_counted(self):
+        before = {
+            'requests': sample('http_request_db_queries_count', view='photo-gallery'),
+            'queries': sample('http_request_db_queries_sum', view='photo-gallery'),
+            'storage': sample('http_request_storage_calls_sum', view='photo-gallery'),
+            'latency': sample('http_request_duration_seconds_count', view='photo-gallery', method='GET', status='200'),
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('photo-gallery'))
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(sample('http_request_db_queries_count', view='photo-gallery'), before['requests'] + 1)
+        self.assertEqual(sample('http_request_db_queries_sum', view='photo-gallery'), before['queries'] + len(queries))
+        # One photo, no renditions: only the watermarked image's URL
+        self.assertEqual(sample('http_request_storage_calls_sum', view='photo-gallery'), before['storage'] + 1)
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', view='photo-gallery', method='GET', status='200'),
+            before['latency'] + 1,
+        )
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('photo-gallery'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) queries", '
+            r'storage;dur=[\d.]+;desc="1 calls", image;dur=[\d.]+$',
+        )
+        reported = re.search(r'"(\d+) queries"', response['Server-Timing']).group(1)
+        self.assertEqual(int(reported), len(queries))
+
+        with override_settings(METRICS_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('photo-gallery')))
+
+    def test_unresolved_requests(self):
+        before = sample('http_request_db_queries_count', view='unresolved')
+        self.assertEqual(self.client.get('/no-such-page').status_code, 404)
+        self.assertEqual(sample('http_request_db_queries_count', view='unresolved'), before + 1)
+
+
+class RequestStatsTests(TestCase):
+    def test_image_time_from_many_threads(self):
+        stats = metrics.RequestStats()
+        before = sample('image_processing_seconds_count', stage='encode')
+
+        def encode(_):
+            with metrics.track_image_processing('encode'):
+                pass
+
+        with ThreadPoolExecutor(4, initializer=metrics.bind_request_stats, initargs=(stats,)) as pool:
+            list(pool.map(encode, range(100)))
+        self.assertEqual(sample('image_processing_seconds_count', stage='encode'), before + 100)
+        self.assertGreater(stats.image_time, 0)
+
+
+class MetricsViewTests(TestCase):
+    @override_settings(METRICS_TOKEN='', DEBUG=False)
+    def test_disabled_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_open_in_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='s3cret', DEBUG=False)
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403,
+        )
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_request_duration_seconds', response.content)
+
+
+@unittest.skipIf(mock_aws is None, 'moto is not installed')
+class UploadAllToS3Tests(TestCase):
+    bucket = 'tmf-sync'
+
+    def setUp(self):
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket=self.bucket)
+        for name, value in (('AWS_STORAGE_BUCKET_NAME', self.bucket), ('AWS_S3_ENDPOINT_URL', None)):
+            patcher = mock.patch.object(upload_all_to_s3, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.media_root = os.path.join(self.root, 'media')
+        self.manifest = os.path.join(self.root, 'manifest.json')
+        for name, content in (('originals/a.jpg', b'a' * 100), ('renditions/a_full.jpg', b'b' * 50)):
+            self.write(name, content)
+
+    def write(self, name, content, age=60):
+        """Write a media file last modified `age` seconds ago (S3's LastModified has whole seconds)."""
+        path = os.path.join(self.media_root, 'photos', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def sync(self, *args):
+        argv = ['upload_all_to_s3.py', '--media-root', self.media_root, '--manifest', self.manifest, *args]
+        out = StringIO()
+        with mock.patch.object(sys, 'argv', argv), redirect_stdout(out):
+            upload_all_to_s3.main()
+        return out.getvalue()
+
+    def test_s3_etag_matches_the_bucket(self):
+        config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+        for size in (100, 11 * MB):
+            with self.subTest(size=size):
+                path = self.write('large.bin', os.urandom(size))
+                self.s3.upload_file(path, self.bucket, 'large.bin', Config=config)
+                etag = self.s3.head_object(Bucket=self.bucket, Key='large.bin')['ETag'].strip('"')
+                self.assertEqual(s3_etag(path, size, config), etag)
+
+    def test_needs_upload(self):
+        entry = {'size': 100, 'mtime': 1000.0, 'etag': 'abc'}
+        for remote, with_hash, expected in [
+            (None, False, 'new'),
+            ((90, 'abc', 2000.0), True, 'changed'),
+            ((100, 'abc', 2000.0), True, None),
+            ((100, 'def', 2000.0), True, 'changed'),
+            ((100, 'def', 2000.0), False, None),
+            ((100, 'abc', 500.0), False, 'changed'),
+        ]:
+            with self.subTest(remote=remote, with_hash=with_hash):
+                self.assertEqual(upload_all_to_s3.needs_upload(entry, remote, with_hash), expected)
+
+    def test_unchanged_files_are_skipped_by_etag(self):
+        output = self.sync('--hash')
+        self.assertIn('To upload: 2 files', output)
+        self.assertIn('Uploaded: 2 files', output)
+        with open(self.manifest) as f:
+            self.assertEqual(set(json.load(f)), {'photos/originals/a.jpg', 'photos/renditions/a_full.jpg'})
+
+        # The manifest's hashes are reused while size and mtime are unchanged
+        with mock.patch.object(upload_all_to_s3, 's3_etag') as etag:
+            output = self.sync('--hash')
+        etag.assert_not_called()
+        self.assertIn('To upload: 0 files', output)
+        self.assertIn('unchanged: 2', output)
+
+        # Same size, new content: only the ETag tells
+        self.write('originals/a.jpg', b'c' * 100)
+        output = self.sync('--hash')
+        self.assertIn('To upload: 1 files', output)
+        self.assertIn('Uploaded (changed): photos/originals/a.jpg', output)
+        body = self.s3.get_object(Bucket=self.bucket, Key='photos/originals/a.jpg')['Body'].read()
+        self.assertEqual(body, b'c' * 100)
+
+    def test_new_files_and_dry_run(self):
+        self.sync()
+        self.write('originals/b.jpg', b'd' * 10)
+        output = self.sync('--dry-run')
+        self.assertIn('[new] photos/originals/b.jpg (10 bytes)', output)
+        self.assertNotIn('photos/originals/b.jpg', self.remote_keys())
+
+        self.assertIn('Uploaded: 1 files', self.sync())
+        self.assertIn('photos/originals/b.jpg', self.remote_keys())
+
+        # Without --hash, a file edited after its upload is stale
+        self.write('renditions/a_full.jpg', b'e' * 50, age=-60)
+        output = self.sync()
+        self.assertIn('Uploaded (changed): photos/renditions/a_full.jpg', output)
+        self.assertIn('Uploaded: 1 files', output)
+
+    def test_failed_uploads_keep_the_manifest_stale(self):
+        with mock.patch.object(boto3.s3.transfer.S3Transfer, 'upload_file', side_effect=OSError('connection reset')):
+            output = self.sync('--hash')
+        self.assertIn('Errors: 2', output)
+        self.assertFalse(os.path.exists(self.manifest))
+
+    def remote_keys(self):
+        return {item['Key'] for item in self.s3.list_objects_v2(Bucket=self.bucket).get('Contents', [])}
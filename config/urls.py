@@ -19,10 +19,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
     path('api/photos/', include('photos.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings picked up from the working directory.
+
+With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to that directory and
+/metrics aggregates them (see config/metrics.py). The directory must be emptied before
+gunicorn starts; files of exited workers are marked dead here so their gauges drop out.
+"""
+import os
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,10 +1,31 @@
 from django.contrib import admin
-from .models import Photo
+from .models import Photo, PhotoRendition, ImageJob, UploaderStats
+
+class PhotoRenditionInline(admin.TabularInline):
+    model = PhotoRendition
+    extra = 0
+    max_num = 0
+    readonly_fields = ('name', 'format', 'image', 'width', 'height', 'size_bytes', 'updated_at')
+    can_delete = False
 
 class PhotoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'uploader', 'capture_date', 'created_at')
-    list_filter = ('uploader', 'capture_date')
+    list_display = ('id', 'title', 'uploader', 'capture_date', 'status', 'created_at')
+    list_filter = ('uploader', 'capture_date', 'status')
     search_fields = ('title', 'description', 'uploader__username')
-    readonly_fields = ('watermarked_image', 'created_at')
+    readonly_fields = ('watermarked_image', 'status', 'created_at')
+    inlines = [PhotoRenditionInline]
+
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'photo', 'status', 'attempts', 'max_attempts', 'run_after', 'locked_by', 'peak_memory_bytes', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('photo__title', 'locked_by')
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'peak_memory_bytes', 'created_at', 'updated_at')
+
+class UploaderStatsAdmin(admin.ModelAdmin):
+    list_display = ('uploader', 'photo_count', 'original_bytes', 'rendition_bytes', 'last_upload_at', 'updated_at')
+    search_fields = ('uploader__username',)
+    readonly_fields = ('uploader', 'photo_count', 'original_bytes', 'rendition_bytes', 'last_upload_at', 'updated_at')
 
 admin.site.register(Photo, PhotoAdmin)
+admin.site.register(ImageJob, ImageJobAdmin)
+admin.site.register(UploaderStats, UploaderStatsAdmin)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class PhotosConfig(AppConfig):
     name = 'photos'
+
+    def ready(self):
+        from django.conf import settings
+        from PIL import Image
+
+        from . import signals  # noqa: F401
+
+        # Pillow refuses to decode images over twice this size (DecompressionBombError)
+        Image.MAX_IMAGE_PIXELS = getattr(settings, 'PHOTO_MAX_IMAGE_PIXELS', Image.MAX_IMAGE_PIXELS)
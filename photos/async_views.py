@@ -0,0 +1,126 @@
+"""
+Async variants of the read endpoints (gallery, download links) for ASGI workers.
+
+Under WSGI each request holds a worker thread for its whole life, including the time it waits
+on the cache, the database or URL signing. These views await those instead, so one uvicorn
+worker keeps many slow requests in flight. They are routed in place of GalleryView and
+PhotoDownloadView when PHOTO_ASYNC_VIEWS is on (see photos/urls.py) and answer identically.
+
+The async ORM still runs each request's queries in a thread of its own, with its own database
+connection, so at most PHOTO_ASYNC_DB_CONCURRENCY requests per worker run at once; the others
+wait on the event loop instead of opening connections until Postgres refuses them.
+"""
+import asyncio
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views import View
+from rest_framework.response import Response
+
+from . import cache as gallery_cache
+from .file_urls import get_resolver
+from .views import GalleryView, PhotoDownloadView
+
+_request_slots = weakref.WeakKeyDictionary()
+
+
+def get_request_slots():
+    """The running event loop's semaphore (uvicorn runs one loop per worker process)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _request_slots:
+        _request_slots[loop] = asyncio.Semaphore(getattr(settings, 'PHOTO_ASYNC_DB_CONCURRENCY', 20))
+    return _request_slots[loop]
+
+
+class AsyncAPIView(View):
+    """
+    Runs a DRF view's GET as a coroutine.
+
+    An instance of `view_class` supplies everything but the handler: authentication, permissions,
+    throttles, querysets, serializers, pagination and exception handling, so responses match the sync
+    view's. `initial()` (authentication may read the cache or the database) runs in a thread; subclasses
+    implement `handle()` with the async ORM and cache APIs and must not touch the database otherwise.
+    """
+    view_class = None
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        view = self.view_class()
+        view.setup(request, *args, **kwargs)
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+        async with get_request_slots():
+            try:
+                await sync_to_async(view.initial)(request, *args, **kwargs)
+                response = await self.handle(view, request, *args, **kwargs)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+            finally:
+                # Hand the connection back before the next request takes the slot; with
+                # DB_CONN_MAX_AGE=0 it would otherwise stay open until the response is sent
+                await sync_to_async(close_old_connections)()
+        return view.finalize_response(request, response, *args, **kwargs)
+
+    async def handle(self, view, request, *args, **kwargs):
+        raise NotImplementedError
+
+
+class AsyncGalleryView(AsyncAPIView):
+    """GalleryView.list(), including the anonymous page cache and ETag/Last-Modified revalidation."""
+    view_class = GalleryView
+
+    async def handle(self, view, request, *args, **kwargs):
+        view.get_filters()  # Reject bad parameters before the cache lookup
+        if request.user.is_authenticated:
+            return await self.list(view, request)
+
+        generation = await sync_to_async(gallery_cache.get_generation)()
+        key, url_hash = gallery_cache.response_key(request, generation, view.get_image_format())
+        etag = gallery_cache.etag(generation, url_hash)
+        last_modified = gallery_cache.last_modified(generation)
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            cache = gallery_cache.get_gallery_cache()
+            data = await cache.aget(key)
+            if data is None:
+                response = await self.list(view, request)
+                await cache.aset(key, response.data, gallery_cache.get_timeout())
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'PHOTO_GALLERY_MAX_AGE', 0))
+        return response
+
+    async def list(self, view, request):
+        queryset = view.filter_queryset(view.get_queryset())
+        page = await view.paginator.apaginate_queryset(queryset, request, view=view)
+        serializer = view.get_serializer(page, many=True)
+        files = [field_file for photo in page for field_file in serializer.child.get_public_files(photo)]
+        await get_resolver(serializer.context).aprefetch(files)
+        return view.get_paginated_response(serializer.data)
+
+
+class AsyncPhotoDownloadView(AsyncAPIView):
+    """PhotoDownloadView.retrieve()."""
+    view_class = PhotoDownloadView
+
+    async def handle(self, view, request, *args, **kwargs):
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        queryset = view.filter_queryset(view.get_queryset())
+        photo = await aget_object_or_404(queryset, **{view.lookup_field: kwargs[lookup_url_kwarg]})
+        view.check_object_permissions(request, photo)
+
+        serializer = view.get_serializer(photo)
+        await get_resolver(serializer.context).aprefetch(
+            [serializer.get_watermarked_file(photo)], private_files=[photo.original_image],
+        )
+        return Response(serializer.data)
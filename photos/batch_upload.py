@@ -0,0 +1,130 @@
+"""
+Batch uploads (/api/photos/upload/batch/): many originals in one request.
+
+Items are validated one by one with PhotoUploadSerializer, so an invalid file is reported
+without rejecting the rest. Valid originals are written to storage concurrently
+(PHOTO_STORAGE_WORKERS), then all rows, processing jobs and the uploader's stats are written
+in a single transaction with bulk inserts. Processing is always queued (PHOTO_PROCESS_INLINE
+doesn't apply); files already processed under another photo reuse its renditions.
+"""
+import logging
+
+from django.db import transaction
+from rest_framework import status
+
+from . import stats as uploader_stats
+from .blobs import store_blob
+from .cache import invalidate_gallery
+from .models import Photo, storage_executor
+from .upload_handlers import get_upload_info
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    """One file of a batch and what became of it."""
+
+    def __init__(self, index, data):
+        self.index = index
+        self.data = data
+        self.validated_data = None
+        self.upload_info = None
+        self.stored_name = None
+        self.photo = None
+        self.errors = None
+        self.status_code = None
+
+    @property
+    def filename(self):
+        image = self.data.get('original_image')
+        return getattr(image, 'name', None)
+
+    def fail(self, status_code, errors):
+        self.status_code = status_code
+        self.errors = errors
+
+
+def validate(items, serializer_class, context):
+    """Run each item through `serializer_class`; returns the valid ones."""
+    valid = []
+    for item in items:
+        serializer = serializer_class(data=item.data, context=context)
+        if serializer.is_valid():
+            item.validated_data = serializer.validated_data
+            valid.append(item)
+        else:
+            item.fail(status.HTTP_400_BAD_REQUEST, serializer.errors)
+    return valid
+
+
+def store_original(image):
+    """Store one original (in a storage worker thread); returns its UploadInfo and stored name."""
+    storage = Photo._meta.get_field('original_image').storage
+    info = get_upload_info(image)
+    return info, store_blob(storage, image, info.content_hash)
+
+
+def store_originals(items):
+    """Write every original concurrently; items whose write fails are marked failed and dropped."""
+    stored = []
+    with storage_executor() as executor:
+        futures = [(item, executor.submit(store_original, item.validated_data['original_image'])) for item in items]
+        for item, future in futures:
+            try:
+                item.upload_info, item.stored_name = future.result()
+            except Exception:
+                logger.exception("Batch upload: storing %s failed", item.filename)
+                item.fail(status.HTTP_502_BAD_GATEWAY, {'original_image': ['The file could not be stored, try again.']})
+            else:
+                stored.append(item)
+    return stored
+
+
+def create_photos(uploader_id, items):
+    """Insert the photos of stored items and queue their processing, all in one transaction."""
+    photos = []
+    for item in items:
+        info = item.upload_info
+        photo = Photo(
+            **{**item.validated_data, 'original_image': item.stored_name},
+            uploader_id=uploader_id,
+            content_hash=info.content_hash,
+            original_size_bytes=info.size,
+            width=info.width,
+            height=info.height,
+            image_format=info.format,
+        )
+        photo.update_listable()  # bulk_create skips save()
+        item.photo = photo
+        photos.append(photo)
+
+    with transaction.atomic():
+        Photo.objects.bulk_create(photos)
+
+        # Re-uploads of already processed files are ready immediately, as in UploadPhotoView
+        processed = set(
+            Photo.objects.filter(content_hash__in={photo.content_hash for photo in photos}, status=Photo.STATUS_READY)
+            .values_list('content_hash', flat=True)
+        )
+        reused = [photo for photo in photos if photo.content_hash in processed and photo.reuse_renditions()]
+        for photo in reused:
+            photo.update_listable()
+        Photo.objects.bulk_update(reused, ['watermarked_image', 'status', 'is_listable'])
+        Photo.enqueue_processing_many([photo for photo in photos if photo.status != Photo.STATUS_READY])
+
+        # bulk_create sends no signals: count the uploads and invalidate the gallery here
+        uploader_stats.record_uploads(photos)
+        invalidate_gallery()
+
+    for item in items:
+        item.status_code = status.HTTP_202_ACCEPTED
+    return photos
+
+
+def upload(uploader_id, items, serializer_class, context):
+    """Validate, store and create a batch; every item ends up with a status code and a photo or errors."""
+    valid = validate(items, serializer_class, context)
+    stored = store_originals(valid) if valid else []
+    if stored:
+        create_photos(uploader_id, stored)
+    return items
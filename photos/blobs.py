@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+BLOB_PREFIX = 'photos/blobs/'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(f):
+    """Streaming SHA-256 of a Django File (uploaded or stored), leaving it rewound."""
+    digest = hashlib.sha256()
+    for chunk in f.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(content_hash, filename):
+    """Content-addressed storage name: photos/blobs/ab/<sha256>.<ext>."""
+    extension = os.path.splitext(filename)[1].lower()
+    return f"{BLOB_PREFIX}{content_hash[:2]}/{content_hash}{extension}"
+
+
+def store_blob(storage, f, content_hash):
+    """
+    Store `f` under its content address unless an identical file is already there.
+    Returns the storage name to put on the FileField.
+    """
+    name = blob_name(content_hash, f.name)
+    if storage.exists(name):
+        return name
+    return storage.save(name, f)
+
@@ -0,0 +1,67 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+GENERATION_KEY = 'photos:gallery:generation'
+
+
+def get_gallery_cache():
+    return caches[getattr(settings, 'PHOTO_GALLERY_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    # A page can embed a presigned URL that has only PHOTO_URL_CACHE_MARGIN seconds left (see
+    # photos/file_urls.py), so it mustn't be served from the cache for longer than that
+    timeout = getattr(settings, 'PHOTO_GALLERY_CACHE_TIMEOUT', 300)
+    if getattr(settings, 'PHOTO_URL_MODE', 'storage') == 'storage':
+        timeout = min(timeout, getattr(settings, 'PHOTO_URL_CACHE_MARGIN', 300))
+    return timeout
+
+
+def get_generation():
+    """
+    Current gallery generation: a microsecond timestamp of the last catalog change.
+    Doubling as a timestamp lets it serve as Last-Modified without touching the database.
+    """
+    cache = get_gallery_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Cold cache: we don't know when the catalog last changed, so assume "now"
+        generation = time.time_ns() // 1000
+        if not cache.add(GENERATION_KEY, generation, timeout=get_timeout()):
+            generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+
+def bump_generation():
+    # The generation expires with the cached pages: with a per-process (locmem) cache, bumps made
+    # by other processes (image worker, management commands) can't reach us, so staleness is
+    # bounded by PHOTO_GALLERY_CACHE_TIMEOUT. A shared cache (Redis) makes bumps immediate.
+    cache = get_gallery_cache()
+    current = cache.get(GENERATION_KEY) or 0
+    cache.set(GENERATION_KEY, max(time.time_ns() // 1000, current + 1), timeout=get_timeout())
+
+
+def invalidate_gallery():
+    # Bump after commit so no request can re-cache the pre-change rows under the new generation
+    transaction.on_commit(bump_generation)
+
+
+def last_modified(generation):
+    return generation / 1_000_000
+
+
+def response_key(request, generation, variant=''):
+    """
+    Per-page key: every query parameter (cursor, page_size, ...), the host used for next/previous
+    links and the representation `variant` (the image format negotiated from Accept).
+    """
+    url_hash = hashlib.md5(f"{request.build_absolute_uri()}|{variant}".encode()).hexdigest()
+    return f'photos:gallery:{generation}:{url_hash}', url_hash
+
+
+def etag(generation, url_hash):
+    return f'"{generation:x}-{url_hash[:16]}"'
@@ -0,0 +1,160 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from .file_urls import FileUrlResolver
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Larger than FileResponse's 4KB default; only used when the server can't sendfile()
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class RangeFile:
+    """
+    A file positioned at the start of a byte range that never reads past its end.
+
+    The real fileno() and file position are exposed, so WSGI servers with
+    `wsgi.file_wrapper` (gunicorn) still send the range with sendfile(): they
+    start at the current offset and stop at Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parse a single `Range: bytes=a-b` header into (start, end) inclusive.
+    Returns None to serve the whole file (no/multi/unparseable range) and
+    raises ValueError if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """If-Range: only honour Range when the client's copy is still current."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(last_modified) <= modified
+
+
+def serve_file(request, field_file, private=False):
+    """
+    Deliver a stored file without buffering it in Python memory.
+
+    Remote storages (S3) redirect to a (presigned/CDN) URL. Local files are either
+    handed to the fronting proxy (PHOTO_FILE_OFFLOAD = 'x-accel-redirect' or
+    'x-sendfile') or streamed with FileResponse, with Range and conditional GET support.
+    """
+    if not field_file:
+        raise Http404('File not available')
+
+    try:
+        path = field_file.storage.path(field_file.name)
+    except NotImplementedError:
+        return HttpResponseRedirect(FileUrlResolver(request).url(field_file, private=private))
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('File not found')
+
+    size = stat.st_size
+    etag = f'"{size:x}-{int(stat.st_mtime):x}"'
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        offload = getattr(settings, 'PHOTO_FILE_OFFLOAD', '')
+        if offload == 'x-accel-redirect':
+            # nginx serves the bytes (and Range) from an `internal` location
+            response = HttpResponse(content_type=content_type)
+            prefix = getattr(settings, 'PHOTO_FILE_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + field_file.name
+        elif offload == 'x-sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = path
+        else:
+            response = stream_file(request, path, size, etag, stat.st_mtime, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if private:
+        patch_cache_control(response, private=True, max_age=0)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'PHOTO_FILE_MAX_AGE', 3600))
+    return response
+
+
+def stream_file(request, path, size, etag, mtime, content_type):
+    byte_range = None
+    if range_applies(request, etag, mtime):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    f = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(f, start, length), status=206, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response.block_size = STREAM_BLOCK_SIZE
+    return response
@@ -0,0 +1,146 @@
+import math
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.utils.text import get_valid_filename
+from rest_framework.exceptions import APIException, ValidationError
+
+from .models import Photo
+from .upload_handlers import read_header
+
+TOKEN_SALT = 'photos.direct_upload'
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+MAX_PARTS = 10000
+SNIFF_BYTES = 64 * 1024
+
+
+class DirectUploadUnavailable(APIException):
+    status_code = 501
+    default_detail = 'Direct uploads require S3 storage.'
+    default_code = 'direct_upload_unavailable'
+
+
+def get_storage():
+    storage = Photo._meta.get_field('original_image').storage
+    if not hasattr(storage, 'bucket_name') or not hasattr(storage, 'connection'):
+        raise DirectUploadUnavailable()
+    return storage
+
+
+def get_client(storage):
+    # Same session/endpoint (AWS_S3_ENDPOINT_URL) as the storage backend, so moto works too
+    return storage.connection.meta.client
+
+
+def get_ttl():
+    return getattr(settings, 'PHOTO_DIRECT_UPLOAD_TTL', 3600)
+
+
+def part_size_for(size):
+    part_size = max(getattr(settings, 'PHOTO_DIRECT_UPLOAD_PART_SIZE', 8 * 1024 * 1024), MIN_PART_SIZE)
+    # Grow parts for very large files so we stay within S3's 10,000-part limit
+    return max(part_size, math.ceil(size / MAX_PARTS))
+
+
+def initiate(user, filename, content_type, size):
+    """
+    Start a multipart upload and presign one PUT URL per part.
+    The returned token binds the upload to this user; the client hands it back on completion.
+    """
+    storage = get_storage()
+    client = get_client(storage)
+
+    name = f"photos/originals/{uuid.uuid4().hex}/{get_valid_filename(filename)}"
+    key = storage._normalize_name(name)
+    upload = client.create_multipart_upload(Bucket=storage.bucket_name, Key=key, ContentType=content_type)
+    upload_id = upload['UploadId']
+
+    part_size = part_size_for(size)
+    part_count = max(math.ceil(size / part_size), 1)
+    ttl = get_ttl()
+    parts = [
+        {
+            'part_number': number,
+            'url': client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': storage.bucket_name, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=ttl,
+            ),
+        }
+        for number in range(1, part_count + 1)
+    ]
+
+    token = signing.dumps(
+        {'name': name, 'upload_id': upload_id, 'user': user.pk, 'size': size, 'parts': part_count},
+        salt=TOKEN_SALT,
+    )
+    return {'upload_token': token, 'part_size': part_size, 'expires_in': ttl, 'parts': parts}
+
+
+def load_token(token, user):
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=get_ttl())
+    except signing.SignatureExpired:
+        raise ValidationError({'upload_token': 'Upload token has expired.'})
+    except signing.BadSignature:
+        raise ValidationError({'upload_token': 'Invalid upload token.'})
+    if data['user'] != user.pk:
+        raise ValidationError({'upload_token': 'Invalid upload token.'})
+    return data
+
+
+def complete(token_data, parts):
+    """
+    Assemble the uploaded parts and check the object really is the image that was announced.
+    Returns the storage name to put on Photo.original_image and the image's ImageHeader.
+    """
+    storage = get_storage()
+    client = get_client(storage)
+    key = storage._normalize_name(token_data['name'])
+
+    if len(parts) != token_data['parts']:
+        raise ValidationError({'parts': f"Expected {token_data['parts']} parts, got {len(parts)}."})
+
+    try:
+        client.complete_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=key,
+            UploadId=token_data['upload_id'],
+            MultipartUpload={
+                'Parts': [
+                    {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda part: part['part_number'])
+                ]
+            },
+        )
+    except ClientError as e:
+        raise ValidationError({'parts': f"Could not complete upload: {e.response['Error'].get('Message', e)}"})
+
+    head = client.head_object(Bucket=storage.bucket_name, Key=key)
+    if head['ContentLength'] != token_data['size']:
+        client.delete_object(Bucket=storage.bucket_name, Key=key)
+        raise ValidationError({'parts': 'Uploaded size does not match the announced size.'})
+
+    # Only the first bytes are fetched: enough for Pillow to identify the format
+    data = client.get_object(Bucket=storage.bucket_name, Key=key, Range=f'bytes=0-{SNIFF_BYTES - 1}')['Body'].read()
+    try:
+        header = read_header(data)
+    except ValueError as e:
+        client.delete_object(Bucket=storage.bucket_name, Key=key)
+        raise ValidationError({'parts': str(e)})
+    if header is None:
+        client.delete_object(Bucket=storage.bucket_name, Key=key)
+        raise ValidationError({'parts': 'Uploaded file is not a supported image.'})
+
+    return token_data['name'], header
+
+
+def abort(token_data):
+    storage = get_storage()
+    get_client(storage).abort_multipart_upload(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(token_data['name']),
+        UploadId=token_data['upload_id'],
+    )
@@ -0,0 +1,117 @@
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_url_cache():
+    return caches[getattr(settings, 'PHOTO_URL_CACHE_ALIAS', 'default')]
+
+
+def get_ttl():
+    return getattr(settings, 'PHOTO_URL_TTL', 3600)
+
+
+def cache_timeout():
+    # Drop cached URLs well before the signature expires so clients never get a dead link
+    return max(get_ttl() - getattr(settings, 'PHOTO_URL_CACHE_MARGIN', 300), 0)
+
+
+def cache_key(name):
+    return f'photos:url:{get_ttl()}:{name}'
+
+
+def sign_url(storage, name):
+    """
+    One storage URL. For S3 with query-string auth this is a presigned URL valid
+    for PHOTO_URL_TTL seconds; other backends ignore the TTL.
+    """
+    if getattr(storage, 'querystring_auth', False):
+        return storage.url(name, expire=get_ttl())
+    return storage.url(name)
+
+
+class FileUrlResolver:
+    """
+    Resolves FieldFile URLs for a request.
+
+    - PHOTO_URL_MODE='cdn': public files are `PHOTO_CDN_BASE_URL + name`, no signing at all.
+    - otherwise: URLs come from the storage backend (presigned on S3) and are cached until
+      shortly before they expire. `prefetch()` loads many of them with one cache round-trip
+      (public files are skipped in CDN mode, where url() never signs them).
+
+    Private files (originals) are never served from the CDN.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.mode = getattr(settings, 'PHOTO_URL_MODE', 'storage')
+        self.cdn_base_url = getattr(settings, 'PHOTO_CDN_BASE_URL', '').rstrip('/')
+        self._urls = {}
+
+    def uses_cdn(self, private):
+        return self.mode == 'cdn' and self.cdn_base_url and not private
+
+    def prefetch(self, field_files, private_files=()):
+        """Resolve the URLs of public `field_files` and of `private_files` (originals) in one batch."""
+        missing = self._missing(field_files, private_files)
+        if not missing:
+            return
+        cache = get_url_cache()
+        signed = self._resolve(missing, cache.get_many(list(missing)))
+        if signed:
+            cache.set_many(signed, cache_timeout())
+
+    async def aprefetch(self, field_files, private_files=()):
+        """
+        prefetch() for async views. The cache round-trip and any signing share one thread hop:
+        Django's cache backends implement the async API by running the sync one in a thread anyway.
+        """
+        if self._missing(field_files, private_files):
+            await sync_to_async(self.prefetch)(field_files, private_files)
+
+    def _missing(self, field_files, private_files=()):
+        """Cache key -> FieldFile for the files whose storage URL this resolver doesn't know yet."""
+        if self.uses_cdn(private=False):
+            field_files = ()
+        missing = {}
+        for field_file in [*field_files, *private_files]:
+            if field_file and field_file.name not in self._urls:
+                missing[cache_key(field_file.name)] = field_file
+        return missing
+
+    def _resolve(self, missing, cached):
+        """Take URLs from `cached`, sign the rest; returns the newly signed ones to cache."""
+        signed = {}
+        for key, field_file in missing.items():
+            if key in cached:
+                self._urls[field_file.name] = cached[key]
+            else:
+                url = sign_url(field_file.storage, field_file.name)
+                self._urls[field_file.name] = signed[key] = url
+        return signed
+
+    def url(self, field_file, private=False):
+        if not field_file:
+            return None
+
+        name = field_file.name
+        if self.uses_cdn(private):
+            url = f"{self.cdn_base_url}/{quote(name)}"
+        else:
+            if name not in self._urls:
+                self.prefetch([], private_files=[field_file])
+            url = self._urls[name]
+
+        # S3/CDN URLs are already absolute; local storage URLs are paths
+        if url.startswith('/') and self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+
+def get_resolver(context):
+    """The resolver shared by every serializer rendering the same request."""
+    if 'file_urls' not in context:
+        context['file_urls'] = FileUrlResolver(context.get('request'))
+    return context['file_urls']
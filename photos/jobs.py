@@ -0,0 +1,135 @@
+import logging
+import os
+import socket
+import sys
+from datetime import timedelta
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidate_gallery
+from .models import ImageJob, Photo
+from .renditions import UnprocessableImage
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def retry_delay(attempts):
+    """Exponential backoff between attempts, capped at PHOTO_JOB_RETRY_MAX_DELAY seconds."""
+    base = getattr(settings, 'PHOTO_JOB_RETRY_BASE_DELAY', 10)
+    cap = getattr(settings, 'PHOTO_JOB_RETRY_MAX_DELAY', 600)
+    return timedelta(seconds=min(cap, base * (2 ** max(attempts - 1, 0))))
+
+
+def reset_peak_memory():
+    """Reset the kernel's peak-RSS counter (Linux) so the next reading covers a single job."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_memory_bytes():
+    """Peak resident memory of this process: VmHWM on Linux, ru_maxrss (lifetime peak) elsewhere."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def set_unfinished_status(photo_id, status):
+    """
+    Move a photo that isn't ready yet to `status`. A ready photo that is being re-rendered (new
+    rendition sizes or formats) keeps its status and stays listed on its current files.
+    """
+    photos = Photo.objects.filter(pk=photo_id).exclude(status=Photo.STATUS_READY)
+    # update() skips save() and its post_save signal: unlisting a photo must bump the gallery here
+    if photos.filter(is_listable=True).update(status=status, is_listable=False):
+        invalidate_gallery()
+    else:
+        photos.update(status=status)
+
+
+def claim_job(worker_id):
+    """
+    Lock the next runnable job and mark it as running.
+    SKIP LOCKED lets concurrent workers claim different rows instead of queueing on the same one.
+    """
+    with transaction.atomic():
+        job = (
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImageJob.STATUS_QUEUED, run_after__lte=timezone.now())
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = ImageJob.STATUS_RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_at', 'updated_at'])
+        set_unfinished_status(job.photo_id, Photo.STATUS_PROCESSING)
+    return job
+
+
+def run_job(job):
+    """Process a claimed job, rescheduling it with backoff on failure."""
+    photo = job.photo
+    reset_peak_memory()
+    try:
+        photo.generate_renditions()
+        photo.status = Photo.STATUS_READY
+        photo.save(update_fields=['watermarked_image', 'status', 'content_hash'])
+    except Exception as e:
+        job.peak_memory_bytes = peak_memory_bytes()
+        logger.exception("Image job %s failed for photo %s", job.pk, job.photo_id)
+        job.last_error = f"{type(e).__name__}: {e}"
+        job.locked_by = ''
+        job.locked_at = None
+        # An original that can't be decoded fails the same way on every attempt
+        if isinstance(e, UnprocessableImage) or job.attempts >= job.max_attempts:
+            job.status = ImageJob.STATUS_FAILED
+            set_unfinished_status(job.photo_id, Photo.STATUS_FAILED)
+        else:
+            job.status = ImageJob.STATUS_QUEUED
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            set_unfinished_status(job.photo_id, Photo.STATUS_PENDING)
+        job.save(update_fields=[
+            'status', 'last_error', 'locked_by', 'locked_at', 'run_after', 'peak_memory_bytes', 'updated_at',
+        ])
+        return False
+
+    job.peak_memory_bytes = peak_memory_bytes()
+    logger.info("Image job %s for photo %s done, peak RSS %s bytes", job.pk, job.photo_id, job.peak_memory_bytes)
+    job.status = ImageJob.STATUS_DONE
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'peak_memory_bytes', 'updated_at'])
+    return True
+
+
+def requeue_stale_jobs(stale_after):
+    """Put back jobs whose worker died mid-run (locked for longer than `stale_after`)."""
+    cutoff = timezone.now() - stale_after
+    return ImageJob.objects.filter(
+        status=ImageJob.STATUS_RUNNING, locked_at__lt=cutoff
+    ).update(status=ImageJob.STATUS_QUEUED, locked_by='', locked_at=None, run_after=timezone.now())
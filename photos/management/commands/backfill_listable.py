@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from photos.cache import bump_generation
+from photos.models import Photo
+
+
+class Command(BaseCommand):
+    help = 'Recompute Photo.is_listable in primary-key batches (e.g. after bulk imports or queryset.update())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Number of primary keys covered per UPDATE')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Photo.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write("No photos to backfill")
+            return
+
+        listed = 0
+        unlisted = 0
+        start = bounds['low']
+
+        # Two UPDATEs per pk range keep each transaction short and only touch rows that change
+        while start <= bounds['high']:
+            batch = Photo.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            listed += batch.filter(Photo.LISTABLE_Q, is_listable=False).update(is_listable=True)
+            unlisted += batch.exclude(Photo.LISTABLE_Q).filter(is_listable=True).update(is_listable=False)
+            start += batch_size
+
+        # queryset.update() sends no signals, so invalidate the gallery cache explicitly
+        if listed or unlisted:
+            bump_generation()
+
+        self.stdout.write(self.style.SUCCESS("\n✓ Backfill complete!"))
+        self.stdout.write(f"  Marked listable: {listed}")
+        self.stdout.write(f"  Marked unlisted: {unlisted}")
@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from photos import stats as uploader_stats
+from photos.blobs import BLOB_PREFIX, blob_name, hash_file
+from photos.cache import bump_generation
+from photos.models import ImageJob, Photo, PhotoRendition, file_in_use
+
+
+class Command(BaseCommand):
+    help = 'Backfill Photo.content_hash and make identical originals share one blob and one set of renditions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Photos hashed per batch')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent file reads while hashing')
+        parser.add_argument('--keep-files', action='store_true', help='Do not delete files that are no longer referenced')
+        parser.add_argument('--dry-run', action='store_true', help='Report duplicates without changing anything')
+
+    def handle(self, *args, **options):
+        self.storage = Photo._meta.get_field('original_image').storage
+        self.dry_run = options['dry_run']
+        self.keep_files = options['keep_files']
+        self.stats = {'hashed': 0, 'missing': 0, 'groups': 0, 'collapsed': 0, 'deleted': 0, 'bytes': 0}
+
+        self.stdout.write("Hashing originals without a content hash...")
+        self.backfill_hashes(options['batch_size'], options['workers'])
+
+        duplicates = (
+            Photo.objects.exclude(content_hash='')
+            .values('content_hash')
+            .annotate(copies=Count('id'))
+            .filter(copies__gt=1)
+            .order_by('content_hash')
+        )
+        self.stdout.write(f"Found {duplicates.count()} sets of identical originals")
+        for row in duplicates.iterator():
+            self.collapse(row['content_hash'])
+
+        # bulk_update()/bulk_create() send no signals, so invalidate the gallery cache explicitly
+        if self.stats['collapsed'] and not self.dry_run:
+            bump_generation()
+
+        self.stdout.write(self.style.SUCCESS("\n✓ Deduplication complete!"))
+        self.stdout.write(f"  Hashed: {self.stats['hashed']}")
+        self.stdout.write(f"  Missing originals: {self.stats['missing']}")
+        self.stdout.write(f"  Duplicate sets: {self.stats['groups']}")
+        self.stdout.write(f"  Photos collapsed onto a shared blob: {self.stats['collapsed']}")
+        self.stdout.write(f"  Files deleted: {self.stats['deleted']} ({self.stats['bytes'] / 1024 / 1024:.1f} MB)")
+
+    def backfill_hashes(self, batch_size, workers):
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                photos = list(
+                    Photo.objects.filter(pk__gt=last_pk, content_hash='')
+                    .exclude(original_image='')
+                    .order_by('pk')[:batch_size]
+                )
+                if not photos:
+                    break
+                last_pk = photos[-1].pk
+
+                hashed = []
+                for photo, content_hash in zip(photos, executor.map(self.hash_original, photos)):
+                    if content_hash:
+                        photo.content_hash = content_hash
+                        hashed.append(photo)
+                    else:
+                        self.stats['missing'] += 1
+                if not self.dry_run:
+                    Photo.objects.bulk_update(hashed, ['content_hash'])
+                self.stats['hashed'] += len(hashed)
+
+    def hash_original(self, photo):
+        try:
+            with photo.original_image.open('rb') as f:
+                return hash_file(f)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(f"  ! Original not found for photo {photo.pk}: {photo.original_image.name}"))
+            return None
+
+    def collapse(self, content_hash):
+        """Point every photo with this hash at one blob and the renditions of the first processed copy."""
+        photos = list(Photo.objects.filter(content_hash=content_hash).order_by('pk').prefetch_related('renditions'))
+        processed = [photo for photo in photos if photo.status == Photo.STATUS_READY and photo.renditions.all()]
+        canonical = processed[0] if processed else photos[0]
+        self.stats['groups'] += 1
+
+        if self.dry_run:
+            self.stdout.write(f"  {content_hash[:12]}: {len(photos)} photos, keeping renditions of photo {canonical.pk}")
+            self.stats['collapsed'] += len(photos) - 1
+            return
+
+        blob = self.ensure_blob(canonical, content_hash)
+        shared = list(canonical.renditions.all()) if processed else []
+        stale_files = set()
+
+        with transaction.atomic():
+            for photo in photos:
+                if photo.original_image.name != blob:
+                    stale_files.add(photo.original_image.name)
+                    photo.original_image.name = blob
+
+                if photo is not canonical and shared:
+                    own = list(photo.renditions.all())
+                    stale_files.update(rendition.image.name for rendition in own)
+                    if photo.watermarked_image:
+                        stale_files.add(photo.watermarked_image.name)
+                    PhotoRendition.objects.filter(pk__in=[rendition.pk for rendition in own]).delete()
+                    # UploaderStats counts every photo's renditions, shared ones included (see reuse_renditions)
+                    uploader_stats.record_rendition_bytes(
+                        photo.uploader_id,
+                        sum(rendition.size_bytes for rendition in shared) - sum(rendition.size_bytes for rendition in own),
+                    )
+                    PhotoRendition.objects.bulk_create([
+                        PhotoRendition(
+                            photo=photo,
+                            name=rendition.name,
+                            format=rendition.format,
+                            image=rendition.image.name,
+                            width=rendition.width,
+                            height=rendition.height,
+                            size_bytes=rendition.size_bytes,
+                        )
+                        for rendition in shared
+                    ])
+                    photo.watermarked_image.name = canonical.watermarked_image.name
+                    photo.status = Photo.STATUS_READY
+
+            for photo in photos:
+                photo.update_listable()  # bulk_update skips save()
+            Photo.objects.bulk_update(photos, ['original_image', 'watermarked_image', 'status', 'is_listable'])
+            if shared:
+                # Queued processing for the copies would only re-render what they now share
+                ImageJob.objects.filter(
+                    photo__in=[photo for photo in photos if photo is not canonical],
+                    status=ImageJob.STATUS_QUEUED,
+                ).update(status=ImageJob.STATUS_DONE)
+
+        self.stats['collapsed'] += len(photos) - 1
+        self.stdout.write(f"  ✓ {content_hash[:12]}: {len(photos)} photos now share {blob}")
+
+        if not self.keep_files:
+            for name in sorted(stale_files):
+                self.delete_if_unused(name)
+
+    def ensure_blob(self, photo, content_hash):
+        """The content-addressed name of `photo`'s original, copying it there if needed."""
+        if photo.original_image.name.startswith(BLOB_PREFIX):
+            return photo.original_image.name
+        name = blob_name(content_hash, photo.original_image.name)
+        if self.storage.exists(name):
+            return name
+        with photo.original_image.open('rb') as f:
+            return self.storage.save(name, f)
+
+    def delete_if_unused(self, name):
+        if not name or file_in_use(name):
+            return
+        try:
+            size = self.storage.size(name)
+            self.storage.delete(name)
+        except FileNotFoundError:
+            return
+        self.stats['deleted'] += 1
+        self.stats['bytes'] += size
@@ -1,88 +1,213 @@
 from django.core.management.base import BaseCommand
-from photos.models import Photo
+from django.conf import settings
+from config.storage import s3_etag
+from photos.models import Photo, PhotoRendition
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+import json
 import os
-from django.conf import settings
+import threading
+import time
+
+
+MB = 1024 * 1024
 
 
 class Command(BaseCommand):
-    help = 'Migrate local photo files to S3 storage using boto3'
+    help = 'Migrate local photo files to S3 storage using boto3 (parallel, resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent file uploads')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Photos loaded and committed per batch')
+        parser.add_argument('--checkpoint', default='.migrate_to_s3.checkpoint.json', help='Progress file used to resume interrupted runs')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first photo')
+        parser.add_argument('--media-root', default=str(settings.MEDIA_ROOT), help='Directory holding the local files')
+        parser.add_argument('--multipart-threshold', type=int, default=16, help='Use multipart uploads above this size (MB)')
+        parser.add_argument('--multipart-chunksize', type=int, default=16, help='Multipart part size (MB)')
+        parser.add_argument('--size-only', action='store_true', help='Skip objects whose size matches, without comparing ETags')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be uploaded without uploading or saving')
 
     def handle(self, *args, **options):
-        # Initialize S3 client
+        # Initialize S3 client (thread-safe, shared by all workers)
         s3_client = boto3.client(
             's3',
             aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.environ.get('AWS_S3_REGION_NAME', 'us-east-1')
+            region_name=os.environ.get('AWS_S3_REGION_NAME', 'us-east-1'),
+            endpoint_url=os.environ.get('AWS_S3_ENDPOINT_URL'),
         )
-        
+
         bucket_name = os.environ.get('AWS_STORAGE_BUCKET_NAME')
-        
+
         if not bucket_name:
             self.stdout.write(self.style.ERROR("AWS_STORAGE_BUCKET_NAME not configured!"))
             return
-        
-        photos = Photo.objects.all()
-        total = photos.count()
-        
+
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.media_root = options['media_root']
+        self.size_only = options['size_only']
+        self.dry_run = options['dry_run']
+        self.transfer_config = TransferConfig(
+            multipart_threshold=options['multipart_threshold'] * MB,
+            multipart_chunksize=options['multipart_chunksize'] * MB,
+            max_concurrency=4,
+        )
+
+        checkpoint_path = options['checkpoint']
+        checkpoint = {'last_pk': 0, 'failed': []}
+        if not options['restart'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+            self.stdout.write(f"Resuming after photo {checkpoint['last_pk']} ({len(checkpoint['failed'])} failed photo(s) to retry)")
+
+        total = Photo.objects.filter(pk__gt=checkpoint['last_pk']).count() + len(checkpoint['failed'])
         self.stdout.write(f"Found {total} photos to migrate to S3: {bucket_name}")
-        
+
+        self.stats = {'files': 0, 'bytes': 0, 'skipped': 0, 'errors': 0, 'missing': 0}
+        self.stats_lock = threading.Lock()
+
+        self.stdout.write("Listing existing objects in the bucket...")
+        self.remote = self.list_remote('photos/')
+        self.stdout.write(f"  {len(self.remote)} objects already under photos/")
         migrated = 0
-        skipped = 0
-        errors = 0
-        
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            self.executor = executor
+
+            # Photos that failed in a previous run go first
+            retry = list(checkpoint['failed'])
+            checkpoint['failed'] = []
+            for start in range(0, len(retry), options['chunk_size']):
+                pks = retry[start:start + options['chunk_size']]
+                photos = Photo.objects.filter(pk__in=pks).order_by('pk').prefetch_related('renditions')
+                migrated += self.migrate_chunk(list(photos), checkpoint)
+                self.save_checkpoint(checkpoint_path, checkpoint)
+
+            while True:
+                photos = list(
+                    Photo.objects.filter(pk__gt=checkpoint['last_pk'])
+                    .order_by('pk')
+                    .prefetch_related('renditions')[:options['chunk_size']]
+                )
+                if not photos:
+                    break
+                migrated += self.migrate_chunk(photos, checkpoint)
+                checkpoint['last_pk'] = photos[-1].pk
+                self.save_checkpoint(checkpoint_path, checkpoint)
+                self.report_progress(migrated, total, started)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(f"\n✓ Migration complete!"))
+        self.stdout.write(f"  Migrated: {migrated}")
+        self.stdout.write(f"  Uploaded files: {self.stats['files']} ({self.stats['bytes'] / MB:.1f} MB)")
+        self.stdout.write(f"  Skipped (already in bucket): {self.stats['skipped']}")
+        self.stdout.write(f"  Missing locally: {self.stats['missing']}")
+        self.stdout.write(f"  Errors: {self.stats['errors']}")
+        self.stdout.write(f"  Throughput: {self.stats['bytes'] / MB / elapsed:.2f} MB/s, {self.stats['files'] / elapsed:.1f} files/s")
+        if checkpoint['failed']:
+            self.stdout.write(self.style.WARNING(f"  {len(checkpoint['failed'])} photo(s) failed; re-run to retry them"))
+
+    def migrate_chunk(self, photos, checkpoint):
+        """Upload every file of `photos` in parallel, then write all changed paths with bulk_update."""
+        # (object, field name, file) for originals, watermarked files and renditions
+        targets = []
         for photo in photos:
+            targets.append((photo, 'original_image', photo.original_image))
+            targets.append((photo, 'watermarked_image', photo.watermarked_image))
+            for rendition in photo.renditions.all():
+                targets.append((rendition, 'image', rendition.image))
+        targets = [(obj, field, field_file) for obj, field, field_file in targets if field_file]
+
+        futures = {}
+        uploads = {}
+        for obj, field, field_file in targets:
+            s3_key = self.s3_key(field_file)
+            # watermarked_image usually points at the 'full' rendition file: upload it once
+            if s3_key not in uploads:
+                uploads[s3_key] = self.executor.submit(self.upload, field_file.name, s3_key, self.remote.get(s3_key))
+            futures[(obj, field)] = (uploads[s3_key], s3_key)
+
+        changed_photos = {}
+        changed_renditions = {}
+        failed = set()
+        for (obj, field), (future, s3_key) in futures.items():
+            photo_pk = obj.pk if isinstance(obj, Photo) else obj.photo_id
             try:
-                # Migrate original image
-                if photo.original_image:
-                    try:
-                        # Get local file path
-                        local_path = photo.original_image.path
-                        
-                        if os.path.exists(local_path):
-                            # Define S3 key (path in bucket)
-                            s3_key = f'photos/originals/{os.path.basename(local_path)}'
-                            
-                            # Upload to S3
-                            with open(local_path, 'rb') as f:
-                                s3_client.upload_fileobj(f, bucket_name, s3_key)
-                            
-                            # Update database with S3 path
-                            photo.original_image.name = s3_key
-                            self.stdout.write(f"  ✓ Uploaded original: {photo.title} -> {s3_key}")
-                        else:
-                            self.stdout.write(self.style.WARNING(f"  ! File not found: {local_path}"))
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"  ✗ Error with original: {photo.title} - {str(e)}"))
-                        errors += 1
-                
-                # Migrate watermarked image
-                if photo.watermarked_image:
-                    try:
-                        local_path = photo.watermarked_image.path
-                        
-                        if os.path.exists(local_path):
-                            s3_key = f'photos/watermarked/{os.path.basename(local_path)}'
-                            
-                            with open(local_path, 'rb') as f:
-                                s3_client.upload_fileobj(f, bucket_name, s3_key)
-                            
-                            photo.watermarked_image.name = s3_key
-                            self.stdout.write(f"  ✓ Uploaded watermarked: {photo.title} -> {s3_key}")
-                    except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"  ✗ Error with watermarked: {photo.title} - {str(e)}"))
-                        errors += 1
-                
-                # Save updated paths
-                photo.save(update_fields=['original_image', 'watermarked_image'])
-                migrated += 1
-                
+                ok = future.result()
             except Exception as e:
-                self.stdout.write(self.style.ERROR(f"  ✗ Unexpected error for {photo.title}: {str(e)}"))
-                errors += 1
-        
-        self.stdout.write(self.style.SUCCESS(f"\n✓ Migration complete!"))
-        self.stdout.write(f"  Migrated: {migrated}")
-        self.stdout.write(f"  Skipped: {skipped}")
-        self.stdout.write(f"  Errors: {errors}")
+                self.stdout.write(self.style.ERROR(f"  ✗ Error with {field}: photo {photo_pk} - {str(e)}"))
+                failed.add(photo_pk)
+                continue
+            if ok and getattr(obj, field).name != s3_key:
+                getattr(obj, field).name = s3_key
+                if isinstance(obj, Photo):
+                    changed_photos[obj.pk] = obj
+                else:
+                    changed_renditions[obj.pk] = obj
+
+        self.count(errors=sum(1 for future in uploads.values() if future.exception()))
+        checkpoint['failed'].extend(sorted(failed))
+
+        if not self.dry_run:
+            # Update database with S3 paths, one statement per batch instead of one save() per photo
+            Photo.objects.bulk_update(changed_photos.values(), ['original_image', 'watermarked_image'], batch_size=500)
+            PhotoRendition.objects.bulk_update(changed_renditions.values(), ['image'], batch_size=500)
+
+        return len(photos) - len(failed)
+
+    def count(self, **increments):
+        with self.stats_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def s3_key(self, field_file):
+        # Define S3 key (path in bucket): the storage name, or upload folder + file name for legacy absolute paths
+        if os.path.isabs(field_file.name):
+            return f"{field_file.field.upload_to.rstrip('/')}/{os.path.basename(field_file.name)}"
+        return field_file.name
+
+    def list_remote(self, prefix):
+        """Size/ETag of every object under `prefix`: one paginated listing instead of a HEAD per file."""
+        remote = {}
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                remote[obj['Key']] = (obj['Size'], obj['ETag'].strip('"'))
+        return remote
+
+    def upload(self, name, s3_key, remote):
+        """Upload one file unless the bucket already has it. Returns False if the local file is missing."""
+        local_path = os.path.join(self.media_root, name)
+        if not os.path.exists(local_path):
+            self.stdout.write(self.style.WARNING(f"  ! File not found: {local_path}"))
+            self.count(missing=1)
+            return remote is not None
+
+        size = os.path.getsize(local_path)
+        if remote is not None and remote[0] == size:
+            if self.size_only or remote[1] == s3_etag(local_path, size, self.transfer_config):
+                self.count(skipped=1)
+                return True
+
+        if not self.dry_run:
+            self.s3_client.upload_file(local_path, self.bucket_name, s3_key, Config=self.transfer_config)
+        self.count(files=1, bytes=size)
+        return True
+
+    def save_checkpoint(self, path, checkpoint):
+        if self.dry_run:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+    def report_progress(self, migrated, total, started):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(
+            f"  … {migrated}/{total} photos, {self.stats['files']} files, "
+            f"{self.stats['bytes'] / MB / elapsed:.2f} MB/s, {self.stats['files'] / elapsed:.1f} files/s"
+        )
@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from photos.jobs import claim_job, default_worker_id, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run a worker that processes queued image jobs (watermark generation)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=0, help='Exit after processing this many jobs (0 = no limit)')
+        parser.add_argument('--stale-after', type=int, default=900, help='Requeue running jobs locked for longer than this many seconds')
+        parser.add_argument('--worker-id', default=None, help='Identifier recorded on claimed jobs (defaults to host:pid)')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or default_worker_id()
+        stale_after = timedelta(seconds=options['stale_after'])
+        max_jobs = options['max_jobs']
+
+        self.stdout.write(f"Image job worker {worker_id} started")
+
+        processed = 0
+        succeeded = 0
+        failed = 0
+
+        last_reap = None
+
+        try:
+            while True:
+                # Reaping stale locks is cheap but not free; once a minute is plenty
+                if last_reap is None or time.monotonic() - last_reap > 60:
+                    requeued = requeue_stale_jobs(stale_after)
+                    last_reap = time.monotonic()
+                    if requeued:
+                        self.stdout.write(self.style.WARNING(f"  ! Requeued {requeued} stale job(s)"))
+
+                job = claim_job(worker_id)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                if run_job(job):
+                    succeeded += 1
+                    peak = f", peak RSS {job.peak_memory_bytes / 1024 / 1024:.0f} MB" if job.peak_memory_bytes else ''
+                    self.stdout.write(f"  ✓ Job {job.pk}: photo {job.photo_id} processed{peak}")
+                else:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(
+                        f"  ✗ Job {job.pk}: photo {job.photo_id} attempt {job.attempts}/{job.max_attempts} - {job.last_error}"
+                    ))
+
+                processed += 1
+                if max_jobs and processed >= max_jobs:
+                    break
+        except KeyboardInterrupt:
+            self.stdout.write("Interrupted, shutting down")
+
+        self.stdout.write(self.style.SUCCESS(f"\n✓ Worker {worker_id} finished"))
+        self.stdout.write(f"  Processed: {processed}")
+        self.stdout.write(f"  Succeeded: {succeeded}")
+        self.stdout.write(f"  Failed: {failed}")
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from photos import stats as uploader_stats
+from photos.models import Photo, UploaderStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute UploaderStats from the photos table (after bulk imports, or to correct drift)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploader', type=int, action='append', help='Only this uploader id (repeatable)')
+        parser.add_argument('--measure-originals', action='store_true',
+                            help='First fill in missing original sizes (photos uploaded before they were recorded) from storage')
+        parser.add_argument('--batch-size', type=int, default=500, help='Photos measured per batch')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent storage size lookups')
+
+    def handle(self, *args, **options):
+        uploader_ids = options['uploader']
+        if options['measure_originals']:
+            self.stdout.write("Measuring originals without a recorded size...")
+            measured, missing = self.measure_originals(uploader_ids, options['batch_size'], options['workers'])
+            self.stdout.write(f"  Measured: {measured}, missing files: {missing}")
+
+        if not uploader_ids:
+            # Uploaders with photos, and stale rows of uploaders who no longer have any
+            uploader_ids = sorted(
+                set(Photo.objects.values_list('uploader_id', flat=True).distinct())
+                | set(UploaderStats.objects.values_list('uploader_id', flat=True))
+            )
+
+        photos = 0
+        for uploader_id in uploader_ids:
+            photos += uploader_stats.rebuild(uploader_id).photo_count
+
+        self.stdout.write(self.style.SUCCESS("\n✓ Uploader stats rebuilt!"))
+        self.stdout.write(f"  Uploaders: {len(uploader_ids)}")
+        self.stdout.write(f"  Photos counted: {photos}")
+
+    def measure_originals(self, uploader_ids, batch_size, workers):
+        storage = Photo._meta.get_field('original_image').storage
+        queryset = Photo.objects.filter(original_size_bytes=0).exclude(original_image='')
+        if uploader_ids:
+            queryset = queryset.filter(uploader_id__in=uploader_ids)
+
+        def size(photo):
+            try:
+                return storage.size(photo.original_image.name)
+            except FileNotFoundError:
+                self.stdout.write(self.style.WARNING(f"  ! Original not found for photo {photo.pk}: {photo.original_image.name}"))
+                return None
+
+        measured = missing = 0
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                photos = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+                if not photos:
+                    break
+                last_pk = photos[-1].pk
+
+                sized = []
+                for photo, size_bytes in zip(photos, executor.map(size, photos)):
+                    if size_bytes is None:
+                        missing += 1
+                    else:
+                        photo.original_size_bytes = size_bytes
+                        sized.append(photo)
+                Photo.objects.bulk_update(sized, ['original_size_bytes'])
+                measured += len(sized)
+        return measured, missing
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_initial_status(apps, schema_editor):
+    # Photos processed by the old synchronous save() are ready; anything without a
+    # watermark (e.g. a swallowed processing error) gets queued for the worker.
+    Photo = apps.get_model('photos', 'Photo')
+    ImageJob = apps.get_model('photos', 'ImageJob')
+    Photo.objects.exclude(watermarked_image='').exclude(watermarked_image__isnull=True).update(status='ready')
+    pending = Photo.objects.filter(status='pending').values_list('pk', flat=True)
+    ImageJob.objects.bulk_create([ImageJob(photo_id=pk) for pk in pending.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0002_alter_photo_capture_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='photos.photo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='imagejob_status_run_after_idx')],
+            },
+        ),
+        migrations.RunPython(set_initial_status, migrations.RunPython.noop),
+    ]
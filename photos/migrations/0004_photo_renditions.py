@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def queue_rendition_jobs(apps, schema_editor):
+    # Photos processed before renditions existed only have `watermarked_image`;
+    # queue them so the worker fills in thumb/preview/full.
+    Photo = apps.get_model('photos', 'Photo')
+    ImageJob = apps.get_model('photos', 'ImageJob')
+    ready = Photo.objects.filter(status='ready').values_list('pk', flat=True)
+    ImageJob.objects.bulk_create([ImageJob(photo_id=pk) for pk in ready.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0003_image_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('image', models.ImageField(upload_to='photos/renditions/')),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('photo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='photos.photo')),
+            ],
+            options={
+                'ordering': ['width'],
+                'constraints': [models.UniqueConstraint(fields=('photo', 'name'), name='unique_photo_rendition')],
+            },
+        ),
+        migrations.RunPython(queue_rendition_jobs, migrations.RunPython.noop),
+    ]
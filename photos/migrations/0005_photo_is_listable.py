@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_is_listable(apps, schema_editor):
+    # Same predicate as Photo.LISTABLE_Q; `manage.py backfill_listable` does this in batches.
+    Photo = apps.get_model('photos', 'Photo')
+    Photo.objects.filter(status='ready').exclude(title='').exclude(description='').exclude(
+        capture_date__isnull=True,
+    ).update(is_listable=True)
+
+
+class Migration(migrations.Migration):
+
+    # Folds in a gallery index on the raw predicate (0005) that this migration used to drop again
+    replaces = [
+        ('photos', '0005_gallery_keyset_index'),
+        ('photos', '0006_photo_is_listable'),
+    ]
+
+    dependencies = [
+        ('photos', '0004_photo_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='is_listable',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(backfill_is_listable, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(condition=models.Q(('is_listable', True)), fields=['-created_at', '-id'], name='photo_listable_idx'),
+        ),
+    ]
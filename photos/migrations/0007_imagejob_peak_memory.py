@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0005_photo_is_listable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='peak_memory_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0007_imagejob_peak_memory'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='photorendition',
+            name='unique_photo_rendition',
+        ),
+        migrations.AddField(
+            model_name='photorendition',
+            name='format',
+            field=models.CharField(default='jpeg', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='photorendition',
+            constraint=models.UniqueConstraint(fields=('photo', 'name', 'format'), name='unique_photo_rendition_format'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:16
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+# Title matches rank above description matches (weights A and B). The config must match photos/search.py.
+CREATE_SEARCH_TRIGGER = """
+CREATE FUNCTION photos_photo_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER photos_photo_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON photos_photo
+    FOR EACH ROW EXECUTE FUNCTION photos_photo_search_vector_update();
+
+UPDATE photos_photo SET search_vector = NULL;
+
+CREATE INDEX photo_search_idx ON photos_photo USING gin (search_vector);
+"""
+
+DROP_SEARCH_TRIGGER = """
+DROP INDEX IF EXISTS photo_search_idx;
+DROP TRIGGER IF EXISTS photos_photo_search_vector_trigger ON photos_photo;
+DROP FUNCTION IF EXISTS photos_photo_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # Full-text search is PostgreSQL-only; elsewhere search_vector stays NULL (see photos/search.py)
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_TRIGGER)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0009_photo_content_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photo',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # The trigger also backfills: the UPDATE of search_vector fires it for every existing row
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(condition=models.Q(('is_listable', True)), fields=['capture_date'], name='photo_listable_capture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(condition=models.Q(('is_listable', True)), fields=['uploader', '-created_at', '-id'], name='photo_listable_uploader_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def seed_uploader_stats(apps, schema_editor):
+    # Original sizes weren't recorded before this migration: `rebuild_uploader_stats --measure-originals` fills them in
+    Photo = apps.get_model('photos', 'Photo')
+    PhotoRendition = apps.get_model('photos', 'PhotoRendition')
+    UploaderStats = apps.get_model('photos', 'UploaderStats')
+
+    rendition_bytes = dict(
+        PhotoRendition.objects.values_list('photo__uploader_id').annotate(total=Sum('size_bytes')).order_by()
+    )
+    totals = Photo.objects.values('uploader_id').annotate(count=Count('id'), last=Max('created_at')).order_by()
+    UploaderStats.objects.bulk_create([
+        UploaderStats(
+            uploader_id=row['uploader_id'],
+            photo_count=row['count'],
+            rendition_bytes=rendition_bytes.get(row['uploader_id']) or 0,
+            last_upload_at=row['last'],
+        )
+        for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0010_photo_search'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploaderStats',
+            fields=[
+                ('uploader', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='photo_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('photo_count', models.PositiveIntegerField(default=0)),
+                ('original_bytes', models.PositiveBigIntegerField(default=0)),
+                ('rendition_bytes', models.PositiveBigIntegerField(default=0)),
+                ('last_upload_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'uploader stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='photo',
+            name='original_size_bytes',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='photo',
+            index=models.Index(fields=['uploader', '-created_at', '-id'], name='photo_uploader_created_idx'),
+        ),
+        migrations.RunPython(seed_uploader_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:05
+
+from django.db import migrations
+
+
+def unlist_unprocessed(apps, schema_editor):
+    # is_listable now also requires status == ready (Photo.LISTABLE_Q)
+    Photo = apps.get_model('photos', 'Photo')
+    Photo.objects.filter(is_listable=True).exclude(status='ready').update(is_listable=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('photos', '0012_photo_image_header'),
+    ]
+
+    operations = [
+        migrations.RunPython(unlist_unprocessed, migrations.RunPython.noop),
+    ]
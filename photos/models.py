@@ -1,102 +1,375 @@
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from io import BytesIO
-from PIL import Image, ImageDraw, ImageFont
+from django.utils import timezone
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import os
+
+from config.metrics import bind_request_stats, current_stats
+
+from .blobs import hash_file, store_blob
+from .renditions import FALLBACK_FORMAT, FORMATS, check_dimensions, render_renditions
 
 User = get_user_model()
 
 class Photo(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
     uploader = models.ForeignKey(User, on_delete=models.CASCADE, related_name='photos')
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     capture_date = models.DateField(null=True, blank=True)
     original_image = models.ImageField(upload_to='photos/originals/')
     watermarked_image = models.ImageField(upload_to='photos/watermarked/', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # SHA-256 of the original; identical uploads share one blob and one set of renditions
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    # Size of the original as uploaded, so per-uploader totals never ask the storage backend
+    original_size_bytes = models.PositiveBigIntegerField(default=0, editable=False)
+    # The original's Pillow format and dimensions, read from its header on upload (photos/upload_handlers.py);
+    # blank for photos uploaded before they were recorded
+    image_format = models.CharField(max_length=16, blank=True, editable=False)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Denormalized gallery predicate, kept current by save() and `backfill_listable`
+    is_listable = models.BooleanField(default=False, editable=False)
+    # Full-text search document (title + description), written by a PostgreSQL trigger; see photos/search.py
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # The gallery shows processed photos with a title, a description and a capture date
+    LISTABLE_FIELDS = ('title', 'description', 'capture_date', 'status')
+    LISTABLE_Q = (
+        ~models.Q(title='') & ~models.Q(description='') & models.Q(capture_date__isnull=False)
+        & models.Q(status=STATUS_READY)
+    )
+
+    class Meta:
+        indexes = [
+            # Matches GalleryView: WHERE is_listable ORDER BY created_at DESC, id DESC
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='photo_listable_idx',
+                condition=models.Q(is_listable=True),
+            ),
+            # Gallery filters: capture date ranges and a single uploader's listable photos
+            models.Index(
+                fields=['capture_date'],
+                name='photo_listable_capture_idx',
+                condition=models.Q(is_listable=True),
+            ),
+            models.Index(
+                fields=['uploader', '-created_at', '-id'],
+                name='photo_listable_uploader_idx',
+                condition=models.Q(is_listable=True),
+            ),
+            # An uploader's own photos, listed or not (MyPhotosView)
+            models.Index(fields=['uploader', '-created_at', '-id'], name='photo_uploader_created_idx'),
+            # The GIN index on search_vector is PostgreSQL-only and created in migration 0010
+        ]
+
     def __str__(self):
         return self.title
 
+    def update_listable(self):
+        """Recompute is_listable; save() does this, bulk_create() callers must do it themselves."""
+        self.is_listable = bool(
+            self.title and self.description and self.capture_date is not None and self.status == self.STATUS_READY
+        )
+
     def save(self, *args, **kwargs):
-        # Check if this is an existing object to avoid re-processing if not needed
-        # Or simply check if a new original_image is set but watermarked_image isn't.
-        # Here we process if we have an original_image and no watermarked_image.
-        # (A robust real-world app might track field changes better)
-        
-        process_watermark = False
-        if self.original_image and not self.watermarked_image:
-            process_watermark = True
-
-        super().save(*args, **kwargs) # Save first to ensure file is available/referenced if needed
-
-        if process_watermark and self.original_image:
-            self._process_image()
-            # Save again to update the watermarked_image field
-            # Avoid endless loop by passing update_fields? 
-            # OR better: do it before super().save() but accessing file content
-            # might require the file to be readable. 
-            # In memory files (uploads) are readable.
-            # Let's adjust: call processing *after* save to be safe with storage backends
-            # then save again.
-            super().save(update_fields=['watermarked_image'])
-
-    def _process_image(self):
+        self.update_listable()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.LISTABLE_FIELDS):
+            kwargs['update_fields'] = set(update_fields) | {'is_listable'}
+        super().save(*args, **kwargs)
+
+    def enqueue_processing(self):
+        """
+        Queue watermark generation for this photo.
+        The work itself is done by the `process_image_jobs` worker, never inside the request.
+        """
+        return ImageJob.objects.create(
+            photo=self,
+            max_attempts=getattr(settings, 'PHOTO_JOB_MAX_ATTEMPTS', 5),
+        )
+
+    @classmethod
+    def enqueue_processing_many(cls, photos):
+        """enqueue_processing() for many saved photos with one INSERT."""
+        max_attempts = getattr(settings, 'PHOTO_JOB_MAX_ATTEMPTS', 5)
+        return ImageJob.objects.bulk_create([ImageJob(photo=photo, max_attempts=max_attempts) for photo in photos])
+
+    def generate_renditions(self):
+        """
+        Decode the original once and store every configured rendition, or reuse the
+        renditions of an already-processed photo with the same content.
+        """
         if not self.original_image:
             return
 
-        # Open the original image
-        # Note: 'self.original_image' is a FieldFile. We can open it.
-        try:
-            with self.original_image.open('rb') as f:
-                image = Image.open(f)
-                image = image.convert('RGB') # Ensure RGB for JPEG
-
-                # 1. Compress / Resize if needed (Optional: maintain aspect ratio)
-                # For this task, we'll just re-save as JPEG which handles compression.
-                # Let's ensure it's not massive, max width 1920? User didn't specify size, just "compressed".
-                # We'll stick to quality reduction.
-                
-                # 2. Add Watermark
-                draw = ImageDraw.Draw(image)
-                text = "TMF-Marketplace"
-                
-                # Try to load a font, fall back to default
-                try:
-                    # Generic font availability varies by OS
-                    font = ImageFont.truetype("arial.ttf", 36)
-                except IOError:
-                    font = ImageFont.load_default()
-
-                # Basic positioning: Bottom Right
-                # Calculate text size (rudimentary for default font)
-                # For default font, getbbox might not be perfect or available in older PIL
-                # but 'getbbox' is standard in newer Pillow.
-                
-                if hasattr(font, 'getbbox'):
-                     bbox = font.getbbox(text)
-                     text_width = bbox[2] - bbox[0]
-                     text_height = bbox[3] - bbox[1]
-                else:
-                     text_width, text_height = draw.textsize(text, font) # Deprecated in newer Pillow
-
-                width, height = image.size
-                x = width - text_width - 20
-                y = height - text_height - 20
-                
-                # Draw text (White with black outline for visibility?)
-                # Simple white text for now as per "Add a text watermark" request.
-                draw.text((x, y), text, font=font, fill=(255, 255, 255, 128))
-
-                # 3. Save to BytesIO
-                output_io = BytesIO()
-                image.save(output_io, format='JPEG', quality=70) # Compressed quality
-                
-                # Create a simple filename
-                name_parts = self.original_image.name.split('/')[-1].split('.')
-                filename = f"{name_parts[0]}_watermarked.jpg"
-
-                self.watermarked_image.save(filename, ContentFile(output_io.getvalue()), save=False)
-        except Exception as e:
-            print(f"Error processing image: {e}")
-            # In production, log this error propertly
+        if self.width and self.height:
+            # Known from the upload: refuse an oversized image before fetching it
+            check_dimensions(self.width, self.height)
+
+        with self.original_image.open('rb') as f:
+            if not self.content_hash:
+                self.content_hash = hash_file(f)
+            if self.reuse_renditions():
+                return
+            rendered = render_renditions(f, image_format=self.image_format or None)
+        self.store_renditions(rendered)
+
+    def find_processed_twin(self):
+        """An earlier, fully processed photo with the same original content, if any."""
+        if not self.content_hash:
+            return None
+        return (
+            Photo.objects.filter(content_hash=self.content_hash, status=self.STATUS_READY)
+            .exclude(pk=self.pk)
+            .order_by('pk')
+            .prefetch_related('renditions')
+            .first()
+        )
+
+    def reuse_renditions(self):
+        """
+        Point this photo at a twin's rendition files instead of rendering them again.
+        Only applies to photos without renditions of their own. Returns True if reused;
+        the caller saves `watermarked_image` and `status` (save() adds `is_listable`).
+        """
+        twin = self.find_processed_twin()
+        if twin is None or self.renditions.exists():
+            return False
+        source = list(twin.renditions.all())
+        if not source:
+            return False
+
+        PhotoRendition.objects.bulk_create([
+            PhotoRendition(
+                photo=self,
+                name=rendition.name,
+                format=rendition.format,
+                image=rendition.image.name,
+                width=rendition.width,
+                height=rendition.height,
+                size_bytes=rendition.size_bytes,
+            )
+            for rendition in source
+        ])
+        # Shared files still count towards each photo's uploader
+        from .stats import record_rendition_bytes
+        record_rendition_bytes(self.uploader_id, sum(rendition.size_bytes for rendition in source))
+        self.watermarked_image.name = twin.watermarked_image.name
+        self.status = self.STATUS_READY
+        return True
+
+    def store_renditions(self, rendered, executor=None):
+        """
+        Persist RenderedImages as PhotoRendition rows, replacing any previous files.
+        Files are written concurrently (on `executor`, else PHOTO_STORAGE_WORKERS threads);
+        rows are written in bulk from the calling thread.
+        """
+        stem = os.path.splitext(os.path.basename(self.original_image.name))[0]
+        with nullcontext(executor) if executor is not None else storage_executor() as executor:
+            names = [future.result() for future in write_rendition_files(rendered, stem, executor)]
+        self.attach_renditions(rendered, names)
+
+    def save_processed(self, original, rendered):
+        """
+        Inline processing (PHOTO_PROCESS_INLINE): write the original blob and every rendition
+        straight from the uploaded file, concurrently, then insert the photo and its renditions
+        in one transaction. The original is never read back from storage.
+        """
+        storage = self._meta.get_field('original_image').storage
+        with storage_executor() as executor:
+            original_name = executor.submit(store_blob, storage, original, self.content_hash)
+            rendition_names = write_rendition_files(rendered, self.content_hash, executor)
+            # Assign the stored name so FileField.pre_save doesn't write the upload a second time
+            self.original_image = original_name.result()
+            names = [future.result() for future in rendition_names]
+
+        with transaction.atomic():
+            self.watermarked_image.name = watermarked_file(rendered, names)
+            self.status = self.STATUS_READY
+            self.save()
+            self.attach_renditions(rendered, names)
+
+    def attach_renditions(self, rendered, names):
+        """
+        Point this photo's PhotoRendition rows at freshly written files (one bulk INSERT/UPDATE).
+        `watermarked_image` keeps pointing at the PHOTO_WATERMARKED_RENDITION JPEG for older clients.
+        """
+        existing = {(rendition.name, rendition.format): rendition for rendition in self.renditions.all()}
+        created = []
+        updated = []
+        replaced = []
+        size_delta = 0
+        now = timezone.now()
+
+        for item, name in zip(rendered, names):
+            rendition = existing.get((item.name, item.format))
+            if rendition is None:
+                rendition = PhotoRendition(photo=self, name=item.name, format=item.format)
+                created.append(rendition)
+            else:
+                if rendition.image.name != name:
+                    replaced.append(rendition.image.name)
+                updated.append(rendition)
+                size_delta -= rendition.size_bytes
+            rendition.image.name = name
+            rendition.width = item.width
+            rendition.height = item.height
+            rendition.size_bytes = len(item.content)
+            rendition.updated_at = now
+            size_delta += rendition.size_bytes
+
+        PhotoRendition.objects.bulk_create(created)
+        PhotoRendition.objects.bulk_update(updated, ['image', 'width', 'height', 'size_bytes', 'updated_at'])
+        from .stats import record_rendition_bytes
+        record_rendition_bytes(self.uploader_id, size_delta)
+        self.watermarked_image.name = watermarked_file(rendered, names) or self.watermarked_image.name
+
+        # Renditions reused from a twin share files; only delete what nothing else points at
+        storage = PhotoRendition._meta.get_field('image').storage
+        for old_file in replaced:
+            if old_file and not file_in_use(old_file, exclude_photo=self):
+                storage.delete(old_file)
+
+
+def get_storage_workers():
+    return getattr(settings, 'PHOTO_STORAGE_WORKERS', 8)
+
+
+def storage_executor():
+    # Worker threads report their storage calls to the current request's metrics
+    return ThreadPoolExecutor(
+        max_workers=get_storage_workers(),
+        initializer=bind_request_stats,
+        initargs=(current_stats.get(),),
+    )
+
+
+def write_rendition_files(rendered, stem, executor):
+    """Submit one storage write per RenderedImage; returns futures of the stored names, in order."""
+    field = PhotoRendition._meta.get_field('image')
+    return [
+        executor.submit(
+            field.storage.save,
+            field.generate_filename(None, f"{stem}_{item.name}.{FORMATS[item.format].extension}"),
+            ContentFile(item.content),
+            # A 64-character content hash stem plus the storage's suffix for a taken name can overflow the column
+            max_length=field.max_length,
+        )
+        for item in rendered
+    ]
+
+
+def watermarked_file(rendered, names):
+    """The stored name of the PHOTO_WATERMARKED_RENDITION JPEG among freshly written renditions."""
+    watermarked_name = getattr(settings, 'PHOTO_WATERMARKED_RENDITION', 'full')
+    for item, name in zip(rendered, names):
+        if item.name == watermarked_name and item.format == FALLBACK_FORMAT:
+            return name
+    return None
+
+
+def file_in_use(name, exclude_photo=None):
+    """Whether any photo (other than `exclude_photo`) or rendition still points at the stored file `name`."""
+    photos = Photo.objects.filter(models.Q(original_image=name) | models.Q(watermarked_image=name))
+    if exclude_photo is not None:
+        photos = photos.exclude(pk=exclude_photo.pk)
+    return photos.exists() or PhotoRendition.objects.filter(image=name).exists()
+
+
+class PhotoRendition(models.Model):
+    """
+    A watermarked, downscaled copy of a Photo (thumb / preview / full, see PHOTO_RENDITIONS)
+    in one encoding (jpeg / webp / avif, see PHOTO_RENDITION_FORMATS).
+    """
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='renditions')
+    name = models.CharField(max_length=50)
+    format = models.CharField(max_length=10, default=FALLBACK_FORMAT)
+    image = models.ImageField(upload_to='photos/renditions/')
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size_bytes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['photo', 'name', 'format'], name='unique_photo_rendition_format'),
+        ]
+        ordering = ['width']
+
+    def __str__(self):
+        return f"{self.photo_id}:{self.name}.{self.format} ({self.width}x{self.height})"
+
+
+class UploaderStats(models.Model):
+    """
+    Running totals of an uploader's photos for the dashboard (/api/photos/mine/stats/).
+    Maintained incrementally by photos/stats.py; `rebuild_uploader_stats` recomputes them.
+    """
+    uploader = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='photo_stats')
+    photo_count = models.PositiveIntegerField(default=0)
+    original_bytes = models.PositiveBigIntegerField(default=0)
+    rendition_bytes = models.PositiveBigIntegerField(default=0)
+    last_upload_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'uploader stats'
+
+    def __str__(self):
+        return f"Stats for uploader {self.uploader_id}: {self.photo_count} photos"
+
+
+class ImageJob(models.Model):
+    """
+    A unit of image processing work, stored in the database so any number of
+    `process_image_jobs` workers can pick jobs up with SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    photo = models.ForeignKey(Photo, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    # Worker peak RSS while processing the last attempt
+    peak_memory_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='imagejob_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"ImageJob {self.pk} ({self.status}) for photo {self.photo_id}"
@@ -0,0 +1,176 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a unique ordering such as (-created_at, -id).
+
+    Each page is fetched with `WHERE (created_at, id) < (last seen)` instead of an
+    OFFSET, so page 1000 costs the same as page 1 when an index matches the ordering.
+    Cursors are opaque base64 blobs carrying the boundary row's ordering values.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 24
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views: the page is fetched with the async ORM."""
+        return self.set_page([obj async for obj in self.get_page_queryset(queryset, request, view)])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The (unevaluated) query for the requested page, plus one extra row."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+
+        self.cursor = self.decode_cursor(request, queryset.model)
+        reverse = self.cursor is not None and self.cursor['reverse']
+        if self.cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(self.cursor['position'], reverse))
+
+        ordering = [self.flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        # Fetch one extra row to learn whether another page exists in this direction
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def set_page(self, results):
+        """Trim the fetched rows (see get_page_queryset) to the page and note its boundaries."""
+        cursor = self.cursor
+        reverse = cursor is not None and cursor['reverse']
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = cursor is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.first = results[0] if results else None
+        self.last = results[-1] if results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is None:
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, view):
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering())
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        return self.encode_cursor(self.first, reverse=True)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def keyset_filter(self, position, reverse):
+        """
+        Row-value comparison spelled out for the ORM:
+        (a, b) < (x, y)  ==  a <= x AND (a < x OR (a = x AND b < y))
+        The redundant `a <= x` gives the planner an index range to seek to.
+        """
+        clauses = []
+        lookups = []
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            lookups.append(lookup)
+            equal = {self.ordering[j].lstrip('-'): position[j] for j in range(i)}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': position[i]}))
+        leading = Q(**{f'{self.ordering[0].lstrip("-")}__{lookups[0]}e': position[0]})
+        return leading & reduce(or_, clauses)
+
+    def encode_cursor(self, obj, reverse):
+        position = [self._encode_value(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            position = [
+                self._decode_value(model, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, position)
+            ]
+            return {'position': position, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, ValidationError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _encode_value(value):
+        # isoformat() keeps microseconds; keyset equality needs the exact value
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _decode_value(model, name, value):
+        # Keyset columns are never NULL, and None can't be compared against
+        if value is None:
+            raise ValueError
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations (e.g. a search rank) travel as plain JSON numbers
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError
+            return value
+        return field.to_python(value)
+
+
+class GalleryCursorPagination(KeysetPagination):
+    page_size = getattr(settings, 'PHOTO_GALLERY_PAGE_SIZE', 24)
+    max_page_size = getattr(settings, 'PHOTO_GALLERY_MAX_PAGE_SIZE', 100)
@@ -0,0 +1,215 @@
+import math
+from collections import namedtuple
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from config.metrics import track_image_processing
+from PIL import Image
+
+from .watermark import apply_watermark
+
+# Sizes are the longest edge in pixels; every rendition is watermarked.
+DEFAULT_RENDITIONS = {
+    'thumb': {'max_size': 320, 'quality': 70},
+    'preview': {'max_size': 1280, 'quality': 70},
+    'full': {'max_size': 2560, 'quality': 70},
+}
+
+# Reduce by whole factors down to ~2x the target, then finish with a real resampling filter
+REDUCING_GAP = 2.0
+
+# Modes reduce()/resize() handle natively; anything else (palette, 16-bit, 1-bit) is converted first
+RESAMPLE_MODES = {'L', 'RGB', 'RGBA', 'CMYK'}
+
+# Pillow formats reported by an image that another plugin opens (see open_formats)
+OPEN_AS = {'MPO': 'JPEG'}
+
+# Encodings written for every rendition. JPEG is always produced and is the fallback for
+# clients that accept neither WebP nor AVIF; its quality defaults to the rendition's.
+DEFAULT_FORMATS = {
+    'jpeg': {'progressive': True, 'optimize': True},
+    'webp': {'quality': 65, 'method': 4},
+    'avif': {'quality': 50, 'speed': 6},
+}
+
+OutputFormat = namedtuple('OutputFormat', ['pillow_format', 'content_type', 'extension'])
+FORMATS = {
+    'jpeg': OutputFormat('JPEG', 'image/jpeg', 'jpg'),
+    'webp': OutputFormat('WEBP', 'image/webp', 'webp'),
+    'avif': OutputFormat('AVIF', 'image/avif', 'avif'),
+}
+FALLBACK_FORMAT = 'jpeg'
+
+# Served when the client accepts them, best first
+PREFERRED_FORMATS = ('avif', 'webp')
+
+RenditionSpec = namedtuple('RenditionSpec', ['name', 'max_size', 'quality'])
+RenderedImage = namedtuple('RenderedImage', ['name', 'width', 'height', 'format', 'content'])
+
+
+def get_rendition_specs():
+    """Configured renditions (PHOTO_RENDITIONS), largest first."""
+    config = getattr(settings, 'PHOTO_RENDITIONS', DEFAULT_RENDITIONS)
+    specs = [
+        RenditionSpec(name, options['max_size'], options.get('quality', 70))
+        for name, options in config.items()
+    ]
+    return sorted(specs, key=lambda spec: spec.max_size, reverse=True)
+
+
+@lru_cache(maxsize=None)
+def get_output_formats():
+    """
+    {format: save options} for PHOTO_RENDITION_FORMATS, limited to what this Pillow build can encode
+    (AVIF needs Pillow >= 11.2). Computed once per process; treat the result as read-only.
+    """
+    config = getattr(settings, 'PHOTO_RENDITION_FORMATS', DEFAULT_FORMATS)
+    formats = {FALLBACK_FORMAT: {}}
+    formats.update(config)
+    Image.init()
+    return {
+        name: options for name, options in formats.items()
+        if name == FALLBACK_FORMAT or (name in FORMATS and FORMATS[name].pillow_format in Image.SAVE)
+    }
+
+
+@receiver(setting_changed)
+def reset_output_formats(setting, **kwargs):
+    if setting == 'PHOTO_RENDITION_FORMATS':
+        get_output_formats.cache_clear()
+
+
+def negotiate_format(accept):
+    """
+    Best enabled format the `Accept` header lists by name with q > 0 (highest q first, then
+    PREFERRED_FORMATS order), falling back to JPEG. Wildcards never select AVIF or WebP: browsers
+    that can't decode them send `image/*` and `*/*` too (Safari before 14).
+    """
+    accepted = {}
+    for item in (accept or '').split(','):
+        media_type, _, params = item.partition(';')
+        media_type = media_type.strip().lower()
+        if not media_type or media_type.endswith('/*'):  # `image/*`, `*/*`
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type] = quality
+
+    enabled = get_output_formats()
+    candidates = [
+        (accepted.get(FORMATS[name].content_type, 0), -rank, name)
+        for rank, name in enumerate(PREFERRED_FORMATS)
+        if name in enabled
+    ]
+    quality, _, name = max(candidates, default=(0, 0, FALLBACK_FORMAT))
+    return name if quality > 0 else FALLBACK_FORMAT
+
+
+def select_renditions(renditions, image_format):
+    """{name: rendition} in `image_format`, using the JPEG rendition where that encoding doesn't exist (yet)."""
+    selected = {}
+    for rendition in renditions:
+        if rendition.format == image_format or (rendition.format == FALLBACK_FORMAT and rendition.name not in selected):
+            selected[rendition.name] = rendition
+    return selected
+
+
+def get_max_pixels():
+    return getattr(settings, 'PHOTO_MAX_IMAGE_PIXELS', 120_000_000)
+
+
+def open_formats(image_format):
+    """The `formats` for Image.open() of an original whose Pillow format is known (None: try them all)."""
+    if not image_format:
+        return None
+    Image.init()
+    # Multi-picture JPEGs report MPO but are opened by the JPEG plugin
+    image_format = OPEN_AS.get(image_format, image_format)
+    return [image_format] if image_format in Image.OPEN else None
+
+
+class UnprocessableImage(ValueError):
+    """The original can't be rendered (not an image, corrupt, truncated or too large): retrying won't help."""
+
+
+def check_dimensions(width, height):
+    """Reject images whose decoded size would exceed PHOTO_MAX_IMAGE_PIXELS."""
+    max_pixels = get_max_pixels()
+    if width * height > max_pixels:
+        raise UnprocessableImage(f"Image is {width}x{height} ({width * height} pixels), the limit is {max_pixels}")
+
+
+def render_renditions(fp, specs=None, image_format=None):
+    """
+    Decode `fp` once and return a RenderedImage per spec.
+    Each rendition is derived from the previous (larger) one, so the original
+    is only ever scaled down once per step. `image_format`, the Pillow format if
+    already known (Photo.image_format), spares probing the other formats.
+    """
+    specs = specs or get_rendition_specs()
+    largest = specs[0].max_size
+
+    with track_image_processing('decode'):
+        try:
+            source = Image.open(fp, formats=open_formats(image_format))
+            check_dimensions(*source.size)
+            # For JPEGs, let libjpeg decode directly at a reduced scale (1/2, 1/4, 1/8)
+            # that still covers the biggest rendition. The box has the image's aspect ratio:
+            # a square one would hold a panorama's short side to `largest` and block the scaling.
+            width, height = source.size
+            scale = min(1, largest / max(width, height))
+            source.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+            if source.mode not in RESAMPLE_MODES:
+                source = source.convert('RGB')
+            # Shrink before converting to RGB, and drop the full-size decode as soon as we have the largest rendition
+            image = downscale(source, largest)
+            del source
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image.load()  # Images already small enough are still undecoded here
+        except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+            # A header can parse over a corrupt or truncated body; decoding is where that shows
+            raise UnprocessableImage(f"The image could not be decoded: {e}") from e
+
+    formats = get_output_formats()
+    rendered = []
+    for index, spec in enumerate(specs):
+        with track_image_processing('watermark'):
+            image = downscale(image, spec.max_size)
+            # The unmarked image is the source of the next (smaller) rendition; the last one can be marked in place
+            marked = image if index == len(specs) - 1 else image.copy()
+            apply_watermark(marked)
+
+        with track_image_processing('encode'):
+            for format_name, options in formats.items():
+                output_io = BytesIO()
+                marked.save(output_io, format=FORMATS[format_name].pillow_format, **{'quality': spec.quality, **options})
+                rendered.append(RenderedImage(spec.name, marked.width, marked.height, format_name, output_io.getvalue()))
+    return rendered
+
+
+def downscale(image, max_size):
+    """Fit `image` within max_size x max_size, using reduce() for the bulk of the work."""
+    width, height = image.size
+    longest = max(width, height)
+    if longest <= max_size:
+        return image
+
+    factor = int(longest / (max_size * REDUCING_GAP))
+    if factor >= 2:
+        image = image.reduce(factor)
+        width, height = image.size
+
+    scale = max_size / max(width, height)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return image.resize(size, Image.Resampling.LANCZOS)
+
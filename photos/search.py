@@ -0,0 +1,39 @@
+"""
+Gallery search over title and description.
+
+On PostgreSQL this is full-text search: Photo.search_vector (title weighted above description) is
+maintained by a trigger (migration 0010) and GIN-indexed, and matches are ranked with ts_rank.
+Other databases (SQLite in development) fall back to case-insensitive substring matching of every
+term, in the gallery's usual newest-first order.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+
+# Must match the text search configuration used by the trigger in migration 0010
+SEARCH_CONFIG = 'english'
+
+# Best match first; (created_at, id) keeps the keyset ordering unique for equal ranks
+RANKED_ORDERING = ('-search_rank', '-created_at', '-id')
+
+
+def uses_full_text(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'postgresql'
+
+
+def search(queryset, text, ranked=True):
+    """Photos in `queryset` matching `text`; with full-text search and `ranked` they're annotated with `search_rank`."""
+    if uses_full_text(queryset.db):
+        # websearch syntax: "quoted phrases", OR, -excluded
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        if not ranked:
+            return queryset.filter(search_vector=query)
+        # ts_rank() is a float4; as float8 the value round-trips through the cursor exactly,
+        # so the keyset comparison (rank = boundary rank AND ...) matches ties
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(search_rank=rank)
+
+    for term in text.split():
+        queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+    return queryset
@@ -1,18 +1,245 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Photo
+from .models import Photo, UploaderStats
+from .file_urls import get_resolver
+from . import blobs, direct_upload, renditions
+from .renditions import FALLBACK_FORMAT, FORMATS, select_renditions
+from .upload_handlers import get_upload_formats, get_upload_info
+
+class UploadedImageField(serializers.ImageField):
+    """
+    An ImageField that takes PhotoUploadHandler's verdict (photos/upload_handlers.py) instead of
+    opening the image with Pillow again. Files it couldn't identify from their header, or that
+    came through other upload handlers, get the usual ImageField validation.
+    """
+
+    def to_internal_value(self, data):
+        error = getattr(data, 'upload_error', None)
+        if error is not None:
+            raise serializers.ValidationError(error)
+        if getattr(data, 'upload_info', None) is not None:
+            return serializers.FileField.to_internal_value(self, data)
+        value = super().to_internal_value(data)
+        image_format = value.image.format
+        if renditions.OPEN_AS.get(image_format, image_format) not in get_upload_formats():
+            self.fail('invalid_image')
+        return value
 
 class PhotoUploadSerializer(serializers.ModelSerializer):
+    original_image = UploadedImageField()
+
     class Meta:
         model = Photo
-        fields = ['id', 'title', 'description', 'capture_date', 'original_image']
-        read_only_fields = ['id']
+        fields = ['id', 'title', 'description', 'capture_date', 'original_image', 'status']
+        read_only_fields = ['id', 'status']
+
+    def validate_original_image(self, value):
+        max_bytes = getattr(settings, 'PHOTO_MAX_UPLOAD_BYTES', 100 * 1024 * 1024)
+        if value.size > max_bytes:
+            raise serializers.ValidationError(f"File is larger than the {max_bytes} byte limit.")
+
+        # ImageField validation already parsed the header; only the dimensions are read, nothing is decoded.
+        # (PhotoUploadHandler checks them while receiving the file, and ImageField doesn't open those.)
+        image = getattr(value, 'image', None)
+        if image is not None:
+            try:
+                renditions.check_dimensions(*image.size)
+            except ValueError as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
+    def create(self, validated_data):
+        # Identical files are stored once, under their SHA-256 (see photos/blobs.py)
+        image = validated_data['original_image']
+        info = get_upload_info(image)
+        content_hash = info.content_hash
+        validated_data.update(
+            content_hash=content_hash, original_size_bytes=image.size,
+            width=info.width, height=info.height, image_format=info.format,
+        )
+
+        if getattr(settings, 'PHOTO_PROCESS_INLINE', False) and Photo(content_hash=content_hash).find_processed_twin() is None:
+            # Render from the uploaded (temporary) file, then write everything at once. A header can
+            # look fine over a corrupt body: that is a bad upload, reported before anything is stored.
+            try:
+                rendered = renditions.render_renditions(image, image_format=info.format)
+            except renditions.UnprocessableImage as e:
+                raise serializers.ValidationError({'original_image': [str(e)]})
+            image.seek(0)
+            photo = Photo(**validated_data)
+            photo.save_processed(image, rendered)
+            return photo
+
+        storage = Photo._meta.get_field('original_image').storage
+        validated_data['original_image'] = blobs.store_blob(storage, image, content_hash)
+        return super().create(validated_data)
+
+class PhotoBatchUploadSerializer(serializers.Serializer):
+    """
+    The envelope of a batch upload: `files`, plus optional `metadata`, a JSON list of
+    {title, description, capture_date} objects in the same order. Each file is then
+    validated on its own with PhotoUploadSerializer (see photos/batch_upload.py).
+    """
+    files = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+    metadata = serializers.JSONField(binary=True, required=False)
+
+    def validate_files(self, value):
+        max_files = getattr(settings, 'PHOTO_BATCH_MAX_FILES', 100)
+        if len(value) > max_files:
+            raise serializers.ValidationError(f"At most {max_files} files per batch.")
+        return value
+
+    def validate_metadata(self, value):
+        if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+            raise serializers.ValidationError("Expected a list of objects, one per file.")
+        return value
+
+    def validate(self, attrs):
+        attrs.setdefault('metadata', [{} for _ in attrs['files']])
+        if len(attrs['metadata']) != len(attrs['files']):
+            raise serializers.ValidationError({'metadata': "Needs one entry per file, in the same order."})
+        return attrs
+
+    def get_items(self):
+        """Per-file data for PhotoUploadSerializer, in upload order."""
+        return [
+            {**metadata, 'original_image': file}
+            for file, metadata in zip(self.validated_data['files'], self.validated_data['metadata'])
+        ]
+
+class DirectUploadInitiateSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=200)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_content_type(self, value):
+        if not value.startswith('image/'):
+            raise serializers.ValidationError("Only image uploads are accepted.")
+        return value
+
+    def validate_size(self, value):
+        max_bytes = getattr(settings, 'PHOTO_MAX_UPLOAD_BYTES', 100 * 1024 * 1024)
+        if value > max_bytes:
+            raise serializers.ValidationError(f"File is larger than the {max_bytes} byte limit.")
+        return value
+
+class DirectUploadPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1, max_value=direct_upload.MAX_PARTS)
+    etag = serializers.CharField(max_length=100)
+
+class DirectUploadTokenSerializer(serializers.Serializer):
+    upload_token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        attrs['token_data'] = direct_upload.load_token(attrs['upload_token'], self.context['request'].user)
+        return attrs
+
+class DirectUploadCompleteSerializer(DirectUploadTokenSerializer, serializers.ModelSerializer):
+    parts = DirectUploadPartSerializer(many=True, write_only=True)
 
-class PhotoGallerySerializer(serializers.ModelSerializer):
     class Meta:
         model = Photo
-        fields = ['id', 'title', 'description', 'capture_date', 'watermarked_image']
+        fields = ['id', 'title', 'description', 'capture_date', 'status', 'upload_token', 'parts']
+        read_only_fields = ['id', 'status']
+
+    def create(self, validated_data):
+        validated_data.pop('upload_token')
+        token_data = validated_data.pop('token_data')
+        parts = validated_data.pop('parts')
+        # The object is already in the bucket; the row just points at it
+        validated_data['original_image'], header = direct_upload.complete(token_data, parts)
+        validated_data.update(
+            original_size_bytes=token_data['size'],
+            width=header.width, height=header.height, image_format=header.format,
+        )
+        return super().create(validated_data)
+
+class GalleryFilterSerializer(serializers.Serializer):
+    """Gallery query parameters. Date bounds are inclusive."""
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    # Ranking reads every match, so `newest` is cheaper for terms that match much of the catalog
+    sort = serializers.ChoiceField(choices=['relevance', 'newest'], default='relevance')
+    captured_after = serializers.DateField(required=False)
+    captured_before = serializers.DateField(required=False)
+    uploader = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        after, before = attrs.get('captured_after'), attrs.get('captured_before')
+        if after and before and after > before:
+            raise serializers.ValidationError({'captured_before': 'Must not be earlier than captured_after.'})
+        return attrs
+
+class PrefetchedUrlListSerializer(serializers.ListSerializer):
+    """Resolves every file URL of the page in one batch before rendering the items."""
+
+    def to_representation(self, data):
+        items = data.all() if hasattr(data, 'all') else data
+        files = []
+        for obj in items:
+            files.extend(self.child.get_public_files(obj))
+        get_resolver(self.context).prefetch(files)
+        return super().to_representation(items)
+
+class NegotiatedRenditionsMixin:
+    """
+    Picks each photo's renditions in the format negotiated by the view (`image_format` in the
+    context, from the Accept header), falling back to JPEG. Relies on `renditions` being prefetched.
+    """
+
+    def get_renditions(self, obj):
+        return select_renditions(obj.renditions.all(), self.context.get('image_format', FALLBACK_FORMAT))
+
+    def get_watermarked_file(self, obj):
+        rendition = self.get_renditions(obj).get(getattr(settings, 'PHOTO_WATERMARKED_RENDITION', 'full'))
+        return rendition.image if rendition else obj.watermarked_image
+
+class PhotoGallerySerializer(NegotiatedRenditionsMixin, serializers.ModelSerializer):
+    watermarked_image = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Photo
+        fields = ['id', 'title', 'description', 'capture_date', 'watermarked_image', 'srcset']
+        list_serializer_class = PrefetchedUrlListSerializer
+
+    def get_public_files(self, obj):
+        return [self.get_watermarked_file(obj)] + [rendition.image for rendition in self.get_renditions(obj).values()]
+
+    def get_watermarked_image(self, obj):
+        return get_resolver(self.context).url(self.get_watermarked_file(obj))
+
+    def get_srcset(self, obj):
+        # Map of rendition name -> url/size so clients only fetch the size they render.
+        resolver = get_resolver(self.context)
+        return {
+            name: {
+                'url': resolver.url(rendition.image),
+                'width': rendition.width,
+                'height': rendition.height,
+                'type': FORMATS[rendition.format].content_type,
+            }
+            for name, rendition in self.get_renditions(obj).items()
+        }
+
+class UploaderPhotoSerializer(PhotoGallerySerializer):
+    """An uploader's own photo: gallery fields plus processing status, whether it is listed, and size."""
+
+    class Meta(PhotoGallerySerializer.Meta):
+        fields = PhotoGallerySerializer.Meta.fields + [
+            'status', 'is_listable', 'original_size_bytes', 'created_at',
+        ]
+
+class UploaderStatsSerializer(serializers.ModelSerializer):
+    total_bytes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploaderStats
+        fields = ['photo_count', 'original_bytes', 'rendition_bytes', 'total_bytes', 'last_upload_at']
+
+    def get_total_bytes(self, obj):
+        return obj.original_bytes + obj.rendition_bytes
 
-class PhotoDownloadSerializer(serializers.ModelSerializer):
+class PhotoDownloadSerializer(NegotiatedRenditionsMixin, serializers.ModelSerializer):
     original_image_url = serializers.SerializerMethodField()
     watermarked_image_url = serializers.SerializerMethodField()
 
@@ -21,23 +248,8 @@ class PhotoDownloadSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'original_image_url', 'watermarked_image_url']
 
     def get_original_image_url(self, obj):
-        if obj.original_image:
-            # S3 URLs are already absolute, don't use build_absolute_uri
-            url = obj.original_image.url
-            # Only build absolute URI if it's a local path (starts with /)
-            if url.startswith('/'):
-                request = self.context.get('request')
-                return request.build_absolute_uri(url) if request else url
-            return url
-        return None
+        # Originals are private: presigned (or local) URLs only, never the CDN
+        return get_resolver(self.context).url(obj.original_image, private=True)
 
     def get_watermarked_image_url(self, obj):
-        if obj.watermarked_image:
-            # S3 URLs are already absolute, don't use build_absolute_uri
-            url = obj.watermarked_image.url
-            # Only build absolute URI if it's a local path (starts with /)
-            if url.startswith('/'):
-                request = self.context.get('request')
-                return request.build_absolute_uri(url) if request else url
-            return url
-        return None
+        return get_resolver(self.context).url(self.get_watermarked_file(obj))
@@ -0,0 +1,32 @@
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import stats as uploader_stats
+from .cache import invalidate_gallery
+from .models import Photo, PhotoRendition
+
+
+@receiver(post_save, sender=Photo)
+@receiver(post_delete, sender=Photo)
+@receiver(post_save, sender=PhotoRendition)
+@receiver(post_delete, sender=PhotoRendition)
+def invalidate_gallery_cache(sender, **kwargs):
+    invalidate_gallery()
+
+
+@receiver(post_save, sender=Photo)
+def count_upload(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        uploader_stats.record_uploads([instance])
+
+
+@receiver(pre_delete, sender=Photo)
+def measure_renditions(sender, instance, **kwargs):
+    # The renditions are deleted (cascade) before post_delete runs
+    instance._rendition_bytes = instance.renditions.aggregate(total=Sum('size_bytes'))['total'] or 0
+
+
+@receiver(post_delete, sender=Photo)
+def uncount_upload(sender, instance, **kwargs):
+    uploader_stats.record_deletion(instance, getattr(instance, '_rendition_bytes', 0))
@@ -0,0 +1,102 @@
+"""
+Per-uploader totals (UploaderStats) for the uploader dashboard.
+
+Rows are adjusted in place with F() expressions as photos are created and deleted (photos/signals.py)
+and as renditions are written (Photo.attach_renditions / reuse_renditions), so reading them is one
+primary-key lookup. Paths that skip signals (bulk_create, queryset.update(), a changed uploader)
+must call record_uploads() themselves or be followed by `python manage.py rebuild_uploader_stats`.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Photo, PhotoRendition, UploaderStats
+
+
+def apply_delta(uploader_id, photos=0, original_bytes=0, rendition_bytes=0, last_upload_at=None, create=True):
+    """
+    Add to one uploader's totals. A missing row is created when `create` is set; deletions pass
+    create=False, since they may be cascading from the uploader's own deletion.
+    """
+    changes = {
+        'photo_count': F('photo_count') + photos,
+        'original_bytes': F('original_bytes') + original_bytes,
+        'rendition_bytes': F('rendition_bytes') + rendition_bytes,
+    }
+    if last_upload_at is not None:
+        # GREATEST is NULL-propagating on SQLite
+        changes['last_upload_at'] = Greatest(Coalesce(F('last_upload_at'), Value(last_upload_at)), Value(last_upload_at))
+
+    if UploaderStats.objects.filter(uploader_id=uploader_id).update(**changes) or not create:
+        return
+    try:
+        with transaction.atomic():
+            UploaderStats.objects.create(
+                uploader_id=uploader_id,
+                photo_count=max(photos, 0),
+                original_bytes=max(original_bytes, 0),
+                rendition_bytes=max(rendition_bytes, 0),
+                last_upload_at=last_upload_at,
+            )
+    except IntegrityError:
+        # Created concurrently by another upload
+        UploaderStats.objects.filter(uploader_id=uploader_id).update(**changes)
+
+
+def record_uploads(photos):
+    """Count newly created photos (one UPDATE per uploader)."""
+    totals = defaultdict(lambda: {'photos': 0, 'original_bytes': 0, 'last_upload_at': None})
+    for photo in photos:
+        total = totals[photo.uploader_id]
+        total['photos'] += 1
+        total['original_bytes'] += photo.original_size_bytes
+        if total['last_upload_at'] is None or photo.created_at > total['last_upload_at']:
+            total['last_upload_at'] = photo.created_at
+    for uploader_id, total in totals.items():
+        apply_delta(uploader_id, **total)
+
+
+def record_deletion(photo, rendition_bytes=0):
+    """
+    Uncount a deleted photo and its renditions' bytes. `last_upload_at` stays: it is when the
+    uploader last uploaded, which a deletion doesn't change (a rebuild takes it from the remaining photos).
+    """
+    apply_delta(
+        photo.uploader_id, photos=-1, original_bytes=-photo.original_size_bytes,
+        rendition_bytes=-rendition_bytes, create=False,
+    )
+
+
+def record_rendition_bytes(uploader_id, delta):
+    if delta:
+        apply_delta(uploader_id, rendition_bytes=delta)
+
+
+def rebuild(uploader_id):
+    """
+    Recompute one uploader's row from their photos. The row is locked first, so an upload
+    committing meanwhile either is counted here or applies its delta after this write.
+    """
+    with transaction.atomic():
+        UploaderStats.objects.get_or_create(uploader_id=uploader_id)
+        stats = UploaderStats.objects.select_for_update().get(uploader_id=uploader_id)
+        totals = Photo.objects.filter(uploader_id=uploader_id).aggregate(
+            photo_count=Count('id'), original_bytes=Sum('original_size_bytes'), last_upload_at=Max('created_at'),
+        )
+        rendition_bytes = PhotoRendition.objects.filter(photo__uploader_id=uploader_id).aggregate(
+            total=Sum('size_bytes'),
+        )['total']
+
+        stats.photo_count = totals['photo_count']
+        stats.original_bytes = totals['original_bytes'] or 0
+        stats.rendition_bytes = rendition_bytes or 0
+        stats.last_upload_at = totals['last_upload_at']
+        stats.save()
+    return stats
+
+
+def get_stats(uploader_id):
+    """An uploader's totals; an unsaved all-zero row for uploaders who never uploaded."""
+    return UploaderStats.objects.filter(uploader_id=uploader_id).first() or UploaderStats(uploader_id=uploader_id)
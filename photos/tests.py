@@ -1,3 +1,1668 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+import zlib
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from users.models import User
+from users.serializers import CustomTokenObtainPairSerializer
+from . import cache as gallery_cache
+from . import jobs, renditions, search, stats, watermark
+from .async_views import AsyncAPIView, AsyncGalleryView, AsyncPhotoDownloadView
+from .delivery import parse_range
+from .management.commands.migrate_to_s3 import Command as MigrateToS3
+from .models import ImageJob, Photo, PhotoRendition, UploaderStats
+from .serializers import GalleryFilterSerializer
+from .views import GalleryView
+from .pagination import GalleryCursorPagination
+from .renditions import UnprocessableImage, negotiate_format, render_renditions, select_renditions
+
+try:
+    import boto3
+    import requests
+    from moto import mock_aws
+except ImportError:  # Only needed for the direct upload tests
+    mock_aws = None
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Two small renditions in two formats keep processing fast
+TEST_RENDITIONS = {
+    'thumb': {'max_size': 32, 'quality': 70},
+    'full': {'max_size': 64, 'quality': 70},
+}
+TEST_FORMATS = {'jpeg': {}, 'webp': {'quality': 65}}
+
+S3_STORAGES = {
+    'default': {'BACKEND': 'config.storage.InstrumentedS3Storage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+# URLconf for AsyncViewTests: the async views under the sync views' names
+urlpatterns = [
+    path('api/photos/gallery/', AsyncGalleryView.as_view(), name='photo-gallery'),
+    path('api/photos/download/<int:pk>/', AsyncPhotoDownloadView.as_view(), name='photo-download'),
+    path('', include('config.urls')),
+]
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def make_image(size=(80, 60), color=(200, 40, 40), image_format='JPEG'):
+    """Encoded image bytes; a different `color` gives a different content hash."""
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, format=image_format)
+    return output.getvalue()
+
+
+def make_png_header(width, height):
+    """A PNG that only claims its size: enough for a header check, nothing to decode."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', b'') + chunk(b'IEND', b'')
+
+
+def encode_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    PHOTO_RENDITIONS=TEST_RENDITIONS,
+    PHOTO_RENDITION_FORMATS=TEST_FORMATS,
+    PHOTO_PROCESS_INLINE=False,
+    PHOTO_URL_MODE='storage',
+)
+class PhotoTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.uploader = User.objects.create(username='uploader', role='Uploader')
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def create_photo(self, **kwargs):
+        values = {
+            'uploader': self.uploader,
+            'title': 'Sunset',
+            'description': 'Over the bay',
+            'capture_date': date(2024, 5, 1),
+            'original_image': 'photos/originals/sunset.jpg',
+            'status': Photo.STATUS_READY,
+        }
+        values.update(kwargs)
+        return Photo.objects.create(**values)
+
+    def upload(self, content, name='photo.jpg', **data):
+        self.authenticate(self.uploader)
+        data = {
+            'title': 'Sunset',
+            'description': 'Over the bay',
+            'capture_date': '2024-05-01',
+            **data,
+            'original_image': SimpleUploadedFile(name, content),
+        }
+        return self.client.post(reverse('photo-upload'), data, format='multipart')
+
+    def process_queue(self):
+        """Run every runnable job, as the `process_image_jobs` worker would."""
+        while (job := jobs.claim_job('test-worker')) is not None:
+            jobs.run_job(job)
+
+    def gallery_ids(self, **params):
+        self.client.credentials()
+        response = self.client.get(reverse('photo-gallery'), params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+
+# Job queue (process_image_jobs)
+
+class ImageJobTests(PhotoTestCase):
+    def test_upload_is_queued_and_not_listed(self):
+        response = self.upload(make_image())
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], Photo.STATUS_PENDING)
+
+        photo = Photo.objects.get(pk=response.data['id'])
+        self.assertFalse(photo.is_listable)
+        self.assertEqual(ImageJob.objects.get(photo=photo).status, ImageJob.STATUS_QUEUED)
+        self.assertEqual(self.gallery_ids(), [])
+
+    def test_claim_and_run(self):
+        photo = Photo.objects.get(pk=self.upload(make_image()).data['id'])
+
+        job = jobs.claim_job('test-worker')
+        self.assertEqual((job.status, job.attempts, job.locked_by), (ImageJob.STATUS_RUNNING, 1, 'test-worker'))
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.STATUS_PROCESSING)
+        self.assertIsNone(jobs.claim_job('other-worker'))
+
+        self.assertTrue(jobs.run_job(job))
+        job.refresh_from_db()
+        photo.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.STATUS_DONE)
+        self.assertEqual(photo.status, Photo.STATUS_READY)
+        self.assertTrue(photo.is_listable)
+        self.assertTrue(photo.watermarked_image)
+        self.assertEqual(
+            sorted(photo.renditions.values_list('name', 'format')),
+            [('full', 'jpeg'), ('full', 'webp'), ('thumb', 'jpeg'), ('thumb', 'webp')],
+        )
+        self.assertEqual(self.gallery_ids(), [photo.pk])
+
+    def test_claim_waits_for_run_after(self):
+        photo = self.create_photo(status=Photo.STATUS_PENDING)
+        ImageJob.objects.create(photo=photo, run_after=timezone.now() + timedelta(minutes=5))
+        self.assertIsNone(jobs.claim_job('test-worker'))
+
+    def test_failure_is_retried_with_backoff(self):
+        photo = Photo.objects.get(pk=self.upload(make_image()).data['id'])
+        job = jobs.claim_job('test-worker')
+
+        with mock.patch.object(Photo, 'generate_renditions', side_effect=OSError('storage unavailable')), \
+                self.assertLogs('photos.jobs', 'ERROR'):
+            self.assertFalse(jobs.run_job(job))
+
+        job.refresh_from_db()
+        photo.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.STATUS_QUEUED)
+        self.assertEqual(job.last_error, 'OSError: storage unavailable')
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(job.locked_by, '')
+        self.assertEqual(photo.status, Photo.STATUS_PENDING)
+        self.assertIsNone(jobs.claim_job('test-worker'))
+
+    def test_failure_after_the_last_attempt(self):
+        photo = Photo.objects.get(pk=self.upload(make_image()).data['id'])
+        ImageJob.objects.filter(photo=photo).update(max_attempts=1)
+        job = jobs.claim_job('test-worker')
+
+        with mock.patch.object(Photo, 'generate_renditions', side_effect=OSError('storage unavailable')), \
+                self.assertLogs('photos.jobs', 'ERROR'):
+            self.assertFalse(jobs.run_job(job))
+
+        job.refresh_from_db()
+        photo.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.STATUS_FAILED)
+        self.assertEqual(photo.status, Photo.STATUS_FAILED)
+        self.assertFalse(photo.is_listable)
+
+    def test_ready_photo_stays_listed_while_re_rendered(self):
+        photo = self.create_photo()
+        ImageJob.objects.create(photo=photo, max_attempts=1)  # e.g. queued by migration 0004
+
+        job = jobs.claim_job('test-worker')
+        photo.refresh_from_db()
+        self.assertEqual((photo.status, photo.is_listable), (Photo.STATUS_READY, True))
+        self.assertEqual(self.gallery_ids(), [photo.pk])
+
+        with mock.patch.object(Photo, 'generate_renditions', side_effect=OSError('storage unavailable')), \
+                self.assertLogs('photos.jobs', 'ERROR'):
+            self.assertFalse(jobs.run_job(job))
+        job.refresh_from_db()
+        photo.refresh_from_db()
+        self.assertEqual(job.status, ImageJob.STATUS_FAILED)
+        self.assertEqual((photo.status, photo.is_listable), (Photo.STATUS_READY, True))
+        self.assertEqual(self.gallery_ids(), [photo.pk])
+
+    def test_unlisting_invalidates_the_gallery(self):
+        photo = self.create_photo()
+        Photo.objects.filter(pk=photo.pk).update(status=Photo.STATUS_PENDING)  # Stale is_listable=True
+        ImageJob.objects.create(photo=photo)
+        generation = gallery_cache.get_generation()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            jobs.claim_job('test-worker')
+        photo.refresh_from_db()
+        self.assertEqual((photo.status, photo.is_listable), (Photo.STATUS_PROCESSING, False))
+        self.assertEqual(len(callbacks), 1)
+        self.assertGreater(gallery_cache.get_generation(), generation)
+
+    def test_undecodable_original_fails_without_retries(self):
+        content = make_image((400, 300))
+        response = self.upload(content[:len(content) // 2])  # The header is intact, the body is cut short
+        self.assertEqual(response.status_code, 202)
+
+        with self.assertLogs('photos.jobs', 'ERROR'):
+            self.process_queue()
+        job = ImageJob.objects.get(photo_id=response.data['id'])
+        self.assertEqual((job.status, job.attempts), (ImageJob.STATUS_FAILED, 1))
+        self.assertIn('UnprocessableImage', job.last_error)
+        self.assertEqual(Photo.objects.get(pk=response.data['id']).status, Photo.STATUS_FAILED)
+
+    def test_requeue_stale_jobs(self):
+        self.upload(make_image())
+        job = jobs.claim_job('dead-worker')
+        ImageJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(jobs.requeue_stale_jobs(timedelta(minutes=10)), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (ImageJob.STATUS_QUEUED, ''))
+        self.assertEqual(jobs.claim_job('test-worker').pk, job.pk)
+
+    @override_settings(PHOTO_JOB_RETRY_BASE_DELAY=10, PHOTO_JOB_RETRY_MAX_DELAY=60)
+    def test_retry_delay(self):
+        self.assertEqual(
+            [jobs.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 4)],
+            [10, 20, 40, 60],
+        )
+
+
+# Rendering (photos/renditions.py)
+
+class RenderTests(PhotoTestCase):
+    def decoded_size(self, content):
+        """Size of the image render_renditions() decoded `content` to, before any resizing."""
+        with mock.patch.object(renditions, 'downscale', side_effect=renditions.downscale) as downscale:
+            rendered = render_renditions(BytesIO(content))
+        return downscale.call_args_list[0].args[0].size, rendered
+
+    def test_jpeg_draft_covers_the_largest_rendition(self):
+        # 1/8 scale (100x25) still covers `full` (64x16); a 64x64 box would only allow 1/2 (400x100)
+        size, rendered = self.decoded_size(make_image((800, 200)))
+        self.assertEqual(size, (100, 25))
+        self.assertEqual({(r.name, r.width, r.height) for r in rendered}, {('full', 64, 16), ('thumb', 32, 8)})
+
+        size, _ = self.decoded_size(make_image((200, 800)))
+        self.assertEqual(size, (25, 100))
+
+    def test_draft_never_undershoots(self):
+        # 1/2 scale would give 63x47, just short of `full`
+        size, rendered = self.decoded_size(make_image((126, 94)))
+        self.assertEqual(size, (126, 94))
+        self.assertIn(('full', 64, 48), {(r.name, r.width, r.height) for r in rendered})
+
+    def test_small_images_are_not_upscaled(self):
+        size, rendered = self.decoded_size(make_image((40, 30)))
+        self.assertEqual(size, (40, 30))
+        self.assertEqual({(r.name, r.width, r.height) for r in rendered}, {('full', 40, 30), ('thumb', 32, 24)})
+
+    @override_settings(PHOTO_MAX_IMAGE_PIXELS=80 * 60)
+    def test_decode_pixel_limit(self):
+        render_renditions(BytesIO(make_image((80, 60))))
+        for size in ((81, 60), (80, 61)):
+            with self.subTest(size=size), self.assertRaises(UnprocessableImage):
+                render_renditions(BytesIO(make_image(size, image_format='PNG')))
+
+    @override_settings(PHOTO_MAX_IMAGE_PIXELS=1000)
+    def test_job_over_the_pixel_limit_fails_without_retries(self):
+        photo = self.create_photo(status=Photo.STATUS_PENDING)
+        photo.original_image.save('large.jpg', ContentFile(make_image((80, 60))))
+        ImageJob.objects.create(photo=photo)
+
+        with self.assertLogs('photos.jobs', 'ERROR'):
+            self.process_queue()
+        job = ImageJob.objects.get(photo=photo)
+        self.assertEqual((job.status, job.attempts), (ImageJob.STATUS_FAILED, 1))
+        self.assertIn('the limit is 1000', job.last_error)
+
+    def test_jobs_record_peak_memory(self):
+        self.assertGreater(jobs.peak_memory_bytes(), 0)
+
+        done = Photo.objects.get(pk=self.upload(make_image()).data['id'])
+        content = make_image((400, 300), color=(0, 0, 0))
+        failed = Photo.objects.get(pk=self.upload(content[:len(content) // 2]).data['id'])  # Truncated
+        with self.assertLogs('photos.jobs', 'ERROR'):
+            self.process_queue()
+        for photo, status in ((done, ImageJob.STATUS_DONE), (failed, ImageJob.STATUS_FAILED)):
+            with self.subTest(status=status):
+                job = ImageJob.objects.get(photo=photo)
+                self.assertEqual(job.status, status)
+                self.assertGreater(job.peak_memory_bytes, 0)
+
+    def test_peak_memory_without_procfs(self):
+        with mock.patch('builtins.open', side_effect=OSError):
+            jobs.reset_peak_memory()
+            self.assertGreater(jobs.peak_memory_bytes(), 0)  # ru_maxrss
+
+
+@override_settings(PHOTO_RENDITIONS={
+    'thumb': {'max_size': 32},
+    'full': {'max_size': 64, 'quality': 90},
+    'preview': {'max_size': 48, 'quality': 80},
+})
+class RenditionTests(PhotoTestCase):
+    def test_specs_are_largest_first(self):
+        self.assertEqual(renditions.get_rendition_specs(), [
+            renditions.RenditionSpec('full', 64, 90),
+            renditions.RenditionSpec('preview', 48, 80),
+            renditions.RenditionSpec('thumb', 32, 70),
+        ])
+
+    def test_every_rendition_in_every_format(self):
+        rendered = render_renditions(BytesIO(make_image((800, 600))))
+        self.assertEqual(
+            [(item.name, item.format, item.width, item.height) for item in rendered],
+            [
+                ('full', 'jpeg', 64, 48), ('full', 'webp', 64, 48),
+                ('preview', 'jpeg', 48, 36), ('preview', 'webp', 48, 36),
+                ('thumb', 'jpeg', 32, 24), ('thumb', 'webp', 32, 24),
+            ],
+        )
+        for item in rendered:
+            with self.subTest(name=item.name, format=item.format), Image.open(BytesIO(item.content)) as image:
+                self.assertEqual(image.format, renditions.FORMATS[item.format].pillow_format)
+                self.assertEqual((image.size, image.mode), ((item.width, item.height), 'RGB'))
+
+    def test_source_modes(self):
+        for mode in ('P', 'RGBA', 'LA', 'I;16', '1', 'CMYK'):
+            with self.subTest(mode=mode):
+                output = BytesIO()
+                Image.new(mode, (120, 90)).save(output, format='TIFF' if mode == 'CMYK' else 'PNG')
+                rendered = render_renditions(BytesIO(output.getvalue()))
+                self.assertEqual({(item.width, item.height) for item in rendered}, {(64, 48), (48, 36), (32, 24)})
+
+    def test_downscale(self):
+        for size, max_size, expected in [
+            ((4000, 3000), 64, (64, 48)),
+            ((3000, 4000), 64, (48, 64)),
+            ((64, 10), 64, (64, 10)),  # Already small enough
+            ((10000, 1), 64, (64, 1)),  # Never below one pixel
+            ((130, 97), 64, (64, 48)),
+        ]:
+            with self.subTest(size=size):
+                self.assertEqual(renditions.downscale(Image.new('RGB', size), max_size).size, expected)
+
+    def test_large_factors_reduce_first(self):
+        with mock.patch.object(Image.Image, 'reduce', autospec=True, side_effect=Image.Image.reduce) as reduce:
+            renditions.downscale(Image.new('RGB', (4000, 3000)), 64)
+        reduce.assert_called_once_with(mock.ANY, 31)  # 4000 / (64 * REDUCING_GAP)
+
+    def test_regenerating_replaces_the_files(self):
+        photo = self.create_photo(original_image='')
+        photo.original_image.save('regenerate.jpg', ContentFile(make_image((800, 600))))
+        photo.generate_renditions()
+        photo.save()
+        first = {(r.name, r.format): r.image.name for r in photo.renditions.all()}
+        self.assertEqual(len(first), 6)
+        self.assertEqual(photo.watermarked_image.name, first['full', 'jpeg'])
+
+        photo.generate_renditions()
+        photo.save()
+        second = {(r.name, r.format): r.image.name for r in photo.renditions.all()}
+        self.assertEqual(second.keys(), first.keys())
+        self.assertEqual(photo.watermarked_image.name, second['full', 'jpeg'])
+        for key, name in first.items():
+            with self.subTest(rendition=key):
+                self.assertNotEqual(second[key], name)
+                self.assertFalse(default_storage.exists(name))
+                self.assertTrue(default_storage.exists(second[key]))
+
+
+# Watermark overlay (photos/watermark.py)
+
+class WatermarkTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        for cached in (watermark.load_font, watermark.master_overlay, watermark.scaled_overlay):
+            cached.cache_clear()
+            self.addCleanup(cached.cache_clear)
+
+    @override_settings(PHOTO_WATERMARK_FONT='/missing/font.ttf')
+    def test_font_and_overlays_are_built_once(self):
+        for width in (400, 400, 200, 400, 200):
+            watermark.apply_watermark(Image.new('RGB', (width, 100)))
+        self.assertEqual(watermark.load_font.cache_info().misses, 1)  # Fell back to the bundled font
+        self.assertEqual(watermark.master_overlay.cache_info().misses, 1)
+        scaled = watermark.scaled_overlay.cache_info()
+        self.assertEqual((scaled.misses, scaled.hits), (2, 3))
+
+    def test_settings_are_part_of_the_cache_key(self):
+        default = watermark.get_overlay(400)
+        with override_settings(PHOTO_WATERMARK_TEXT='Sample'):
+            self.assertNotEqual(watermark.get_overlay(400).size, default.size)
+        with override_settings(PHOTO_WATERMARK_OPACITY=255):
+            self.assertGreater(watermark.get_overlay(400).getchannel('A').getextrema()[1], 200)
+        self.assertIs(watermark.get_overlay(400), default)
+        options = watermark.get_options()
+        master = watermark.master_overlay(options['text'], options['font'], options['logo'], options['opacity'])
+        self.assertEqual(master.getchannel('A').getextrema()[1], 128)
+
+    @override_settings(PHOTO_WATERMARK_SCALE=0.25, PHOTO_WATERMARK_MARGIN=0.1)
+    def test_placed_in_the_bottom_right_corner(self):
+        image = watermark.apply_watermark(Image.new('RGB', (400, 200)))
+        overlay = watermark.get_overlay(400)
+        self.assertEqual(overlay.width, 100)
+        left, top, right, bottom = image.getbbox()  # Everything that isn't black
+        self.assertGreaterEqual(left, 400 - 20 - 100)
+        self.assertGreaterEqual(top, 200 - 20 - overlay.height)
+        self.assertLessEqual((right, bottom), (380, 180))
+
+    def test_logo(self):
+        logo_path = os.path.join(MEDIA_ROOT, 'logo.png')
+        Image.new('RGBA', (50, 10), (255, 0, 0, 255)).save(logo_path)
+        with override_settings(PHOTO_WATERMARK_LOGO=logo_path, PHOTO_WATERMARK_OPACITY=64):
+            overlay = watermark.get_overlay(400)
+        self.assertEqual(overlay.size, (100, 20))
+        self.assertEqual(overlay.getpixel((50, 10)), (255, 0, 0, 64))
+
+
+# Reprocessing (reprocess_photos)
+
+class ReprocessPhotosTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_uploader = User.objects.create(username='other', role='Uploader')
+        self.photos = []
+        for index, uploader in enumerate((self.uploader, self.uploader, self.other_uploader)):
+            photo = self.create_photo(uploader=uploader, original_image='')
+            photo.original_image.save(f'reprocess_{index}.jpg', ContentFile(make_image(color=(index, 0, 0))))
+            self.photos.append(photo)
+        self.create_photo(original_image='')  # Nothing to render from
+
+    def reprocess(self, *args, **options):
+        out = StringIO()
+        call_command('reprocess_photos', *args, workers=1, io_workers=2, chunk_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_selection(self):
+        first, second, third = (photo.pk for photo in self.photos)
+        Photo.objects.filter(pk=first).update(created_at=timezone.make_aware(timezone.datetime(2024, 1, 1)))
+        for options, count in [
+            ({}, 3),
+            ({'min_id': second}, 2),
+            ({'max_id': second}, 2),
+            ({'min_id': second, 'max_id': second}, 1),
+            ({'uploader': 'other'}, 1),
+            ({'uploader': str(self.uploader.pk)}, 2),
+            ({'since': '2024-06-01'}, 2),
+            ({'until': '2024-06-01'}, 1),
+            ({'since': '2023-12-31T12:00:00', 'until': '2024-01-02'}, 1),
+        ]:
+            with self.subTest(options=options):
+                self.assertIn(f'Found {count} photos', self.reprocess(dry_run=True, **options))
+        self.assertFalse(PhotoRendition.objects.exists())
+
+        with self.assertRaisesMessage(CommandError, 'Invalid date: last week'):
+            self.reprocess(dry_run=True, since='last week')
+
+    def test_reprocess(self):
+        saved_from = set()
+        original_save = Photo.save
+
+        def save(photo, *args, **kwargs):
+            saved_from.add(threading.current_thread())
+            return original_save(photo, *args, **kwargs)
+
+        with mock.patch.object(Photo, 'save', autospec=True, side_effect=save):
+            output = self.reprocess()
+        self.assertIn('Processed: 3', output)
+        self.assertIn('Errors: 0', output)
+        self.assertEqual(saved_from, {threading.current_thread()})  # The I/O threads never open a connection
+        for photo in self.photos:
+            photo.refresh_from_db()
+            self.assertEqual(photo.status, Photo.STATUS_READY)
+            self.assertEqual(photo.renditions.count(), 4)
+            self.assertTrue(default_storage.exists(photo.watermarked_image.name))
+
+    def test_failures_are_reported_and_skipped(self):
+        missing, corrupt, good = self.photos
+        default_storage.delete(missing.original_image.name)
+        with default_storage.open(corrupt.original_image.name, 'wb') as f:
+            f.write(b'not an image')
+
+        output = self.reprocess()
+        self.assertIn(f'Photo {missing.pk}: could not read original', output)
+        self.assertIn(f'Photo {corrupt.pk}: could not render', output)
+        self.assertIn('Processed: 1', output)
+        self.assertIn('Errors: 2', output)
+        self.assertEqual(set(PhotoRendition.objects.values_list('photo_id', flat=True)), {good.pk})
+
+
+# Gallery listability (is_listable)
+
+class ListableTests(PhotoTestCase):
+    def assertListable(self, photo, expected):
+        photo.refresh_from_db()
+        self.assertIs(photo.is_listable, expected)
+        self.assertEqual(Photo.objects.filter(Photo.LISTABLE_Q, pk=photo.pk).exists(), expected)
+
+    def test_save_recomputes_the_flag(self):
+        photo = self.create_photo()
+        self.assertListable(photo, True)
+        for field, value in (('title', ''), ('description', ''), ('capture_date', None), ('status', 'failed')):
+            with self.subTest(field=field):
+                original = getattr(photo, field)
+                setattr(photo, field, value)
+                photo.save()
+                self.assertListable(photo, False)
+                setattr(photo, field, original)
+                photo.save()
+                self.assertListable(photo, True)
+
+    def test_update_fields_include_the_flag(self):
+        photo = self.create_photo()
+        photo.description = ''
+        photo.save(update_fields=['description'])
+        self.assertListable(photo, False)
+
+        photo.description = 'Over the bay'
+        photo.save(update_fields=['description'])
+        self.assertListable(photo, True)
+
+        photo.status = Photo.STATUS_PROCESSING
+        photo.save(update_fields=['status'])
+        self.assertListable(photo, False)
+
+    def test_moderation_unlists_and_invalidates(self):
+        photo = self.create_photo()
+        self.assertEqual(self.gallery_ids(), [photo.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.title = ''
+            photo.save(update_fields=['title'])
+        self.assertEqual(self.gallery_ids(), [])
+
+    def test_backfill_listable(self):
+        listed = [self.create_photo(title=f'Photo {index}') for index in range(3)]
+        unlisted = [self.create_photo(status=Photo.STATUS_PENDING), self.create_photo(description='')]
+        # queryset.update() and bulk imports bypass save()
+        Photo.objects.filter(pk__in=[photo.pk for photo in listed[:2]]).update(is_listable=False)
+        Photo.objects.filter(pk=unlisted[0].pk).update(is_listable=True)
+        generation = gallery_cache.get_generation()
+
+        out = StringIO()
+        call_command('backfill_listable', batch_size=2, stdout=out)
+        self.assertIn('Marked listable: 2', out.getvalue())
+        self.assertIn('Marked unlisted: 1', out.getvalue())
+        for photo in listed:
+            self.assertListable(photo, True)
+        for photo in unlisted:
+            self.assertListable(photo, False)
+        self.assertGreater(gallery_cache.get_generation(), generation)
+
+        out = StringIO()
+        call_command('backfill_listable', stdout=out)
+        self.assertIn('Marked listable: 0', out.getvalue())
+
+    def test_backfill_listable_without_photos(self):
+        out = StringIO()
+        call_command('backfill_listable', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'No photos to backfill')
+
+
+# Keyset pagination
+
+class KeysetPaginationTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(5):
+            self.create_photo(title=f'Photo {index}')
+        self.expected = list(
+            Photo.objects.filter(is_listable=True).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_cursor_round_trip(self):
+        pages = [self.get(reverse('photo-gallery'), page_size=2)]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual([item['id'] for page in pages for item in page['results']], self.expected)
+        self.assertIsNone(pages[0]['previous'])
+
+        # Going back from the last page gives the middle page again
+        previous = self.get(pages[2]['previous'])
+        self.assertEqual(previous['results'], pages[1]['results'])
+        self.assertIsNotNone(previous['next'])
+
+    def test_invalid_cursors(self):
+        created_at = '2024-05-01T00:00:00+00:00'
+        for cursor in [
+            'not a cursor!',
+            encode_cursor({'r': 0}),
+            encode_cursor({'p': 'abc'}),
+            encode_cursor({'p': [created_at]}),
+            encode_cursor({'p': [created_at, 1, 2]}),
+            encode_cursor({'p': [None, 1]}),
+            encode_cursor({'p': [created_at, None]}),
+            encode_cursor({'p': ['yesterday', 1]}),
+            encode_cursor({'p': [created_at, 'one']}),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('photo-gallery'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.data['detail'], 'Invalid cursor')
+
+    def test_annotation_values_must_be_numbers(self):
+        # A search rank travels in the cursor as a plain JSON number
+        pagination = GalleryCursorPagination()
+        pagination.ordering = ('-rank', '-id')
+
+        def decode(position):
+            request = Request(APIRequestFactory().get('/', {'cursor': encode_cursor({'p': position})}))
+            return pagination.decode_cursor(request, Photo)
+
+        self.assertEqual(decode([0.5, 3])['position'], [0.5, 3])
+        for position in (['high', 3], [True, 3], [None, 3], [[0.5], 3]):
+            with self.subTest(position=position), self.assertRaises(NotFound):
+                decode(position)
+
+
+# Gallery search and filters
+
+class GallerySearchTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_uploader = User.objects.create(username='other', role='Uploader')
+        self.harbour = self.create_photo(title='Harbour sunset', description='Boats at dusk')
+        self.city = self.create_photo(
+            title='City lights', description='Sunset over the harbour skyline', capture_date=date(2024, 6, 10),
+        )
+        self.forest = self.create_photo(
+            title='Forest', description='Morning fog', capture_date=date(2023, 1, 1), uploader=self.other_uploader,
+        )
+
+    def test_q_matches_every_term(self):
+        self.assertCountEqual(self.gallery_ids(q='sunset'), [self.harbour.pk, self.city.pk])
+        self.assertCountEqual(self.gallery_ids(q='SUNSET harbour'), [self.harbour.pk, self.city.pk])
+        self.assertEqual(self.gallery_ids(q='harbour boats'), [self.harbour.pk])
+        self.assertEqual(self.gallery_ids(q='fog'), [self.forest.pk])
+        self.assertEqual(self.gallery_ids(q='volcano'), [])
+        self.assertEqual(self.gallery_ids(q=''), [self.forest.pk, self.city.pk, self.harbour.pk])
+
+    def test_capture_date_bounds_are_inclusive(self):
+        self.assertEqual(self.gallery_ids(captured_after='2024-05-01'), [self.city.pk, self.harbour.pk])
+        self.assertEqual(self.gallery_ids(captured_before='2024-05-01'), [self.forest.pk, self.harbour.pk])
+        self.assertEqual(
+            self.gallery_ids(captured_after='2024-05-01', captured_before='2024-05-01'), [self.harbour.pk],
+        )
+
+    def test_uploader(self):
+        self.assertEqual(self.gallery_ids(uploader=self.other_uploader.pk), [self.forest.pk])
+        self.assertEqual(self.gallery_ids(uploader=self.uploader.pk, q='fog'), [])
+        self.assertEqual(
+            self.gallery_ids(uploader=self.uploader.pk, q='sunset', captured_after='2024-06-01', sort='newest'),
+            [self.city.pk],
+        )
+
+    def test_invalid_parameters(self):
+        for params, field in [
+            ({'captured_after': '2024-06-01', 'captured_before': '2024-05-01'}, 'captured_before'),
+            ({'captured_after': 'last week'}, 'captured_after'),
+            ({'uploader': 0}, 'uploader'),
+            ({'sort': 'random'}, 'sort'),
+            ({'q': 'x' * 201}, 'q'),
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse('photo-gallery'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.data)
+
+    def test_filter_serializer_defaults(self):
+        serializer = GalleryFilterSerializer(data={'captured_after': '2024-05-01', 'captured_before': '2024-05-01'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data, {
+            'sort': 'relevance', 'captured_after': date(2024, 5, 1), 'captured_before': date(2024, 5, 1),
+        })
+
+    def test_keyset_ordering(self):
+        def ordering(**params):
+            view = GalleryView()
+            view.request = Request(APIRequestFactory().get('/', params))
+            return view.get_keyset_ordering()
+
+        with mock.patch.object(search, 'uses_full_text', return_value=True):
+            self.assertEqual(ordering(q='sunset'), search.RANKED_ORDERING)
+            self.assertEqual(ordering(q='sunset', sort='newest'), GalleryView.keyset_ordering)
+            self.assertEqual(ordering(), GalleryView.keyset_ordering)
+        with mock.patch.object(search, 'uses_full_text', return_value=False):
+            self.assertEqual(ordering(q='sunset'), GalleryView.keyset_ordering)
+
+    def test_cursor_paging_by_relevance(self):
+        for index in range(3):
+            self.create_photo(title=f'Sunset {index}', description='Sunset over sunset bay')
+        first = self.client.get(reverse('photo-gallery'), {'q': 'sunset', 'page_size': 10}).data['results']
+
+        pages = [self.client.get(reverse('photo-gallery'), {'q': 'sunset', 'page_size': 2}).data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [item['id'] for page in pages for item in page['results']], [item['id'] for item in first],
+        )
+
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual(previous['results'], pages[1]['results'])
+
+    @unittest.skipUnless(search.uses_full_text(), 'full-text ranking needs PostgreSQL')
+    def test_title_matches_rank_first(self):
+        # `harbour` is in the harbour photo's title (weight A) but only the city photo's description
+        self.assertEqual(self.gallery_ids(q='harbour'), [self.harbour.pk, self.city.pk])
+        self.assertEqual(self.gallery_ids(q='harbour', sort='newest'), [self.city.pk, self.harbour.pk])
+
+
+# Anonymous gallery cache
+
+class GalleryCacheTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.photo = self.create_photo()
+
+    def test_cached_page_and_not_modified(self):
+        response = self.client.get(reverse('photo-gallery'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse('photo-gallery'))
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.data, response.data)
+        self.assertEqual(cached['ETag'], etag)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(reverse('photo-gallery'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+        not_modified = self.client.get(reverse('photo-gallery'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_catalog_change_starts_a_new_generation(self):
+        etag = self.client.get(reverse('photo-gallery'))['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new_photo = self.create_photo(title='Sunrise')
+
+        response = self.client.get(reverse('photo-gallery'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([item['id'] for item in response.data['results']], [new_photo.pk, self.photo.pk])
+
+    def test_variants_are_cached_apart(self):
+        jpeg = self.client.get(reverse('photo-gallery'))
+        webp = self.client.get(reverse('photo-gallery'), HTTP_ACCEPT='image/webp,*/*')
+        self.assertNotEqual(jpeg['ETag'], webp['ETag'])
+        self.assertIn('Accept', webp['Vary'])
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        self.authenticate(self.uploader)
+        response = self.client.get(reverse('photo-gallery'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    @override_settings(PHOTO_GALLERY_CACHE_TIMEOUT=900, PHOTO_URL_CACHE_MARGIN=120)
+    def test_timeout_is_capped_by_the_url_cache_margin(self):
+        self.assertEqual(gallery_cache.get_timeout(), 120)
+        with override_settings(PHOTO_URL_MODE='cdn'):
+            self.assertEqual(gallery_cache.get_timeout(), 900)
+
+
+# Async views (PHOTO_ASYNC_VIEWS)
+
+class AsyncViewTests(PhotoTestCase):
+    """Each async response is compared with the sync view's answer to the same request."""
+
+    def setUp(self):
+        super().setUp()
+        # As the test client does on request_started/finished: closing it would end the test transaction
+        patcher = mock.patch('photos.async_views.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.photo = self.create_photo(watermarked_image='photos/watermarked/sunset.jpg')
+        for name, image_format in (('thumb', 'jpeg'), ('thumb', 'webp'), ('full', 'jpeg')):
+            PhotoRendition.objects.create(
+                photo=self.photo, name=name, format=image_format,
+                image=f'photos/renditions/sunset_{name}.{image_format}', width=32, height=24,
+            )
+        self.token = CustomTokenObtainPairSerializer.get_token(self.uploader).access_token
+
+    async def get_both(self, path, params=None, authenticated=False, **headers):
+        """(sync response, async response) for the same GET."""
+        if authenticated:
+            headers['Authorization'] = f'Bearer {self.token}'
+        extra = {f'HTTP_{name.upper().replace("-", "_")}': value for name, value in headers.items()}
+        sync = await sync_to_async(APIClient().get)(path, params, **extra)
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await AsyncClient().get(path, params, headers=headers)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.json(), sync.json())
+        return sync, response
+
+    async def test_anonymous_gallery_is_cached(self):
+        url = reverse('photo-gallery')
+        sync, response = await self.get_both(url, {'page_size': 10}, accept='image/webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], sync['ETag'])  # One page cache for both
+        self.assertEqual(response['Vary'], sync['Vary'])
+        self.assertEqual(response['Cache-Control'], sync['Cache-Control'])
+        self.assertEqual(response.json()['results'][0]['srcset']['thumb']['type'], 'image/webp')
+
+        with override_settings(ROOT_URLCONF=__name__):
+            with mock.patch.object(AsyncGalleryView, 'list') as list_photos:
+                cached = await AsyncClient().get(url, {'page_size': 10}, headers={'accept': 'image/webp'})
+            list_photos.assert_not_called()
+            self.assertEqual(cached.json(), response.json())
+
+            not_modified = await AsyncClient().get(
+                url, {'page_size': 10}, headers={'accept': 'image/webp', 'if-none-match': response['ETag']},
+            )
+            self.assertEqual(not_modified.status_code, 304)
+
+    async def test_authenticated_gallery_bypasses_the_cache(self):
+        _, response = await self.get_both(reverse('photo-gallery'), {'q': 'sunset'}, authenticated=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    async def test_gallery_errors(self):
+        for params, status_code in [
+            ({'captured_after': '2024-06-01', 'captured_before': '2024-05-01'}, 400),
+            ({'cursor': 'not a cursor!'}, 404),
+        ]:
+            with self.subTest(params=params):
+                _, response = await self.get_both(reverse('photo-gallery'), params)
+                self.assertEqual(response.status_code, status_code)
+
+        _, response = await self.get_both(reverse('photo-gallery'), authorization='Bearer not-a-token')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_download(self):
+        _, response = await self.get_both(reverse('photo-download', args=[self.photo.pk]), authenticated=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['original_image_url'].endswith('/media/photos/originals/sunset.jpg'))
+
+        _, response = await self.get_both(reverse('photo-download', args=[self.photo.pk + 1]), authenticated=True)
+        self.assertEqual(response.status_code, 404)
+        _, response = await self.get_both(reverse('photo-download', args=[self.photo.pk]))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_handle_must_be_implemented(self):
+        class IncompleteView(AsyncAPIView):
+            view_class = GalleryView
+
+        with self.assertRaises(NotImplementedError):
+            await IncompleteView.as_view()(AsyncRequestFactory().get('/'))
+
+
+# File URLs
+
+class FileUrlTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.photo = self.create_photo(watermarked_image='photos/watermarked/sunset.jpg')
+        for name, size in (('thumb', 32), ('full', 64)):
+            PhotoRendition.objects.create(
+                photo=self.photo, name=name, image=f'photos/renditions/sunset_{name}.jpg', width=size, height=size,
+            )
+
+    def count_storage_urls(self, path, **extra):
+        with mock.patch.object(FileSystemStorage, 'url', autospec=True, side_effect=FileSystemStorage.url) as url:
+            response = self.client.get(path, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, url.call_count
+
+    def test_storage_urls_are_signed_once_and_cached(self):
+        response, calls = self.count_storage_urls(reverse('photo-gallery'))
+        self.assertEqual(calls, 2)  # `full` and `thumb`; the watermarked image is the `full` rendition
+        self.assertTrue(response.data['results'][0]['watermarked_image'].startswith('http://testserver/media/'))
+
+        self.authenticate(self.uploader)  # Not served from the page cache
+        _, calls = self.count_storage_urls(reverse('photo-gallery'))
+        self.assertEqual(calls, 0)
+
+    @override_settings(PHOTO_URL_MODE='cdn', PHOTO_CDN_BASE_URL='https://cdn.example.com/')
+    def test_cdn_gallery_page_signs_nothing(self):
+        response, calls = self.count_storage_urls(reverse('photo-gallery'))
+        self.assertEqual(calls, 0)
+        item = response.data['results'][0]
+        self.assertEqual(item['watermarked_image'], 'https://cdn.example.com/photos/renditions/sunset_full.jpg')
+        self.assertEqual(item['srcset']['thumb']['url'], 'https://cdn.example.com/photos/renditions/sunset_thumb.jpg')
+
+    @override_settings(PHOTO_URL_MODE='cdn', PHOTO_CDN_BASE_URL='https://cdn.example.com/')
+    def test_cdn_download_still_signs_the_original(self):
+        self.authenticate(self.uploader)
+        response, calls = self.count_storage_urls(reverse('photo-download', args=[self.photo.pk]))
+        self.assertEqual(calls, 1)
+        self.assertTrue(response.data['original_image_url'].startswith('http://testserver/media/photos/originals/'))
+        self.assertTrue(response.data['watermarked_image_url'].startswith('https://cdn.example.com/'))
+
+
+# Format negotiation (Accept)
+
+class FormatNegotiationTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.photo = self.create_photo()
+        # `full` has no WebP encoding (yet): it falls back to JPEG
+        for name, image_format in (('thumb', 'jpeg'), ('thumb', 'webp'), ('full', 'jpeg')):
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            path = default_storage.save(f'photos/renditions/sunset_{name}.{extension}', ContentFile(b'image'))
+            PhotoRendition.objects.create(
+                photo=self.photo, name=name, format=image_format, image=path, width=32, height=24,
+            )
+
+    def test_negotiate_format(self):
+        for accept, expected in [
+            (None, 'jpeg'),
+            ('', 'jpeg'),
+            ('image/webp', 'webp'),
+            ('IMAGE/WEBP ; q=0.5', 'webp'),
+            ('image/webp;q=0', 'jpeg'),
+            ('image/webp;q=0, image/*, */*', 'jpeg'),
+            ('image/webp;q=bogus', 'jpeg'),
+            ('image/*', 'jpeg'),
+            ('*/*', 'jpeg'),
+            ('image/png,image/*;q=0.8,*/*;q=0.5', 'jpeg'),  # Safari 13: no WebP
+            ('image/avif,image/webp,image/apng,image/*,*/*;q=0.8', 'webp'),  # AVIF isn't enabled
+        ]:
+            with self.subTest(accept=accept):
+                self.assertEqual(negotiate_format(accept), expected)
+
+    @override_settings(PHOTO_RENDITION_FORMATS={'jpeg': {}, 'webp': {}, 'avif': {}})
+    def test_negotiate_format_by_quality_then_preference(self):
+        for accept, expected in [
+            ('image/webp,image/avif', 'avif'),
+            ('image/avif;q=0.5,image/webp', 'webp'),
+            ('image/avif;q=0,image/webp;q=0.1', 'webp'),
+            ('image/avif;q=0,image/webp;q=0', 'jpeg'),
+        ]:
+            with self.subTest(accept=accept):
+                self.assertEqual(negotiate_format(accept), expected)
+
+    def test_select_renditions(self):
+        renditions = list(self.photo.renditions.all())
+        for image_format in ('webp', 'jpeg', 'avif'):
+            for ordered in (renditions, renditions[::-1]):
+                with self.subTest(image_format=image_format, reversed=ordered is not renditions):
+                    selected = select_renditions(ordered, image_format)
+                    self.assertEqual(
+                        {name: rendition.format for name, rendition in selected.items()},
+                        {'thumb': 'webp' if image_format == 'webp' else 'jpeg', 'full': 'jpeg'},
+                    )
+
+    def test_gallery(self):
+        for accept, thumb_type in (('image/webp,*/*', 'image/webp'), ('*/*', 'image/jpeg')):
+            with self.subTest(accept=accept):
+                response = self.client.get(reverse('photo-gallery'), HTTP_ACCEPT=accept)
+                self.assertIn('Accept', response['Vary'])
+                item = response.data['results'][0]
+                self.assertEqual(item['srcset']['thumb']['type'], thumb_type)
+                self.assertEqual(item['srcset']['full']['type'], 'image/jpeg')
+                self.assertRegex(item['watermarked_image'], r'/sunset_full\w*\.jpg$')
+
+    def test_download(self):
+        self.authenticate(self.uploader)
+        with override_settings(PHOTO_WATERMARKED_RENDITION='thumb'):
+            response = self.client.get(reverse('photo-download', args=[self.photo.pk]), HTTP_ACCEPT='image/webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+        self.assertRegex(response.data['watermarked_image_url'], r'/sunset_thumb\w*\.webp$')
+
+    def test_file(self):
+        for kind, accept, content_type in [
+            ('thumb', 'image/webp', 'image/webp'),
+            ('thumb', 'image/*', 'image/jpeg'),
+            ('full', 'image/webp', 'image/jpeg'),
+        ]:
+            with self.subTest(kind=kind, accept=accept):
+                response = self.client.get(reverse('photo-file', args=[self.photo.pk, kind]), HTTP_ACCEPT=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertIn('Accept', response['Vary'])
+
+
+# Ranged file delivery
+
+class FileDeliveryTests(PhotoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        name = default_storage.save('photos/watermarked/range.jpg', ContentFile(self.content))
+        self.photo = self.create_photo(watermarked_image=name)
+        self.url = reverse('photo-file', args=[self.photo.pk, 'watermarked'])
+
+    def test_parse_range(self):
+        for header, expected in [
+            (None, None),
+            ('', None),
+            ('bytes=0-9', (0, 9)),
+            ('bytes=90-', (90, 99)),
+            ('bytes=95-200', (95, 99)),
+            ('bytes=-10', (90, 99)),
+            ('bytes=-500', (0, 99)),
+            ('bytes=-', None),
+            ('bytes=0-1,5-6', None),
+            ('items=0-9', None),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 100), expected)
+
+        for header in ('bytes=-0', 'bytes=100-', 'bytes=9-5'):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+    def test_full_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        current = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(current.status_code, 206)
+        stale = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_original_needs_authentication(self):
+        url = reverse('photo-file', args=[self.photo.pk, 'original'])
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+# Direct-to-S3 uploads
+
+@unittest.skipIf(mock_aws is None, 'moto is not installed')
+@override_settings(
+    STORAGES=S3_STORAGES,
+    AWS_ACCESS_KEY_ID='testing',
+    AWS_SECRET_ACCESS_KEY='testing',
+    AWS_STORAGE_BUCKET_NAME='tmf-test',
+    AWS_S3_REGION_NAME='us-east-1',
+    AWS_S3_ENDPOINT_URL=None,
+)
+class DirectUploadTests(PhotoTestCase):
+    bucket = 'tmf-test'
+
+    def setUp(self):
+        super().setUp()
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket=self.bucket)
+        self.authenticate(self.uploader)
+
+    def initiate(self, content, content_type='image/jpeg'):
+        response = self.client.post(reverse('photo-direct-upload-initiate'), {
+            'filename': 'beach.jpg', 'content_type': content_type, 'size': len(content),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def put_parts(self, upload, content):
+        """Upload each part to its presigned URL, as a browser would."""
+        parts = []
+        for part in upload['parts']:
+            start = (part['part_number'] - 1) * upload['part_size']
+            response = requests.put(part['url'], data=content[start:start + upload['part_size']])
+            self.assertEqual(response.status_code, 200)
+            parts.append({'part_number': part['part_number'], 'etag': response.headers['ETag']})
+        return parts
+
+    def complete(self, upload, parts):
+        return self.client.post(reverse('photo-direct-upload-complete'), {
+            'upload_token': upload['upload_token'],
+            'parts': parts,
+            'title': 'Beach',
+            'description': 'Low tide',
+            'capture_date': '2024-07-01',
+        }, format='json')
+
+    def keys(self, prefix=''):
+        return [item['Key'] for item in self.s3.list_objects_v2(Bucket=self.bucket, Prefix=prefix).get('Contents', [])]
+
+    def test_upload_and_process(self):
+        content = make_image((120, 80))
+        upload = self.initiate(content)
+        self.assertEqual(len(upload['parts']), 1)
+
+        response = self.complete(upload, self.put_parts(upload, content))
+        self.assertEqual(response.status_code, 202)
+        photo = Photo.objects.get(pk=response.data['id'])
+        self.assertEqual((photo.width, photo.height, photo.image_format), (120, 80, 'JPEG'))
+        self.assertEqual(photo.original_size_bytes, len(content))
+        self.assertEqual(self.keys(photo.original_image.name), [photo.original_image.name])
+
+        self.process_queue()
+        photo.refresh_from_db()
+        self.assertEqual(photo.status, Photo.STATUS_READY)
+        self.assertEqual(len(self.keys('photos/renditions/')), photo.renditions.count())
+
+    def test_rejects_a_file_that_is_not_an_image(self):
+        content = b'just some text' * 100
+        upload = self.initiate(content)
+        response = self.complete(upload, self.put_parts(upload, content))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parts', response.data)
+        self.assertEqual(self.keys('photos/originals/'), [])
+        self.assertFalse(Photo.objects.exists())
+
+    def test_rejects_a_size_other_than_announced(self):
+        content = make_image()
+        upload = self.initiate(content + b'\0')
+        response = self.complete(upload, self.put_parts(upload, content))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.keys('photos/originals/'), [])
+
+    def test_token_is_bound_to_its_uploader(self):
+        content = make_image()
+        upload = self.initiate(content)
+        parts = self.put_parts(upload, content)
+
+        self.authenticate(User.objects.create(username='other', role='Uploader'))
+        response = self.complete(upload, parts)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('upload_token', response.data)
+
+    def test_abort(self):
+        upload = self.initiate(make_image())
+        response = self.client.post(reverse('photo-direct-upload-abort'), {
+            'upload_token': upload['upload_token'],
+        }, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.s3.list_multipart_uploads(Bucket=self.bucket).get('Uploads', []), [])
+
+
+class DirectUploadStorageTests(PhotoTestCase):
+    def test_requires_s3_storage(self):
+        self.authenticate(self.uploader)
+        response = self.client.post(reverse('photo-direct-upload-initiate'), {
+            'filename': 'beach.jpg', 'content_type': 'image/jpeg', 'size': 1000,
+        }, format='json')
+        self.assertEqual(response.status_code, 501)
+
+
+# Migrating local files to S3 (migrate_to_s3)
+
+@unittest.skipIf(mock_aws is None, 'moto is not installed')
+class MigrateToS3Tests(PhotoTestCase):
+    bucket = 'tmf-migrate'
+
+    def setUp(self):
+        super().setUp()
+        environ = mock.patch.dict(os.environ, {
+            'AWS_ACCESS_KEY_ID': 'testing',
+            'AWS_SECRET_ACCESS_KEY': 'testing',
+            'AWS_STORAGE_BUCKET_NAME': self.bucket,
+            'AWS_S3_REGION_NAME': 'us-east-1',
+        })
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop('AWS_S3_ENDPOINT_URL', None)
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket=self.bucket)
+
+        checkpoint_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, checkpoint_dir, ignore_errors=True)
+        self.checkpoint = os.path.join(checkpoint_dir, 'checkpoint.json')
+
+        self.photos = []
+        for index in range(3):
+            content = make_image(color=(index, 0, 0))
+            photo = self.create_photo(
+                original_image=default_storage.save(f'photos/originals/migrate_{index}.jpg', ContentFile(content)),
+            )
+            full = default_storage.save(f'photos/renditions/migrate_{index}_full.jpg', ContentFile(content[:100]))
+            PhotoRendition.objects.create(photo=photo, name='full', image=full, width=64, height=48)
+            photo.watermarked_image = full
+            photo.save()
+            self.photos.append(photo)
+
+    def migrate(self, **options):
+        out = StringIO()
+        options = {'checkpoint': self.checkpoint, 'media_root': MEDIA_ROOT, 'workers': 2, 'chunk_size': 2, **options}
+        call_command('migrate_to_s3', stdout=out, **options)
+        return out.getvalue()
+
+    def remote_keys(self):
+        return {item['Key'] for item in self.s3.list_objects_v2(Bucket=self.bucket).get('Contents', [])}
+
+    def local_names(self, photos=None):
+        names = set()
+        for photo in photos or self.photos:
+            names.add(photo.original_image.name)
+            names.update(rendition.image.name for rendition in photo.renditions.all())
+        return names
+
+    def test_migrate_and_skip_on_the_next_run(self):
+        output = self.migrate()
+        self.assertIn('Migrated: 3', output)
+        self.assertIn('Uploaded files: 6', output)  # The watermarked image is the `full` rendition
+        self.assertEqual(self.remote_keys(), self.local_names())
+        original = self.photos[0].original_image
+        with original.open('rb') as f:
+            body = self.s3.get_object(Bucket=self.bucket, Key=original.name)['Body'].read()
+            self.assertEqual(body, f.read())
+
+        output = self.migrate(restart=True)
+        self.assertIn('Uploaded files: 0', output)
+        self.assertIn('Skipped (already in bucket): 6', output)
+
+    def test_changed_file_of_the_same_size_is_uploaded_again(self):
+        self.migrate()
+        name = self.photos[0].original_image.name
+        with open(os.path.join(MEDIA_ROOT, name), 'r+b') as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b'new')
+
+        self.assertIn('Uploaded files: 0', self.migrate(restart=True, size_only=True))
+        self.assertIn('Uploaded files: 1', self.migrate(restart=True))
+
+    def test_multipart_uploads_are_recognised(self):
+        content = os.urandom(11 * 1024 * 1024)
+        photo = self.create_photo(original_image=default_storage.save('photos/originals/large.jpg', ContentFile(content)))
+
+        self.migrate(multipart_threshold=5, multipart_chunksize=5)
+        head = self.s3.head_object(Bucket=self.bucket, Key=photo.original_image.name)
+        self.assertTrue(head['ETag'].strip('"').endswith('-3'))
+
+        output = self.migrate(restart=True, multipart_threshold=5, multipart_chunksize=5)
+        self.assertIn('Uploaded files: 0', output)
+
+    def test_legacy_absolute_paths_are_rewritten(self):
+        photo = self.photos[0]
+        absolute = os.path.join(MEDIA_ROOT, photo.original_image.name)
+        Photo.objects.filter(pk=photo.pk).update(original_image=absolute)
+
+        self.migrate(media_root='/')
+        photo.refresh_from_db()
+        self.assertEqual(photo.original_image.name, f'photos/originals/{os.path.basename(absolute)}')
+        self.assertIn(photo.original_image.name, self.remote_keys())
+
+    def test_resume_and_retry_failed_photos(self):
+        broken = self.photos[1].original_image.name
+        original_upload = MigrateToS3.upload
+
+        def upload(command, name, s3_key, remote):
+            if name == broken:
+                raise OSError('connection reset')
+            return original_upload(command, name, s3_key, remote)
+
+        with mock.patch.object(MigrateToS3, 'upload', autospec=True, side_effect=upload):
+            output = self.migrate()
+        self.assertIn(f'Error with original_image: photo {self.photos[1].pk} - connection reset', output)
+        self.assertIn('1 photo(s) failed', output)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f), {'last_pk': self.photos[-1].pk, 'failed': [self.photos[1].pk]})
+        self.assertNotIn(broken, self.remote_keys())
+
+        later = self.create_photo(original_image=default_storage.save('photos/originals/later.jpg', ContentFile(b'x')))
+        output = self.migrate()
+        self.assertIn(f'Resuming after photo {self.photos[-1].pk} (1 failed photo(s) to retry)', output)
+        self.assertIn('Found 2 photos', output)
+        self.assertIn('Uploaded files: 2', output)  # The retried original and the new photo
+        self.assertEqual(self.remote_keys(), self.local_names(self.photos + [later]))
+
+    def test_missing_local_files(self):
+        missing = self.photos[0].original_image.name
+        default_storage.delete(missing)
+        output = self.migrate()
+        self.assertIn(f'File not found: {os.path.join(MEDIA_ROOT, missing)}', output)
+        self.assertIn('Missing locally: 1', output)
+        self.assertEqual(self.remote_keys(), self.local_names() - {missing})
+
+    def test_dry_run(self):
+        output = self.migrate(dry_run=True)
+        self.assertIn('Uploaded files: 6', output)
+        self.assertEqual(self.remote_keys(), set())
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_bucket_must_be_configured(self):
+        del os.environ['AWS_STORAGE_BUCKET_NAME']
+        self.assertIn('AWS_STORAGE_BUCKET_NAME not configured', self.migrate())
+
+
+# Content-hash deduplication
+
+class DedupeTests(PhotoTestCase):
+    def test_reupload_reuses_renditions(self):
+        content = make_image()
+        first = Photo.objects.get(pk=self.upload(content).data['id'])
+        self.process_queue()
+
+        response = self.upload(content, name='again.jpg')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], Photo.STATUS_READY)
+
+        second = Photo.objects.get(pk=response.data['id'])
+        first.refresh_from_db()
+        self.assertTrue(second.is_listable)
+        self.assertFalse(ImageJob.objects.filter(photo=second).exists())
+        self.assertEqual(second.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual(second.original_image.name, first.original_image.name)
+        self.assertEqual(second.watermarked_image.name, first.watermarked_image.name)
+        self.assertEqual(
+            sorted(second.renditions.values_list('name', 'format', 'image')),
+            sorted(first.renditions.values_list('name', 'format', 'image')),
+        )
+
+    def test_different_content_is_processed(self):
+        self.upload(make_image(color=(10, 10, 10)))
+        self.process_queue()
+        response = self.upload(make_image(color=(250, 250, 250)))
+        self.assertEqual(response.status_code, 202)
+
+    def test_rendition_names_fit_the_column(self):
+        # Renditions are named after the 64-character content hash; rewriting them finds the names taken
+        photo = Photo.objects.get(pk=self.upload(make_image()).data['id'])
+        self.process_queue()
+        photo.store_renditions(render_renditions(BytesIO(make_image())))
+
+        max_length = PhotoRendition._meta.get_field('image').max_length
+        for name in photo.renditions.values_list('image', flat=True):
+            self.assertLessEqual(len(name), max_length)
+
+    def create_legacy_photo(self, content, padding=0):
+        """A photo from before content hashing, with renditions of its own."""
+        photo = self.create_photo(status=Photo.STATUS_PENDING, original_image='')
+        photo.original_image.save('legacy.jpg', ContentFile(content), save=False)
+        rendered = render_renditions(BytesIO(content))
+        photo.store_renditions([item._replace(content=item.content + b'\0' * padding) for item in rendered])
+        photo.status = Photo.STATUS_READY
+        photo.save()
+        return photo
+
+    def test_dedupe_photos_command(self):
+        content = make_image()
+        canonical = self.create_legacy_photo(content)
+        duplicate = self.create_legacy_photo(content, padding=100)
+        duplicate_files = list(duplicate.renditions.values_list('image', flat=True))
+
+        call_command('dedupe_photos', stdout=StringIO())
+
+        canonical.refresh_from_db()
+        duplicate.refresh_from_db()
+        self.assertEqual(canonical.original_image.name, duplicate.original_image.name)
+        self.assertEqual(
+            sorted(duplicate.renditions.values_list('image', flat=True)),
+            sorted(canonical.renditions.values_list('image', flat=True)),
+        )
+        for name in duplicate_files:
+            self.assertFalse(default_storage.exists(name))
+
+        # Every photo still counts the renditions it shows
+        rendition_bytes = UploaderStats.objects.get(uploader=self.uploader).rendition_bytes
+        self.assertEqual(rendition_bytes, stats.rebuild(self.uploader.pk).rendition_bytes)
+
+
+# Uploader dashboard totals
+
+class UploaderStatsTests(PhotoTestCase):
+    def get_stats(self):
+        return UploaderStats.objects.get(uploader=self.uploader)
+
+    def test_totals_follow_uploads_processing_and_deletion(self):
+        content = make_image()
+        photo = Photo.objects.get(pk=self.upload(content).data['id'])
+        totals = self.get_stats()
+        self.assertEqual((totals.photo_count, totals.original_bytes, totals.rendition_bytes), (1, len(content), 0))
+        self.assertEqual(totals.last_upload_at, photo.created_at)
+
+        self.process_queue()
+        rendition_bytes = sum(photo.renditions.values_list('size_bytes', flat=True))
+        self.assertGreater(rendition_bytes, 0)
+        self.assertEqual(self.get_stats().rendition_bytes, rendition_bytes)
+
+        response = self.client.get(reverse('photo-mine-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_bytes'], len(content) + rendition_bytes)
+
+        photo.delete()
+        totals = self.get_stats()
+        self.assertEqual((totals.photo_count, totals.original_bytes, totals.rendition_bytes), (0, 0, 0))
+
+    def test_reused_renditions_count_for_each_photo(self):
+        content = make_image()
+        self.upload(content)
+        self.process_queue()
+        self.upload(content)
+
+        totals = self.get_stats()
+        self.assertEqual(totals.photo_count, 2)
+        self.assertEqual(totals.rendition_bytes, sum(PhotoRendition.objects.values_list('size_bytes', flat=True)))
+
+    def test_incremental_totals_match_a_rebuild(self):
+        for color in ((10, 20, 30), (40, 50, 60), (70, 80, 90)):
+            self.upload(make_image(color=color))
+        self.process_queue()
+        Photo.objects.order_by('pk').first().delete()
+
+        incremental = self.get_stats()
+        rebuilt = stats.rebuild(self.uploader.pk)
+        for field in ('photo_count', 'original_bytes', 'rendition_bytes'):
+            self.assertEqual(getattr(incremental, field), getattr(rebuilt, field), field)
+
+    def test_uploader_without_photos(self):
+        self.authenticate(self.uploader)
+        response = self.client.get(reverse('photo-mine-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['photo_count'], response.data['total_bytes']), (0, 0))
+
+
+# Batch uploads
+
+class BatchUploadTests(PhotoTestCase):
+    def post(self, files, metadata=None):
+        self.authenticate(self.uploader)
+        if metadata is None:
+            metadata = [{'title': name} for name, _ in files]
+        data = {
+            'files': [SimpleUploadedFile(name, content) for name, content in files],
+            'metadata': json.dumps(metadata),
+        }
+        return self.client.post(reverse('photo-upload-batch'), data, format='multipart')
+
+    def test_all_accepted(self):
+        response = self.post(
+            [('a.jpg', make_image(color=(1, 2, 3))), ('b.png', make_image(color=(4, 5, 6), image_format='PNG'))],
+            metadata=[{'title': 'A', 'description': 'First', 'capture_date': '2024-01-01'}, {'title': 'B'}],
+        )
+        self.assertEqual(response.status_code, 202)
+        results = response.data['results']
+        self.assertEqual([(result['index'], result['status']) for result in results], [(0, 202), (1, 202)])
+        self.assertEqual([result['photo']['title'] for result in results], ['A', 'B'])
+        self.assertEqual(ImageJob.objects.filter(status=ImageJob.STATUS_QUEUED).count(), 2)
+        self.assertEqual(UploaderStats.objects.get(uploader=self.uploader).photo_count, 2)
+
+    def test_partly_accepted(self):
+        response = self.post([('a.jpg', make_image()), ('notes.txt', b'not an image at all')])
+        self.assertEqual(response.status_code, 207)
+        good, bad = response.data['results']
+        self.assertEqual((good['status'], bad['status']), (202, 400))
+        self.assertEqual(bad['filename'], 'notes.txt')
+        self.assertIn('original_image', bad['errors'])
+        self.assertEqual(Photo.objects.count(), 1)
+
+    def test_nothing_accepted(self):
+        response = self.post([('notes.txt', b'not an image at all')])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Photo.objects.exists())
+
+    def test_storage_failure(self):
+        with mock.patch('photos.batch_upload.store_blob', side_effect=OSError('bucket unavailable')), \
+                self.assertLogs('photos.batch_upload', 'ERROR'):
+            response = self.post([('a.jpg', make_image())])
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data['results'][0]['status'], 502)
+        self.assertFalse(Photo.objects.exists())
+
+    def test_metadata_must_match_the_files(self):
+        response = self.post([('a.jpg', make_image())], metadata=[{'title': 'A'}, {'title': 'B'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('metadata', response.data)
+
+    @override_settings(PHOTO_BATCH_MAX_FILES=1)
+    def test_too_many_files(self):
+        response = self.post([('a.jpg', make_image()), ('b.jpg', make_image(color=(0, 0, 0)))])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('files', response.data)
+
+    def test_reupload_in_a_batch_is_ready(self):
+        content = make_image()
+        self.upload(content)
+        self.process_queue()
+
+        response = self.post([('again.jpg', content)])
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['results'][0]['photo']['status'], Photo.STATUS_READY)
+
+
+# Streaming upload handler
+
+class UploadValidationTests(PhotoTestCase):
+    def test_accepted_upload_is_identified_while_streaming(self):
+        content = make_image((90, 70))
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 202)
+        photo = Photo.objects.get(pk=response.data['id'])
+        self.assertEqual(photo.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual((photo.image_format, photo.width, photo.height), ('JPEG', 90, 70))
+        self.assertEqual(photo.original_size_bytes, len(content))
+
+    @override_settings(PHOTO_MAX_UPLOAD_BYTES=1000)
+    def test_oversize(self):
+        response = self.upload(make_image((400, 300)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger than the 1000 byte limit', response.data['original_image'][0])
+        self.assertFalse(Photo.objects.exists())
+
+    def test_not_an_image(self):
+        response = self.upload(b'%PDF-1.4 not an image', name='photo.pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('valid image', response.data['original_image'][0])
+
+    @override_settings(PHOTO_UPLOAD_FORMATS=['PNG'])
+    def test_format_not_accepted(self):
+        response = self.upload(make_image())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.upload(make_image(image_format='PNG'), name='photo.png').status_code, 202)
+
+    @override_settings(PHOTO_MAX_IMAGE_PIXELS=1000)
+    def test_too_many_pixels(self):
+        response = self.upload(make_image((50, 50)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('the limit is 1000', response.data['original_image'][0])
+
+    def test_pixel_bomb(self):
+        # A few bytes claiming 100,000 x 100,000 pixels: refused from the header, nothing is decoded
+        response = self.upload(make_png_header(100_000, 100_000), name='bomb.png')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('pixels', response.data['original_image'][0])
+
+    @override_settings(PHOTO_PROCESS_INLINE=True)
+    def test_inline_processing(self):
+        response = self.upload(make_image())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], Photo.STATUS_READY)
+        self.assertFalse(ImageJob.objects.exists())
+
+    @override_settings(PHOTO_PROCESS_INLINE=True)
+    def test_inline_processing_of_an_undecodable_file(self):
+        content = make_image((400, 300))
+        response = self.upload(content[:len(content) // 2])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('could not be decoded', response.data['original_image'][0])
+        self.assertFalse(Photo.objects.exists())
+
+
+# Inline processing (PHOTO_PROCESS_INLINE)
+
+@override_settings(PHOTO_PROCESS_INLINE=True)
+class InlineProcessingTests(PhotoTestCase):
+    def test_upload_is_ready_and_listed(self):
+        content = make_image((400, 300))
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 201)
+
+        photo = Photo.objects.get(pk=response.data['id'])
+        self.assertTrue(photo.is_listable)
+        self.assertEqual(self.gallery_ids(), [photo.pk])
+        with photo.original_image.open('rb') as f:
+            self.assertEqual(f.read(), content)
+
+        stored = {(rendition.name, rendition.format): rendition for rendition in photo.renditions.all()}
+        self.assertEqual(set(stored), {(name, fmt) for name in TEST_RENDITIONS for fmt in TEST_FORMATS})
+        for rendition in stored.values():
+            self.assertTrue(default_storage.exists(rendition.image.name))
+        self.assertEqual(photo.watermarked_image.name, stored['full', 'jpeg'].image.name)
+
+    def test_original_is_not_read_back_from_storage(self):
+        storage = Photo._meta.get_field('original_image').storage
+        with mock.patch.object(storage, 'open', wraps=storage.open) as storage_open:
+            self.assertEqual(self.upload(make_image()).status_code, 201)
+        storage_open.assert_not_called()
+
+    def test_photo_row_is_inserted_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.upload(make_image()).status_code, 201)
+        statements = [query['sql'] for query in queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT INTO "photos_photo"')]), 1)
+        self.assertEqual([sql for sql in statements if sql.startswith('UPDATE "photos_photo"')], [])
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT INTO "photos_photorendition"')]), 1)
+
+    def test_failed_rendition_insert_rolls_back_the_photo(self):
+        with mock.patch.object(PhotoRendition.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.upload(make_image())
+        self.assertFalse(Photo.objects.exists())
+        self.assertFalse(PhotoRendition.objects.exists())
+
+    def test_reupload_reuses_the_twin_instead_of_rendering(self):
+        content = make_image()
+        first = Photo.objects.get(pk=self.upload(content).data['id'])
+        with mock.patch.object(renditions, 'render_renditions', wraps=renditions.render_renditions) as render:
+            response = self.upload(content)
+        self.assertEqual(response.status_code, 201)
+        render.assert_not_called()
+
+        second = Photo.objects.get(pk=response.data['id'])
+        self.assertEqual(second.original_image.name, first.original_image.name)
+        self.assertEqual(
+            sorted(rendition.image.name for rendition in second.renditions.all()),
+            sorted(rendition.image.name for rendition in first.renditions.all()),
+        )
@@ -0,0 +1,131 @@
+"""
+Upload handler for the photo upload endpoints (PhotoUploadHandlerMixin in photos/views.py).
+
+Django's default handlers buffer or spool each file and leave everything else to later stages:
+ImageField validation opens (and verifies) the image with Pillow, then the upload is read once
+more to hash it. PhotoUploadHandler does all of it while the request body streams in, chunk by
+chunk, without holding a whole file in memory:
+
+- the SHA-256 (the blob name, see photos/blobs.py) is updated with every chunk;
+- the format and dimensions are read from the first bytes only, nothing is decoded;
+- files over PHOTO_MAX_UPLOAD_BYTES, in a format outside PHOTO_UPLOAD_FORMATS or over
+  PHOTO_MAX_IMAGE_PIXELS stop being written to disk as soon as that is known.
+
+Every file comes out with `upload_info` (an UploadInfo) or `upload_error` (a message), which
+UploadedImageField (photos/serializers.py) reports instead of opening the image again.
+"""
+import hashlib
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+
+from .blobs import hash_file
+from .renditions import check_dimensions, get_max_pixels
+
+# Image headers (JPEG EXIF/ICC segments included) are nearly always well within this. Files not
+# identified by then are written out in full and validated the usual way, by opening them with Pillow.
+HEADER_MAX_BYTES = 1024 * 1024
+
+INVALID_IMAGE = "Upload a valid image. The file you uploaded was either not an image or a corrupted image."
+
+UploadInfo = namedtuple('UploadInfo', ['content_hash', 'format', 'width', 'height', 'size'])
+ImageHeader = namedtuple('ImageHeader', ['format', 'width', 'height'])
+
+
+def get_upload_formats():
+    """Pillow format names accepted for originals (PHOTO_UPLOAD_FORMATS) that this Pillow can open."""
+    Image.init()
+    formats = getattr(settings, 'PHOTO_UPLOAD_FORMATS', ['JPEG', 'PNG', 'WEBP', 'AVIF', 'TIFF', 'GIF', 'BMP'])
+    return [name for name in formats if name in Image.OPEN]
+
+
+def read_header(data):
+    """
+    ImageHeader of an accepted format from a file's first bytes, or None if they aren't
+    (or don't yet cover) one. Raises ValueError for images over PHOTO_MAX_IMAGE_PIXELS.
+    """
+    try:
+        with Image.open(BytesIO(data), formats=get_upload_formats()) as image:
+            header = ImageHeader(image.format, image.width, image.height)
+    except Image.DecompressionBombError:
+        raise ValueError(f"Image has more than {get_max_pixels()} pixels")
+    except (OSError, SyntaxError, ValueError, EOFError):
+        return None  # Not an image, or the header continues past `data`
+    check_dimensions(header.width, header.height)
+    return header
+
+
+def get_upload_info(f):
+    """
+    UploadInfo of a validated upload: PhotoUploadHandler's, or else hashed now and read
+    from the image ImageField validation opened (uploads through other handlers).
+    """
+    info = getattr(f, 'upload_info', None)
+    if info is None:
+        image = getattr(f, 'image', None)
+        width, height = image.size if image is not None else (None, None)
+        info = UploadInfo(hash_file(f), getattr(image, 'format', None) or '', width, height, f.size)
+        f.upload_info = info
+    return info
+
+
+class PhotoUploadHandler(TemporaryFileUploadHandler):
+    """Spools each file to a temporary file while hashing it and reading its header; see the module docstring."""
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.max_bytes = getattr(settings, 'PHOTO_MAX_UPLOAD_BYTES', 100 * 1024 * 1024)
+        self.digest = hashlib.sha256()
+        self.header = None
+        self.header_bytes = b''
+        self.error = None
+        self.received = 0
+        if content_length is not None and content_length > self.max_bytes:
+            self.reject(self.too_large())
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.error is not None:
+            return None
+        if self.received > self.max_bytes:
+            self.reject(self.too_large())
+            return None
+
+        self.digest.update(raw_data)
+        if self.header is None and len(self.header_bytes) < HEADER_MAX_BYTES:
+            self.header_bytes += raw_data
+            try:
+                self.header = read_header(self.header_bytes)
+            except ValueError as e:
+                self.reject(str(e))
+                return None
+            if self.header is not None:
+                self.header_bytes = b''
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        if self.error is None and self.header is None and file_size <= HEADER_MAX_BYTES:
+            # The whole file was tried as a header
+            self.reject(INVALID_IMAGE)
+
+        if self.error is not None:
+            self.file.upload_error = self.error
+        elif self.header is not None:
+            self.file.upload_info = UploadInfo(self.digest.hexdigest(), *self.header, file_size)
+        return self.file
+
+    def reject(self, message):
+        """Keep receiving (and discarding) the rest of the file; only the message is kept."""
+        self.error = message
+        self.header_bytes = b''
+        self.file.seek(0)
+        self.file.truncate()
+
+    def too_large(self):
+        return f"File is larger than the {self.max_bytes} byte limit."
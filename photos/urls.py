@@ -1,8 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from .views import UploadPhotoView, GalleryView, PhotoDownloadView
+from .views import (
+    UploadPhotoView, BatchUploadPhotoView, GalleryView, PhotoDownloadView, PhotoFileView, MyPhotosView, MyPhotoStatsView,
+    DirectUploadInitiateView, DirectUploadCompleteView, DirectUploadAbortView,
+)
+from .async_views import AsyncGalleryView, AsyncPhotoDownloadView
+
+if getattr(settings, 'PHOTO_ASYNC_VIEWS', False):
+    gallery_view, download_view = AsyncGalleryView.as_view(), AsyncPhotoDownloadView.as_view()
+else:
+    gallery_view, download_view = GalleryView.as_view(), PhotoDownloadView.as_view()
 
 urlpatterns = [
     path('upload/', UploadPhotoView.as_view(), name='photo-upload'),
-    path('gallery/', GalleryView.as_view(), name='photo-gallery'),
-    path('download/<int:pk>/', PhotoDownloadView.as_view(), name='photo-download'),
+    path('upload/batch/', BatchUploadPhotoView.as_view(), name='photo-upload-batch'),
+    path('uploads/initiate/', DirectUploadInitiateView.as_view(), name='photo-direct-upload-initiate'),
+    path('uploads/complete/', DirectUploadCompleteView.as_view(), name='photo-direct-upload-complete'),
+    path('uploads/abort/', DirectUploadAbortView.as_view(), name='photo-direct-upload-abort'),
+    path('gallery/', gallery_view, name='photo-gallery'),
+    path('mine/', MyPhotosView.as_view(), name='photo-mine'),
+    path('mine/stats/', MyPhotoStatsView.as_view(), name='photo-mine-stats'),
+    path('download/<int:pk>/', download_view, name='photo-download'),
+    path('files/<int:pk>/<slug:kind>/', PhotoFileView.as_view(), name='photo-file'),
 ]
@@ -1,29 +1,262 @@
-from rest_framework import generics, permissions
+from django.conf import settings
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from django.http import Http404
 from .models import Photo
-from .serializers import PhotoUploadSerializer, PhotoGallerySerializer, PhotoDownloadSerializer
+from .serializers import (
+    PhotoUploadSerializer, PhotoBatchUploadSerializer, PhotoGallerySerializer, PhotoDownloadSerializer, GalleryFilterSerializer,
+    UploaderPhotoSerializer, UploaderStatsSerializer,
+    DirectUploadInitiateSerializer, DirectUploadCompleteSerializer, DirectUploadTokenSerializer,
+)
 from .permissions import IsUploader, IsBuyer
+from .pagination import GalleryCursorPagination
+from . import cache as gallery_cache
+from .delivery import serve_file
+from . import batch_upload, direct_upload, search
+from . import stats as uploader_stats
+from .renditions import negotiate_format, select_renditions
+from .upload_handlers import PhotoUploadHandler
 
-class UploadPhotoView(generics.CreateAPIView):
+class NegotiatedFormatMixin:
+    """Serves renditions in the best format the client's Accept header allows (see PHOTO_RENDITION_FORMATS)."""
+
+    def get_image_format(self):
+        return negotiate_format(self.request.META.get('HTTP_ACCEPT'))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_format'] = self.get_image_format()
+        return context
+
+    def perform_content_negotiation(self, request, force=False):
+        # Accept may list only image types (`image/webp`): use the default renderer, never answer 406
+        return super().perform_content_negotiation(request, force=True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+class PhotoUploadHandlerMixin:
+    """Receive multipart files with PhotoUploadHandler (hashed and identified while streaming in)."""
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be set before the body is parsed, i.e. before anything reads request.data
+        request.upload_handlers = [PhotoUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+class UploadPhotoView(PhotoUploadHandlerMixin, generics.CreateAPIView):
     queryset = Photo.objects.all()
     serializer_class = PhotoUploadSerializer
     permission_classes = [IsUploader]
 
+    def create(self, request, *args, **kwargs):
+        # Watermarking usually happens in the `process_image_jobs` worker, so the upload is only accepted
+        # here (202); photos processed inline or reusing a twin's renditions are created ready (201)
+        response = super().create(request, *args, **kwargs)
+        if response.data['status'] != Photo.STATUS_READY:
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            photo = serializer.save(uploader_id=self.request.user.id)
+            if photo.status == Photo.STATUS_READY:
+                return  # Processed inline (PHOTO_PROCESS_INLINE)
+            # A re-upload of an already processed file is ready immediately
+            if photo.reuse_renditions():
+                photo.save(update_fields=['watermarked_image', 'status'])
+            else:
+                photo.enqueue_processing()
+
+class BatchUploadPhotoView(PhotoUploadHandlerMixin, generics.GenericAPIView):
+    """
+    Many photos in one request (see photos/batch_upload.py). Every file gets its own result, in
+    upload order: 202 with the photo, 400 with validation errors, or 502 if storing it failed.
+    The response is 202 when all files were accepted, 207 when only some were.
+    """
+    serializer_class = PhotoBatchUploadSerializer
+    item_serializer_class = PhotoUploadSerializer
+    permission_classes = [IsUploader]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = [batch_upload.BatchItem(index, data) for index, data in enumerate(serializer.get_items())]
+        batch_upload.upload(request.user.id, items, self.item_serializer_class, self.get_serializer_context())
+
+        results = []
+        for item in items:
+            result = {'index': item.index, 'filename': item.filename, 'status': item.status_code}
+            if item.photo is not None:
+                result['photo'] = self.item_serializer_class(item.photo, context=self.get_serializer_context()).data
+            else:
+                result['errors'] = item.errors
+            results.append(result)
+        return Response({'results': results}, status=self.get_status(items))
+
+    def get_status(self, items):
+        codes = {item.status_code for item in items}
+        if codes == {status.HTTP_202_ACCEPTED}:
+            return status.HTTP_202_ACCEPTED
+        if status.HTTP_202_ACCEPTED in codes:
+            return status.HTTP_207_MULTI_STATUS
+        # Nothing accepted: a client error if any file was invalid, otherwise storage failed for all
+        return status.HTTP_400_BAD_REQUEST if status.HTTP_400_BAD_REQUEST in codes else status.HTTP_502_BAD_GATEWAY
+
+class DirectUploadInitiateView(generics.GenericAPIView):
+    """
+    Step 1 of a direct-to-S3 upload: returns presigned multipart part URLs so the
+    original goes straight from the client to the bucket, never through our workers.
+    """
+    serializer_class = DirectUploadInitiateSerializer
+    permission_classes = [IsUploader]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = direct_upload.initiate(request.user, **serializer.validated_data)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class DirectUploadCompleteView(generics.CreateAPIView):
+    """Step 2: assemble the parts, create the Photo row and queue processing (202, like UploadPhotoView)."""
+    serializer_class = DirectUploadCompleteSerializer
+    permission_classes = [IsUploader]
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     def perform_create(self, serializer):
-        serializer.save(uploader=self.request.user)
+        with transaction.atomic():
+            photo = serializer.save(uploader_id=self.request.user.id)
+            photo.enqueue_processing()
 
-class GalleryView(generics.ListAPIView):
+class DirectUploadAbortView(generics.GenericAPIView):
+    serializer_class = DirectUploadTokenSerializer
+    permission_classes = [IsUploader]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        direct_upload.abort(serializer.validated_data['token_data'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class GalleryView(NegotiatedFormatMixin, generics.ListAPIView):
     serializer_class = PhotoGallerySerializer
     permission_classes = [permissions.AllowAny]  # Public access
+    pagination_class = GalleryCursorPagination
+    keyset_ordering = ('-created_at', '-id')
+
+    def get_filters(self):
+        """Validated ?q=, ?captured_after=, ?captured_before= and ?uploader= (400 if malformed)."""
+        if not hasattr(self, '_filters'):
+            serializer = GalleryFilterSerializer(data=self.request.query_params)
+            serializer.is_valid(raise_exception=True)
+            self._filters = serializer.validated_data
+        return self._filters
 
     def get_queryset(self):
-        # Filter for non-empty Title, Description, and capture_date.
-        # Capture date is not null by default, but we can check validation.
-        # Exclude empty strings for title and description.
-        return Photo.objects.exclude(title__exact='').exclude(description__exact='').exclude(capture_date__isnull=True).order_by('-created_at')
+        # Only processed (ready) photos with a non-empty Title, Description and a capture_date are listed.
+        # That predicate is stored as `is_listable` so the partial index photo_listable_idx serves it.
+        queryset = Photo.objects.filter(is_listable=True)
+        filters = self.get_filters()
+        if 'captured_after' in filters:
+            queryset = queryset.filter(capture_date__gte=filters['captured_after'])
+        if 'captured_before' in filters:
+            queryset = queryset.filter(capture_date__lte=filters['captured_before'])
+        if 'uploader' in filters:
+            queryset = queryset.filter(uploader_id=filters['uploader'])
+        if filters.get('q'):
+            queryset = search.search(queryset, filters['q'], ranked=filters['sort'] == 'relevance')
+        return queryset.order_by(*self.get_keyset_ordering()).prefetch_related('renditions')
 
-class PhotoDownloadView(generics.RetrieveAPIView):
-    queryset = Photo.objects.all()
+    def get_keyset_ordering(self):
+        # Full-text results page by relevance; the cursor then carries the rank too
+        filters = self.get_filters()
+        if filters.get('q') and filters['sort'] == 'relevance' and search.uses_full_text():
+            return search.RANKED_ORDERING
+        return self.keyset_ordering
+
+    def list(self, request, *args, **kwargs):
+        self.get_filters()  # Reject bad parameters before the cache lookup
+        # The gallery is identical for every anonymous caller, so pages are cached per
+        # generation and revalidated with ETag/Last-Modified without touching the database.
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+
+        generation = gallery_cache.get_generation()
+        key, url_hash = gallery_cache.response_key(request, generation, self.get_image_format())
+        etag = gallery_cache.etag(generation, url_hash)
+        last_modified = gallery_cache.last_modified(generation)
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            cache = gallery_cache.get_gallery_cache()
+            data = cache.get(key)
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                cache.set(key, response.data, gallery_cache.get_timeout())
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'PHOTO_GALLERY_MAX_AGE', 0))
+        return response
+
+class MyPhotosView(NegotiatedFormatMixin, generics.ListAPIView):
+    """The requesting uploader's photos, newest first, in every status (photo_uploader_created_idx)."""
+    serializer_class = UploaderPhotoSerializer
+    permission_classes = [IsUploader]
+    pagination_class = GalleryCursorPagination
+    keyset_ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        return Photo.objects.filter(uploader_id=self.request.user.id).prefetch_related('renditions')
+
+class MyPhotoStatsView(generics.RetrieveAPIView):
+    """The requesting uploader's totals, read from UploaderStats (one row lookup)."""
+    serializer_class = UploaderStatsSerializer
+    permission_classes = [IsUploader]
+
+    def get_object(self):
+        return uploader_stats.get_stats(self.request.user.id)
+
+class PhotoDownloadView(NegotiatedFormatMixin, generics.RetrieveAPIView):
+    queryset = Photo.objects.prefetch_related('renditions')
     serializer_class = PhotoDownloadSerializer
     permission_classes = [permissions.IsAuthenticated] # Access to download links for any auth user? Or specific?
     # User said "Return links to both", presumably for someone who bought it or the uploader. 
     # Let's keep it IsAuthenticated for now as requested range doesn't specify payment logic yet.
+
+class PhotoFileView(NegotiatedFormatMixin, generics.GenericAPIView):
+    """
+    Streams a photo file: `original` (authenticated, like PhotoDownloadView),
+    `watermarked` or any rendition name (public, like the gallery, in the negotiated format).
+    Supports Range/conditional requests and proxy offload; see photos/delivery.py.
+    """
+    queryset = Photo.objects.all()
+
+    def get_permissions(self):
+        if self.kwargs.get('kind') == 'original':
+            return [permissions.IsAuthenticated()]
+        return [permissions.AllowAny()]
+
+    def get(self, request, *args, **kwargs):
+        photo = self.get_object()
+        kind = kwargs['kind']
+        if kind == 'original':
+            return serve_file(request, photo.original_image, private=True)
+
+        name = getattr(settings, 'PHOTO_WATERMARKED_RENDITION', 'full') if kind == 'watermarked' else kind
+        rendition = select_renditions(photo.renditions.filter(name=name), self.get_image_format()).get(name)
+        if rendition is not None:
+            return serve_file(request, rendition.image)
+        if kind == 'watermarked':
+            return serve_file(request, photo.watermarked_image)
+        raise Http404('Unknown rendition')
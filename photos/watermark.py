@@ -0,0 +1,78 @@
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont
+
+DEFAULT_TEXT = 'TMF-Marketplace'
+
+# The mark is rasterized once at this size and only ever scaled down from it
+MASTER_FONT_SIZE = 160
+
+# Overlays resized for a given target width; renditions share a handful of widths
+OVERLAY_CACHE_SIZE = 64
+
+
+def get_options():
+    return {
+        'text': getattr(settings, 'PHOTO_WATERMARK_TEXT', DEFAULT_TEXT),
+        'font': getattr(settings, 'PHOTO_WATERMARK_FONT', ''),
+        'logo': getattr(settings, 'PHOTO_WATERMARK_LOGO', ''),
+        'opacity': getattr(settings, 'PHOTO_WATERMARK_OPACITY', 128),
+        'scale': getattr(settings, 'PHOTO_WATERMARK_SCALE', 0.25),
+        'margin': getattr(settings, 'PHOTO_WATERMARK_MARGIN', 0.02),
+    }
+
+
+@lru_cache(maxsize=None)
+def load_font(path, size):
+    """Load a TrueType font once per process; falls back to Pillow's bundled font."""
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=None)
+def master_overlay(text, font_path, logo_path, opacity):
+    """
+    The watermark as a full-resolution RGBA image: the logo PNG if one is configured,
+    otherwise the text. Alpha already carries PHOTO_WATERMARK_OPACITY.
+    """
+    if logo_path:
+        with Image.open(logo_path) as logo:
+            overlay = logo.convert('RGBA')
+        alpha = overlay.getchannel('A').point(lambda value: value * opacity // 255)
+        overlay.putalpha(alpha)
+        return overlay
+
+    font = load_font(font_path, MASTER_FONT_SIZE)
+    left, top, right, bottom = font.getbbox(text)
+    overlay = Image.new('RGBA', (right - left, bottom - top), (255, 255, 255, 0))
+    ImageDraw.Draw(overlay).text((-left, -top), text, font=font, fill=(255, 255, 255, opacity))
+    return overlay
+
+
+@lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def scaled_overlay(width, text, font_path, logo_path, opacity):
+    overlay = master_overlay(text, font_path, logo_path, opacity)
+    height = max(1, round(overlay.height * width / overlay.width))
+    return overlay.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def get_overlay(image_width):
+    """The overlay sized for an image `image_width` pixels wide (PHOTO_WATERMARK_SCALE of it)."""
+    options = get_options()
+    width = max(1, round(image_width * options['scale']))
+    return scaled_overlay(width, options['text'], options['font'], options['logo'], options['opacity'])
+
+
+def apply_watermark(image):
+    """Alpha-blend the cached overlay into the bottom-right corner of `image`, in place."""
+    overlay = get_overlay(image.width)
+    margin = max(1, round(min(image.size) * get_options()['margin']))
+    x = max(image.width - overlay.width - margin, 0)
+    y = max(image.height - overlay.height - margin, 0)
+    image.paste(overlay, (x, y), overlay)
+    return image
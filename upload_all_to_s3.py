@@ -1,8 +1,28 @@
-import boto3
+"""
+Sync local media/photos/ to the S3 bucket.
+
+Only new or changed files are uploaded: the local tree is compared against a single
+paginated listing of the bucket prefix, by size and modification time (or by ETag
+with --hash). Uploads run through a bounded thread pool.
+
+    python upload_all_to_s3.py --dry-run
+    python upload_all_to_s3.py --workers 32 --hash
+"""
+import argparse
+import json
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+
+import boto3
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
 
+from config.storage import s3_etag
+
 load_dotenv()
 
 # AWS Configuration
@@ -10,49 +30,150 @@ AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME', 'us-east-1')
+AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL')
+
+MB = 1024 * 1024
+
+
+def build_manifest(media_root, prefix, previous, with_hash, config):
+    """
+    Walk the local tree into {key: {path, size, mtime, etag}}.
+    Hashes from the previous manifest are reused when size and mtime are unchanged.
+    """
+    manifest = {}
+    root = Path(media_root)
+    for dirpath, _, filenames in os.walk(root / prefix):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            stat = os.stat(path)
+            key = Path(path).relative_to(root).as_posix()
+            entry = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+            if with_hash:
+                cached = previous.get(key)
+                if cached and cached['size'] == entry['size'] and cached['mtime'] == entry['mtime'] and cached.get('etag'):
+                    entry['etag'] = cached['etag']
+                else:
+                    entry['etag'] = s3_etag(path, stat.st_size, config)
+            manifest[key] = entry
+    return manifest
+
+
+def list_bucket(s3_client, bucket, prefix):
+    """{key: (size, etag, last_modified timestamp)} for every object under prefix."""
+    remote = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            remote[obj['Key']] = (obj['Size'], obj['ETag'].strip('"'), obj['LastModified'].timestamp())
+    return remote
+
+
+def needs_upload(entry, remote_entry, with_hash):
+    if remote_entry is None:
+        return 'new'
+    size, etag, last_modified = remote_entry
+    if size != entry['size']:
+        return 'changed'
+    if with_hash:
+        return 'changed' if etag != entry['etag'] else None
+    # Without hashes, a local edit after the last upload means the object is stale
+    return 'changed' if entry['mtime'] > last_modified else None
+
 
-# Create S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    region_name=AWS_S3_REGION_NAME
-)
-
-print(f"Uploading files to S3 bucket: {AWS_STORAGE_BUCKET_NAME}\n")
-
-# Paths to upload
-media_root = Path('media/photos')
-
-uploaded = 0
-errors = 0
-
-for folder in ['originals', 'watermarked']:
-    folder_path = media_root / folder
-    
-    if not folder_path.exists():
-        print(f"Folder not found: {folder_path}")
-        continue
-        
-    print(f"\nProcessing {folder}/...")
-    
-    for file_path in folder_path.glob('*'):
-        if file_path.is_file():
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--media-root', default='media', help='Local media directory (default: media)')
+    parser.add_argument('--prefix', default='photos/', help='Folder under media root and key prefix in the bucket')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent uploads')
+    parser.add_argument('--hash', action='store_true', help='Compare content hashes (ETag) instead of modification times')
+    parser.add_argument('--manifest', default='.s3sync-manifest.json', help='Local manifest cache (reuses hashes between runs)')
+    parser.add_argument('--multipart-threshold', type=int, default=16, help='Multipart upload threshold (MB)')
+    parser.add_argument('--multipart-chunksize', type=int, default=16, help='Multipart part size (MB)')
+    parser.add_argument('--dry-run', action='store_true', help='Only print what would be uploaded')
+    args = parser.parse_args()
+
+    if not AWS_STORAGE_BUCKET_NAME:
+        print("AWS_STORAGE_BUCKET_NAME not configured!")
+        sys.exit(1)
+
+    # Create S3 client (thread-safe, shared by the pool)
+    s3_client = boto3.client(
+        's3',
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        region_name=AWS_S3_REGION_NAME,
+        endpoint_url=AWS_S3_ENDPOINT_URL,
+    )
+    config = TransferConfig(
+        multipart_threshold=args.multipart_threshold * MB,
+        multipart_chunksize=args.multipart_chunksize * MB,
+        max_concurrency=4,
+    )
+
+    print(f"Syncing {args.media_root}/{args.prefix} to S3 bucket: {AWS_STORAGE_BUCKET_NAME}\n")
+    started = time.monotonic()
+
+    previous = {}
+    if os.path.exists(args.manifest):
+        with open(args.manifest) as f:
+            previous = json.load(f)
+
+    manifest = build_manifest(args.media_root, args.prefix, previous, args.hash, config)
+    print(f"  Local files: {len(manifest)} ({time.monotonic() - started:.1f}s)")
+
+    remote = list_bucket(s3_client, AWS_STORAGE_BUCKET_NAME, args.prefix)
+    print(f"  Remote objects: {len(remote)} ({time.monotonic() - started:.1f}s)")
+
+    plan = []
+    for key, entry in sorted(manifest.items()):
+        reason = needs_upload(entry, remote.get(key), args.hash)
+        if reason:
+            plan.append((key, entry, reason))
+    total_bytes = sum(entry['size'] for _, entry, _ in plan)
+    print(f"  To upload: {len(plan)} files ({total_bytes / MB:.1f} MB), unchanged: {len(manifest) - len(plan)}\n")
+
+    if args.dry_run:
+        for key, entry, reason in plan:
+            print(f"  [{reason}] {key} ({entry['size']} bytes)")
+        print("\nDry run: nothing uploaded.")
+        return
+
+    uploaded = 0
+    uploaded_bytes = 0
+    errors = 0
+    lock = threading.Lock()
+    upload_started = time.monotonic()
+
+    def upload(key, entry):
+        s3_client.upload_file(entry['path'], AWS_STORAGE_BUCKET_NAME, key, Config=config)
+        return entry['size']
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(upload, key, entry): (key, reason) for key, entry, reason in plan}
+        for done, future in enumerate(as_completed(futures), start=1):
+            key, reason = futures[future]
             try:
-                # S3 key (path in bucket)
-                s3_key = f'photos/{folder}/{file_path.name}'
-                
-                # Upload file
-                with open(file_path, 'rb') as f:
-                    s3_client.upload_fileobj(f, AWS_STORAGE_BUCKET_NAME, s3_key)
-                
-                print(f"  ✓ Uploaded: {s3_key}")
-                uploaded += 1
-                
+                size = future.result()
+                with lock:
+                    uploaded += 1
+                    uploaded_bytes += size
+                print(f"  ✓ [{done}/{len(plan)}] Uploaded ({reason}): {key}")
             except Exception as e:
-                print(f"  ✗ Error uploading {file_path.name}: {e}")
-                errors += 1
+                with lock:
+                    errors += 1
+                print(f"  ✗ [{done}/{len(plan)}] Error uploading {key}: {e}")
+
+    # Only record the manifest once everything is in the bucket, so failures are retried
+    if args.hash and not errors:
+        with open(args.manifest, 'w') as f:
+            json.dump({key: {k: v for k, v in entry.items() if k != 'path'} for key, entry in manifest.items()}, f)
+
+    elapsed = max(time.monotonic() - upload_started, 1e-9)
+    print(f"\n✓ Sync complete in {time.monotonic() - started:.1f}s!")
+    print(f"  Uploaded: {uploaded} files ({uploaded_bytes / MB:.1f} MB, {uploaded_bytes / MB / elapsed:.2f} MB/s)")
+    print(f"  Unchanged: {len(manifest) - len(plan)} files")
+    print(f"  Errors: {errors}")
+
 
-print(f"\n✓ Upload complete!")
-print(f"  Uploaded: {uploaded} files")
-print(f"  Errors: {errors}")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Stateless JWT authentication: request.user is built from the token's claims instead of a User query.
+
+Access tokens already carry `role` and `username` (see CustomTokenObtainPairSerializer), which is all
+the API's permission checks need. Whether the account is still active, and its current role, come from
+a status cache (per process for AUTH_USER_STATUS_TTL seconds, then the shared cache, then the database),
+invalidated whenever a User is saved or deleted (see users/signals.py). Without a shared cache backend
+(REDIS_URL or CACHE_DIR) the second layer is skipped: a per-process cache would keep other workers'
+invalidations from reaching it for AUTH_USER_STATUS_SHARED_TIMEOUT seconds.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+STATUS_CACHE_PREFIX = 'user-status:'
+# Per-process entries kept at most; the map is simply cleared when it grows past this
+LOCAL_STATUS_MAX_ENTRIES = 10_000
+
+_local_status = {}
+_local_lock = threading.Lock()
+
+
+class ClaimsUser(TokenUser):
+    """A User stand-in backed by a validated access token; use `.id`, not the instance, for foreign keys."""
+
+    @cached_property
+    def id(self):
+        # Newer simplejwt versions put the id in the token as a string; match the model's pk type
+        return get_user_model()._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', '')
+
+
+def get_status_ttl():
+    return getattr(settings, 'AUTH_USER_STATUS_TTL', 30)
+
+
+def get_shared_status_timeout():
+    return getattr(settings, 'AUTH_USER_STATUS_SHARED_TIMEOUT', 300)
+
+
+def is_cache_shared():
+    """Whether the default cache is seen by every worker process (not per-process memory)."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def status_key(user_id):
+    return f'{STATUS_CACHE_PREFIX}{user_id}'
+
+
+def get_user_status(user_id):
+    """
+    {'is_active', 'role'} of a user, from the per-process cache, the shared cache or the database.
+    A user that no longer exists is reported as inactive.
+    """
+    now = time.monotonic()
+    entry = _local_status.get(user_id)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    shared = is_cache_shared()
+    status = cache.get(status_key(user_id)) if shared else None
+    if status is None:
+        row = get_user_model().objects.filter(pk=user_id).values('is_active', 'role').first()
+        status = row or {'is_active': False, 'role': ''}
+        if shared:
+            cache.set(status_key(user_id), status, get_shared_status_timeout())
+
+    ttl = get_status_ttl()
+    if ttl:
+        with _local_lock:
+            if len(_local_status) >= LOCAL_STATUS_MAX_ENTRIES:
+                _local_status.clear()
+            _local_status[user_id] = (now + ttl, status)
+    return status
+
+
+def invalidate_user_status(user_id):
+    """Forget a user's cached status here and in the shared cache; other processes catch up within the TTL."""
+    with _local_lock:
+        _local_status.pop(user_id, None)
+    cache.delete(status_key(user_id))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request User query. Tokens issued without a `role` claim
+    fall back to loading the User. Set AUTH_USER_STATUS_CHECK = False to trust the claims alone
+    (deactivation and role changes then only take effect when the access token expires).
+    """
+
+    def get_user(self, validated_token):
+        if 'role' not in validated_token:
+            return super().get_user(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        user = ClaimsUser(validated_token)
+        if getattr(settings, 'AUTH_USER_STATUS_CHECK', True):
+            status = get_user_status(user.id)
+            if not status['is_active']:
+                raise AuthenticationFailed('User is inactive', code='user_inactive')
+            # The role may have changed since the token was issued
+            user.role = status['role']
+        return user
@@ -0,0 +1,112 @@
+"""
+Password hashers with settings-driven cost, and a bound on concurrent hashing across workers.
+
+Argon2 (default) or scrypt is tried first (PASSWORD_HASHER); PBKDF2 stays in PASSWORD_HASHERS
+only to verify existing hashes, which Django re-encodes with the preferred hasher on the next
+successful login. Changing the cost settings also triggers that rehash (must_update).
+
+Each hash costs tens of milliseconds of CPU. At most PASSWORD_HASH_CONCURRENCY run at once, so a
+login burst queues here instead of taking every worker away from the gallery. The slots are keys in
+the default cache: with REDIS_URL or CACHE_DIR they are shared by every gunicorn worker, with the
+per-process default cache each process has its own. Inside fail_when_busy() (the API login view),
+hashing that waits longer than PASSWORD_HASH_WAIT seconds raises HashingBusy; anywhere else (admin
+and session logins, createsuperuser) it goes ahead without a slot.
+"""
+import contextvars
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+from django.core.cache import cache
+
+SLOT_KEY_PREFIX = 'password-hashing-slot:'
+# A hash takes milliseconds: a slot held this long (seconds) belongs to a worker that died mid-hash
+SLOT_TIMEOUT = 60
+SLOT_POLL_INTERVAL = 0.01  # seconds
+
+_fail_when_busy = contextvars.ContextVar('fail_when_busy', default=False)
+_holding_slot = contextvars.ContextVar('holding_slot', default=False)
+
+
+class HashingBusy(Exception):
+    """No hashing slot freed up within PASSWORD_HASH_WAIT seconds."""
+
+
+@contextmanager
+def fail_when_busy():
+    """Raise HashingBusy from hashers used in this block instead of hashing without a slot."""
+    token = _fail_when_busy.set(True)
+    try:
+        yield
+    finally:
+        _fail_when_busy.reset(token)
+
+
+def slot_keys():
+    return [f'{SLOT_KEY_PREFIX}{i}' for i in range(getattr(settings, 'PASSWORD_HASH_CONCURRENCY', 2))]
+
+
+def acquire_slot(owner, wait):
+    """Claim a free slot (cache.add() is atomic), polling for up to `wait` seconds. Returns its key."""
+    deadline = time.monotonic() + wait
+    while True:
+        for key in slot_keys():
+            if cache.add(key, owner, timeout=SLOT_TIMEOUT):
+                return key
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(SLOT_POLL_INTERVAL)
+
+
+class HashingSlot:
+    """Context manager holding one of the hashing slots (reentrant: verify() calls encode())."""
+
+    def __enter__(self):
+        self.key = self.token = None
+        if _holding_slot.get():
+            return self
+        self.owner = uuid.uuid4().hex
+        self.key = acquire_slot(self.owner, getattr(settings, 'PASSWORD_HASH_WAIT', 5))
+        if self.key is None and _fail_when_busy.get():
+            raise HashingBusy()
+        self.token = _holding_slot.set(True)
+        return self
+
+    def __exit__(self, *exc):
+        if self.token is None:
+            return
+        _holding_slot.reset(self.token)
+        # Don't free a slot that timed out and was taken by someone else meanwhile
+        if self.key is not None and cache.get(self.key) == self.owner:
+            cache.delete(self.key)
+
+
+class BoundedHasherMixin:
+    """Runs encode()/verify() inside a hashing slot."""
+
+    def encode(self, *args, **kwargs):
+        with HashingSlot():
+            return super().encode(*args, **kwargs)
+
+    def verify(self, *args, **kwargs):
+        with HashingSlot():
+            return super().verify(*args, **kwargs)
+
+
+class TunedArgon2PasswordHasher(BoundedHasherMixin, Argon2PasswordHasher):
+    # memory_cost is in KiB; the defaults follow the OWASP minimum (19 MiB, 2 passes)
+    time_cost = getattr(settings, 'PASSWORD_ARGON2_TIME_COST', 2)
+    memory_cost = getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', 19456)
+    parallelism = getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', 1)
+
+
+class TunedScryptPasswordHasher(BoundedHasherMixin, ScryptPasswordHasher):
+    work_factor = getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', 2**14)
+    block_size = getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', 8)
+    parallelism = getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', 1)
+
+
+class BoundedPBKDF2PasswordHasher(BoundedHasherMixin, PBKDF2PasswordHasher):
+    """Verifies hashes created before the switch; they are upgraded on the user's next login."""
@@ -0,0 +1,12 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_status
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_status_cache(sender, instance, **kwargs):
+    # queryset.update() sends no signal; call invalidate_user_status() after bulk deactivations
+    invalidate_user_status(instance.pk)
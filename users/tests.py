@@ -1,3 +1,201 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import authentication, hashers
+from .models import User
+from .serializers import CustomTokenObtainPairSerializer
+
+CACHE_DIR = tempfile.mkdtemp()
+
+# A cache every process sees (like REDIS_URL or CACHE_DIR in production)
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': CACHE_DIR},
+}
+
+
+def tearDownModule():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+
+@override_settings(AUTH_USER_STATUS_CHECK=True, AUTH_USER_STATUS_TTL=30)
+class StatelessAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='alice', role='Uploader')
+        self.client = APIClient()
+        self.authenticate(self.user)
+        self.url = reverse('photo-mine-stats')  # Uploaders only
+
+    def authenticate(self, user, token=None):
+        token = token or CustomTokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self):
+        """Run one request and return the queries it made against the users table."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries if 'users_user' in query['sql']]
+
+    def test_status_is_cached_between_requests(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_deactivation_takes_effect_on_the_next_request(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_role_change_takes_effect_on_the_next_request(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.role = 'Buyer'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_deleted_user(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_bulk_update_needs_an_explicit_invalidation(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)  # No signal
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        authentication.invalidate_user_status(self.user.pk)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(AUTH_USER_STATUS_TTL=0)
+    def test_without_a_local_cache_every_request_reads_the_status(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(AUTH_USER_STATUS_CHECK=False)
+    def test_claims_only(self):
+        self.assertEqual(self.user_queries(), [])
+
+    def test_token_without_a_role_claim_loads_the_user(self):
+        self.authenticate(self.user, RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(len(self.user_queries()), 1)
+
+    def test_token_for_a_missing_user_id(self):
+        token = AccessToken()
+        token['role'] = 'Uploader'
+        self.authenticate(self.user, token)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_per_process_cache_is_not_used_as_the_shared_layer(self):
+        self.assertFalse(authentication.is_cache_shared())
+        authentication.get_user_status(self.user.pk)
+        self.assertIsNone(cache.get(authentication.status_key(self.user.pk)))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache_is_used_and_invalidated(self):
+        cache.clear()
+        self.assertTrue(authentication.is_cache_shared())
+        authentication.invalidate_user_status(self.user.pk)
+        status = authentication.get_user_status(self.user.pk)
+        self.assertEqual(cache.get(authentication.status_key(self.user.pk)), status)
+
+        self.user.save()
+        self.assertIsNone(cache.get(authentication.status_key(self.user.pk)))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()  # Login throttles
+        User.objects.create_user(username='bob', password='correct horse', role='Buyer')
+
+    def test_access_token_carries_role_and_username(self):
+        response = APIClient().post(reverse('token_obtain_pair'), {
+            'username': 'bob', 'password': 'correct horse',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data['access'])
+        self.assertEqual((token['role'], token['username']), ('Buyer', 'bob'))
+
+    def test_wrong_password(self):
+        response = APIClient().post(reverse('token_obtain_pair'), {
+            'username': 'bob', 'password': 'wrong',
+        }, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='carol', role='Buyer')
+        self.user.password = make_password('correct horse', hasher='pbkdf2_sha256')
+        self.user.save()
+
+    def login(self):
+        return APIClient().post(reverse('token_obtain_pair'), {
+            'username': 'carol', 'password': 'correct horse',
+        }, format='json')
+
+    def test_pbkdf2_hash_is_upgraded_on_login(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_slot_is_freed_after_hashing(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual([key for key in hashers.slot_keys() if cache.get(key)], [])
+
+    @override_settings(PASSWORD_HASH_CONCURRENCY=1, PASSWORD_HASH_WAIT=0)
+    def test_busy_api_login_gets_503(self):
+        cache.set(hashers.slot_keys()[0], 'another worker')
+        response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['detail'].code, 'password_hashing_busy')
+
+        cache.clear()
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(PASSWORD_HASH_CONCURRENCY=1, PASSWORD_HASH_WAIT=0)
+    def test_busy_admin_login_goes_ahead(self):
+        cache.set(hashers.slot_keys()[0], 'another worker')
+        self.assertEqual(authenticate(username='carol', password='correct horse'), self.user)
+        self.assertEqual(cache.get(hashers.slot_keys()[0]), 'another worker')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+@mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', {'login_ip': '3/min', 'login_username': '2/min'})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='bob', password='correct horse', role='Buyer')
+
+    def login(self, username, ip, password='wrong'):
+        return APIClient(REMOTE_ADDR=ip).post(reverse('token_obtain_pair'), {
+            'username': username, 'password': password,
+        }, format='json')
+
+    def test_per_username_across_ips(self):
+        self.assertEqual(self.login('bob', '10.0.0.1').status_code, 401)
+        self.assertEqual(self.login(' BOB ', '10.0.0.2').status_code, 401)
+        self.assertEqual(self.login('bob', '10.0.0.3', password='correct horse').status_code, 429)
+        self.assertEqual(self.login('alice', '10.0.0.3').status_code, 401)
+
+    def test_per_ip_across_usernames(self):
+        for username in ('alice', 'carol', 'dave'):
+            self.assertEqual(self.login(username, '10.0.0.1').status_code, 401)
+        self.assertEqual(self.login('bob', '10.0.0.1', password='correct horse').status_code, 429)
+        self.assertEqual(self.login('bob', '10.0.0.2', password='correct horse').status_code, 200)
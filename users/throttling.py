@@ -0,0 +1,28 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    """Login attempts per client IP (LOGIN_RATE_PER_IP)."""
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginUsernameThrottle(SimpleRateThrottle):
+    """
+    Login attempts per target username (LOGIN_RATE_PER_USERNAME), whichever IPs they come from,
+    so one account can't be guessed at from a botnet faster than the rate allows.
+    """
+    scope = 'login_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not username:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': str(username).strip().lower()}
+
+
+class RegisterIPThrottle(LoginIPThrottle):
+    """Registrations per client IP (REGISTER_RATE_PER_IP); each one hashes a password."""
+    scope = 'register_ip'
@@ -1,13 +1,33 @@
-from rest_framework import generics
+from rest_framework import generics, status
+from rest_framework.exceptions import APIException
 from rest_framework.permissions import AllowAny
+from .hashers import HashingBusy, fail_when_busy
 from .serializers import UserRegistrationSerializer
+from .throttling import LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterIPThrottle]
 
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import CustomTokenObtainPairSerializer
 
+
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, try again shortly.'
+    default_code = 'password_hashing_busy'
+
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
+
+    def post(self, request, *args, **kwargs):
+        # Hashers used outside this view (admin login) wait for a slot but never fail
+        try:
+            with fail_when_busy():
+                return super().post(request, *args, **kwargs)
+        except HashingBusy:
+            raise PasswordHashingBusy()
@@ -12,6 +12,7 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from photos.models import Photo
+from photos.jobs import claim_job, run_job
 
 User = get_user_model()
 
@@ -47,9 +48,16 @@ def verify_image_processing():
         original_image=img_content
     )
     
-    # Save (Triggers signals/override save method)
+    # Save and queue processing, then run the job inline (normally done by `process_image_jobs`)
     photo.save()
-    print("✅ Photo saved.")
+    photo.enqueue_processing()
+    print("✅ Photo saved and queued.")
+
+    job = claim_job('verify_watermark')
+    while job is not None:
+        run_job(job)
+        job = claim_job('verify_watermark')
+    print("✅ Queued jobs processed.")
 
     # 4. Verify Watermark Field
     photo.refresh_from_db()